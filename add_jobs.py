@@ -0,0 +1,219 @@
+"""Durable background jobs that add users to a channel, with checkpoints for resuming."""
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+PAUSED = 'paused'
+CANCELLED = 'cancelled'
+DONE = 'done'
+FAILED = 'failed'
+
+# States of a job that should run (again) when the bot starts
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# States of a username within a job
+USER_PENDING = 0
+USER_ADDED = 1
+USER_FAILED = 2
+
+
+class AddJob:
+    """One run of adding a list of users to a channel.
+
+    The usernames either come with the job, or from an uploaded file
+    (``file_id``) that is read while the job runs.
+    """
+
+    __slots__ = (
+        'job_id', 'owner_id', 'chat_id', 'channel_id', 'status', 'total', 'added', 'failed',
+        'file_id', 'csv_format', 'source_complete', 'created_at', 'updated_at', 'error',
+    )
+
+    def __init__(self, job_id: int, owner_id: int, chat_id: int, channel_id: int, status: str = QUEUED,
+                 total: int = 0, added: int = 0, failed: int = 0, file_id: str = None, csv_format: bool = False,
+                 source_complete: bool = True, created_at: float = None, updated_at: float = None,
+                 error: str = None):
+        self.job_id = job_id
+        # User who started the job and may control it
+        self.owner_id = owner_id
+        # Chat the job reports to
+        self.chat_id = chat_id
+        self.channel_id = channel_id
+        self.status = status
+        # Usernames known so far; grows while a file is being read
+        self.total = total
+        self.added = added
+        self.failed = failed
+        self.file_id = file_id
+        self.csv_format = bool(csv_format)
+        # False until every username of the file has been recorded
+        self.source_complete = bool(source_complete)
+        self.created_at = time.time() if created_at is None else created_at
+        self.updated_at = self.created_at if updated_at is None else updated_at
+        self.error = error
+
+    @property
+    def processed(self) -> int:
+        return self.added + self.failed
+
+    @classmethod
+    def from_row(cls, row) -> 'AddJob':
+        return cls(*row)
+
+
+class AddJobStore:
+    """Add jobs and the state of every username in them, in SQLite.
+
+    Outcomes are recorded in batches (checkpoints); a job resumed after a
+    crash redoes at most the users processed since its last checkpoint,
+    which is harmless since inviting a member again counts as success.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS add_jobs ("
+                "job_id INTEGER PRIMARY KEY AUTOINCREMENT, owner_id INTEGER, chat_id INTEGER, channel_id INTEGER, "
+                "status TEXT, total INTEGER, added INTEGER, failed INTEGER, file_id TEXT, csv_format INTEGER, "
+                "source_complete INTEGER, created_at REAL, updated_at REAL, error TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS add_job_users ("
+                "job_id INTEGER, position INTEGER, username TEXT, state INTEGER, "
+                "PRIMARY KEY (job_id, position)) WITHOUT ROWID"
+            )
+            self._db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS add_job_users_username ON add_job_users (job_id, username)"
+            )
+
+    def create(self, owner_id: int, chat_id: int, channel_id: int, usernames: list = None,
+               file_id: str = None, csv_format: bool = False) -> AddJob:
+        """Create a queued job for ``usernames``, or for the usernames in the file ``file_id``."""
+        job = AddJob(None, owner_id, chat_id, channel_id, file_id=file_id, csv_format=csv_format,
+                     source_complete=file_id is None)
+        columns = AddJob.__slots__[1:]
+        with self._db:
+            cursor = self._db.execute(
+                f"INSERT INTO add_jobs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                tuple(getattr(job, name) for name in columns)
+            )
+        job.job_id = cursor.lastrowid
+        if usernames:
+            job.total = len(self.add_usernames(job.job_id, usernames))
+        return job
+
+    def get(self, job_id: int):
+        """Return the job with ``job_id``, or None."""
+        row = self._db.execute(
+            f"SELECT {', '.join(AddJob.__slots__)} FROM add_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return AddJob.from_row(row) if row else None
+
+    def list_for_owner(self, owner_id: int, limit: int = 10) -> list:
+        """Return the latest jobs started by ``owner_id``, newest first."""
+        rows = self._db.execute(
+            f"SELECT {', '.join(AddJob.__slots__)} FROM add_jobs WHERE owner_id = ? ORDER BY job_id DESC LIMIT ?",
+            (owner_id, limit)
+        )
+        return [AddJob.from_row(row) for row in rows]
+
+    def active(self) -> list:
+        """Return the jobs that were queued or running when the bot stopped."""
+        placeholders = ', '.join('?' * len(ACTIVE_STATES))
+        rows = self._db.execute(
+            f"SELECT {', '.join(AddJob.__slots__)} FROM add_jobs WHERE status IN ({placeholders}) ORDER BY job_id",
+            ACTIVE_STATES
+        )
+        return [AddJob.from_row(row) for row in rows]
+
+    def add_usernames(self, job_id: int, usernames: list) -> list:
+        """Record usernames as pending. Returns the ones the job didn't have yet, in order."""
+        known = set()
+        for start in range(0, len(usernames), 500):
+            chunk = usernames[start:start + 500]
+            known.update(row[0] for row in self._db.execute(
+                f"SELECT username FROM add_job_users WHERE job_id = ? AND username IN ({', '.join('?' * len(chunk))})",
+                (job_id, *chunk)
+            ))
+        new = [username for username in dict.fromkeys(usernames) if username not in known]
+        if not new:
+            return new
+
+        with self._db:
+            position = self._db.execute(
+                "SELECT COALESCE(MAX(position), 0) FROM add_job_users WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            self._db.executemany(
+                "INSERT INTO add_job_users (job_id, position, username, state) VALUES (?, ?, ?, ?)",
+                [(job_id, position + offset, username, USER_PENDING) for offset, username in enumerate(new, 1)]
+            )
+            self._db.execute(
+                "UPDATE add_jobs SET total = total + ?, updated_at = ? WHERE job_id = ?",
+                (len(new), time.time(), job_id)
+            )
+        return new
+
+    def pending_usernames(self, job_id: int, batch_size: int = 1000):
+        """Yield the usernames of the job that have no outcome yet, in order, reading in batches."""
+        position = 0
+        while True:
+            rows = self._db.execute(
+                "SELECT position, username FROM add_job_users "
+                "WHERE job_id = ? AND position > ? AND state = ? ORDER BY position LIMIT ?",
+                (job_id, position, USER_PENDING, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for position, username in rows:
+                yield username
+
+    def record(self, job_id: int, outcomes: list) -> None:
+        """Checkpoint ``[(username, added)]`` outcomes in one transaction."""
+        if not outcomes:
+            return
+        added = sum(1 for _, was_added in outcomes if was_added)
+        with self._db:
+            self._db.executemany(
+                "UPDATE add_job_users SET state = ? WHERE job_id = ? AND username = ?",
+                [(USER_ADDED if was_added else USER_FAILED, job_id, username) for username, was_added in outcomes]
+            )
+            self._db.execute(
+                "UPDATE add_jobs SET added = added + ?, failed = failed + ?, updated_at = ? WHERE job_id = ?",
+                (added, len(outcomes) - added, time.time(), job_id)
+            )
+
+    def failed_usernames(self, job_id: int, limit: int = 10) -> list:
+        """Return the first usernames of the job that couldn't be added."""
+        rows = self._db.execute(
+            "SELECT username FROM add_job_users WHERE job_id = ? AND state = ? ORDER BY position LIMIT ?",
+            (job_id, USER_FAILED, limit)
+        )
+        return [row[0] for row in rows]
+
+    def set_status(self, job_id: int, status: str, error: str = None) -> None:
+        with self._db:
+            self._db.execute(
+                "UPDATE add_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def mark_source_complete(self, job_id: int) -> None:
+        """Record that every username of the job's file has been recorded."""
+        with self._db:
+            self._db.execute("UPDATE add_jobs SET source_complete = 1 WHERE job_id = ?", (job_id,))
+
+    def close(self) -> None:
+        self._db.close()
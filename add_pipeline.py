@@ -0,0 +1,176 @@
+"""Concurrent pipeline that resolves usernames and invites them to a channel."""
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from ratelimit import AdaptiveBackoff, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# How many times a single call is retried after a RetryAfter before giving up
+MAX_RETRIES = 5
+
+# How many usernames are looked up in the resolution cache at once
+CACHE_BATCH_SIZE = 100
+
+
+class AddResult:
+    """Counters of a finished or running add pipeline."""
+
+    __slots__ = ('total', 'processed', 'added', 'failed', 'failed_users', 'started_at', 'finished_at')
+
+    def __init__(self, total: int = None):
+        # None when the usernames come from a stream of unknown length
+        self.total = total
+        self.processed = 0
+        self.added = 0
+        self.failed = 0
+        self.failed_users = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Processed users per second."""
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+async def _call_with_backoff(backoff: AdaptiveBackoff, func, *args, **kwargs):
+    """Call ``func`` paced by ``backoff``, retrying on RetryAfter."""
+    for attempt in range(MAX_RETRIES + 1):
+        await backoff.wait()
+        try:
+            result = await func(*args, **kwargs)
+        except RetryAfter as e:
+            if attempt == MAX_RETRIES:
+                raise
+            seconds = retry_after_seconds(e)
+            logger.warning("Flood limit hit, pausing for %s seconds", seconds)
+            backoff.on_retry_after(seconds)
+            continue
+        backoff.on_success()
+        return result
+
+
+async def _iterate(usernames):
+    """Iterate over a plain or asynchronous iterable of usernames."""
+    if hasattr(usernames, '__aiter__'):
+        async for username in usernames:
+            yield username
+    else:
+        for username in usernames:
+            yield username
+
+
+async def add_users(bot, channel_id: int, usernames, resolve_workers: int = 4, invite_workers: int = 2,
+                    on_progress=None, username_cache=None, on_user=None) -> AddResult:
+    """Resolve ``usernames`` and invite them to ``channel_id``.
+
+    Resolution and invitation run as two stages of workers connected by a
+    bounded queue. ``usernames`` may be a list or an async iterable.
+    ``on_progress(result)`` is awaited after every processed user, and
+    ``on_user(username, added)`` is called with its outcome; a user whose
+    ``on_user`` raises counts as failed. Usernames found in
+    ``username_cache`` skip the resolution stage.
+    """
+    total = sum(1 for username in usernames if username) if hasattr(usernames, '__len__') else None
+    result = AddResult(total)
+    resolve_queue = asyncio.Queue(maxsize=resolve_workers * 4)
+    invite_queue = asyncio.Queue(maxsize=invite_workers * 4)
+    resolve_backoff = AdaptiveBackoff()
+    invite_backoff = AdaptiveBackoff()
+
+    async def finish(username: str, added: bool) -> None:
+        if on_user:
+            try:
+                on_user(username, added)
+            except Exception as e:
+                # The outcome wasn't recorded, so count the user as failed rather than lose the worker
+                logger.error("Error recording the outcome for user %s: %s", username, e)
+                added = False
+        result.processed += 1
+        if added:
+            result.added += 1
+        else:
+            result.failed += 1
+            result.failed_users.append(username)
+        if on_progress:
+            try:
+                await on_progress(result)
+            except Exception as e:
+                logger.error("Error reporting progress: %s", e)
+
+    async def resolver() -> None:
+        while True:
+            username = await resolve_queue.get()
+            try:
+                user = await _call_with_backoff(resolve_backoff, bot.get_chat, username)
+            except Exception as e:
+                # Only remember usernames that Telegram says do not exist, not transient errors
+                if username_cache and isinstance(e, BadRequest):
+                    username_cache.set_missing(username)
+                logger.error("Error getting user %s: %s", username, e)
+                await finish(username, added=False)
+            else:
+                if username_cache:
+                    username_cache.set(username, user.id)
+                await invite_queue.put((username, user.id))
+            finally:
+                resolve_queue.task_done()
+
+    async def inviter() -> None:
+        while True:
+            username, user_id = await invite_queue.get()
+            try:
+                # Use invite_chat_member to add user to channel
+                await _call_with_backoff(invite_backoff, bot.invite_chat_member, chat_id=channel_id, user_id=user_id)
+                await finish(username, added=True)
+            except Exception as e:
+                # User is already in the channel, consider this a success
+                if "already a member" in str(e).lower():
+                    await finish(username, added=True)
+                else:
+                    logger.error("Error adding user %s to channel: %s", username, e)
+                    await finish(username, added=False)
+            finally:
+                invite_queue.task_done()
+
+    async def dispatch(batch: list) -> None:
+        cached = username_cache.get_many(batch) if username_cache else {}
+        for username in batch:
+            if username not in cached:
+                await resolve_queue.put(username)
+            elif cached[username] is None:
+                # Known not to exist, don't ask Telegram again
+                await finish(username, added=False)
+            else:
+                await invite_queue.put((username, cached[username]))
+
+    workers = [asyncio.create_task(resolver()) for _ in range(resolve_workers)]
+    workers += [asyncio.create_task(inviter()) for _ in range(invite_workers)]
+    try:
+        batch = []
+        async for username in _iterate(usernames):
+            if username:
+                batch.append(username)
+            if len(batch) >= CACHE_BATCH_SIZE:
+                await dispatch(batch)
+                batch = []
+        await dispatch(batch)
+        await resolve_queue.join()
+        await invite_queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        result.finished_at = time.monotonic()
+
+    return result
@@ -0,0 +1,143 @@
+"""Sliding-window detection of message floods and join raids in groups."""
+import time
+from array import array
+from collections import OrderedDict
+
+# Actions the detector asks the bot to take
+RESTRICT = 'restrict'
+BAN = 'ban'
+
+
+class RingCounter:
+    """Remembers the times of the last ``size`` events in a fixed-size ring buffer.
+
+    ``hit(now)`` records an event and tells whether ``size`` events happened
+    within ``window`` seconds, in O(1) time and constant memory.
+    """
+
+    __slots__ = ('_times', '_index')
+
+    def __init__(self, size: int):
+        self._times = array('d', [float('-inf')] * size)
+        self._index = 0
+
+    def hit(self, now: float, window: float) -> bool:
+        """Record an event at ``now``. Returns True if the buffer filled up within ``window``."""
+        times = self._times
+        times[self._index] = now
+        self._index = (self._index + 1) % len(times)
+        # The next slot to overwrite holds the oldest of the last ``size`` events
+        return now - times[self._index] <= window
+
+    def reset(self) -> None:
+        """Forget all recorded events."""
+        for index in range(len(self._times)):
+            self._times[index] = float('-inf')
+
+
+class ChatState:
+    """Counters of one chat."""
+
+    __slots__ = ('joins', 'messages', 'users', 'raid_until')
+
+    def __init__(self, join_limit: int, chat_message_limit: int):
+        self.joins = RingCounter(join_limit)
+        self.messages = RingCounter(chat_message_limit)
+        # {user_id: RingCounter}, least recently active first
+        self.users = OrderedDict()
+        self.raid_until = 0.0
+
+
+class FloodDetector:
+    """Watches group messages and joins and decides when to act automatically.
+
+    * A user sending ``message_limit`` messages within ``message_window``
+      seconds is flooding and gets ``flood_action``.
+    * ``join_limit`` joins within ``join_window`` seconds, or
+      ``chat_message_limit`` messages within ``message_window`` seconds,
+      start raid mode for ``raid_duration`` seconds; everyone joining during
+      raid mode gets ``raid_action``.
+
+    Memory stays bounded: at most ``max_chats`` chats and
+    ``max_users_per_chat`` users per chat are tracked, least recently active
+    first out.
+    """
+
+    def __init__(self, message_limit: int = 8, message_window: float = 10, chat_message_limit: int = 100,
+                 join_limit: int = 10, join_window: float = 30, raid_duration: float = 300,
+                 flood_action: str = RESTRICT, raid_action: str = BAN,
+                 max_chats: int = 10000, max_users_per_chat: int = 1000, clock=time.monotonic):
+        self.message_limit = message_limit
+        self.message_window = message_window
+        self.chat_message_limit = chat_message_limit
+        self.join_limit = join_limit
+        self.join_window = join_window
+        self.raid_duration = raid_duration
+        self.flood_action = flood_action
+        self.raid_action = raid_action
+        self.max_chats = max_chats
+        self.max_users_per_chat = max_users_per_chat
+        self._clock = clock
+        self._chats = OrderedDict()
+        self.floods_detected = 0
+        self.raids_detected = 0
+
+    def _chat(self, chat_id: int) -> ChatState:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = ChatState(self.join_limit, self.chat_message_limit)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return chat
+
+    def in_raid(self, chat_id: int) -> bool:
+        """Return True if the chat is in raid mode."""
+        chat = self._chats.get(chat_id)
+        return chat is not None and chat.raid_until > self._clock()
+
+    def _start_raid(self, chat: ChatState, now: float) -> None:
+        if chat.raid_until <= now:
+            self.raids_detected += 1
+        chat.raid_until = now + self.raid_duration
+
+    def on_message(self, chat_id: int, user_id: int):
+        """Record a message. Returns the action to take against its sender, or None."""
+        now = self._clock()
+        chat = self._chat(chat_id)
+        if chat.messages.hit(now, self.message_window):
+            self._start_raid(chat, now)
+
+        users = chat.users
+        counter = users.get(user_id)
+        if counter is None:
+            counter = users[user_id] = RingCounter(self.message_limit)
+            if len(users) > self.max_users_per_chat:
+                users.popitem(last=False)
+        else:
+            users.move_to_end(user_id)
+
+        if counter.hit(now, self.message_window):
+            # Start over, so the user isn't acted on again for every further message
+            counter.reset()
+            self.floods_detected += 1
+            return self.flood_action
+        return None
+
+    def on_join(self, chat_id: int, count: int = 1):
+        """Record ``count`` new members. Returns the action to take against them, or None."""
+        now = self._clock()
+        chat = self._chat(chat_id)
+        for _ in range(count):
+            if chat.joins.hit(now, self.join_window):
+                self._start_raid(chat, now)
+        return self.raid_action if chat.raid_until > now else None
+
+    def stats(self) -> dict:
+        """Return the number of tracked chats and detections."""
+        return {
+            'chats': len(self._chats),
+            'floods_detected': self.floods_detected,
+            'raids_detected': self.raids_detected,
+        }
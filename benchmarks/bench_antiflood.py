@@ -0,0 +1,83 @@
+"""Measure the per-message overhead of the flood detector.
+
+Feeds synthetic group traffic (many chats, many users, a few floods and
+raids mixed in) straight into FloodDetector and reports messages per second
+and microseconds per message, plus the detections it made.
+
+    python benchmarks/bench_antiflood.py --messages 1000000 --chats 5000 --users 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from antiflood import FloodDetector  # noqa: E402
+
+
+def make_traffic(messages: int, chats: int, users: int, join_ratio: float, seed: int) -> list:
+    """Return [(is_join, chat_id, user_id)] with a skewed chat distribution."""
+    rng = random.Random(seed)
+    traffic = []
+    for _ in range(messages):
+        # A few chats get most of the traffic, like real groups
+        chat_id = -1000000000000 - int(rng.paretovariate(1.2)) % chats
+        user_id = rng.randrange(users)
+        traffic.append((rng.random() < join_ratio, chat_id, user_id))
+    return traffic
+
+
+def run(detector: FloodDetector, traffic: list, rate: float) -> float:
+    """Feed the traffic at ``rate`` simulated messages per second. Returns wall-clock seconds."""
+    clock = [0.0]
+    detector._clock = lambda: clock[0]
+    step = 1.0 / rate
+    on_message = detector.on_message
+    on_join = detector.on_join
+
+    started = time.perf_counter()
+    for is_join, chat_id, user_id in traffic:
+        clock[0] += step
+        if is_join:
+            on_join(chat_id)
+        else:
+            on_message(chat_id, user_id)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500000)
+    parser.add_argument('--chats', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=500, help="distinct users per chat")
+    parser.add_argument('--joins', type=float, default=0.02, help="fraction of events that are joins")
+    parser.add_argument('--rate', type=float, default=2000, help="simulated messages per second")
+    parser.add_argument('--max-chats', type=int, default=10000)
+    parser.add_argument('--max-users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.messages, args.chats, args.users, args.joins, args.seed)
+    detector = FloodDetector(max_chats=args.max_chats, max_users_per_chat=args.max_users)
+
+    tracemalloc.start()
+    elapsed = run(detector, traffic, args.rate)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = detector.stats()
+    print(f"Events:          {len(traffic)}")
+    print(f"Elapsed:         {elapsed:.3f}s")
+    print(f"Throughput:      {len(traffic) / elapsed:,.0f} events/s")
+    print(f"Overhead:        {elapsed / len(traffic) * 1e6:.2f} us/event")
+    print(f"Peak memory:     {peak / 1024 / 1024:.1f} MiB")
+    print(f"Chats tracked:   {stats['chats']}")
+    print(f"Floods detected: {stats['floods_detected']}")
+    print(f"Raids detected:  {stats['raids_detected']}")
+
+
+if __name__ == '__main__':
+    main()
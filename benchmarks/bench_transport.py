@@ -0,0 +1,152 @@
+"""Measure how the HTTP transport affects the latency of concurrent Bot API calls.
+
+Sends ``--ops`` sendMessage calls, ``--concurrency`` at a time, through a
+Bot pointed at the local FakeBotAPI while a getUpdates long poll is kept
+open, once per transport:
+
+- shared: one pool of ``--pool-size`` connections for long polls and calls,
+  like a bot built without a separate getUpdates request
+- split: the calls have their own ``--pool-size`` pool, long polls another
+- split-no-keepalive: like split, but every call opens a new connection
+
+    python benchmarks/bench_transport.py --ops 500 --concurrency 32 --pool-size 4 --latency 0.02
+
+The stand-in server only speaks HTTP/1.1, so the effect of HTTP/2
+multiplexing can only be seen against the real Bot API.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot  # noqa: E402
+
+from transport import build_request  # noqa: E402
+
+from fake_bot_api import CREATOR_ID, FakeBotAPI  # noqa: E402
+
+TOKEN = '123456:BENCHMARK'
+
+TRANSPORTS = ('shared', 'split', 'split-no-keepalive')
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def build_bot(name: str, api: FakeBotAPI, pool_size: int) -> Bot:
+    """Build a Bot using the transport called ``name``."""
+    # Calls queue for a connection instead of failing, so the wait shows up as latency
+    settings = {'pool_timeout': None, 'read_timeout': 30}
+    if name == 'shared':
+        request = build_request(pool_size, **settings)
+        return Bot(TOKEN, base_url=api.base_url, request=request, get_updates_request=request)
+    keepalive = 0 if name == 'split-no-keepalive' else None
+    return Bot(
+        TOKEN,
+        base_url=api.base_url,
+        request=build_request(pool_size, keepalive_connections=keepalive, **settings),
+        get_updates_request=build_request(1, **settings)
+    )
+
+
+async def poll(bot: Bot, timeout: int, stop: asyncio.Event) -> None:
+    """Keep a long poll open until ``stop`` is set."""
+    while not stop.is_set():
+        await bot.get_updates(timeout=timeout)
+
+
+async def run_transport(name: str, api: FakeBotAPI, args) -> dict:
+    """Run the load through one transport and summarize it."""
+    bot = build_bot(name, api, args.pool_size)
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def call(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await bot.send_message(chat_id=CREATOR_ID, text=f"Message {index}")
+            latencies.append(time.perf_counter() - started)
+
+    async with bot:
+        stop = asyncio.Event()
+        polling = asyncio.create_task(poll(bot, args.poll_timeout, stop))
+        # Let the long poll take its connection first, as it would in a running bot
+        await asyncio.sleep(0.1)
+        api.reset()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(call(index) for index in range(args.ops)))
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await polling
+
+    return {
+        'transport': name,
+        'ops': len(latencies),
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+    }
+
+
+def print_results(results: list) -> None:
+    header = f"{'transport':<20}{'ops':>6}{'ops/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(
+            f"{result['transport']:<20}{result['ops']:>6}{result['throughput']:>10.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p90_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}"
+        )
+
+
+async def run_benchmarks(args) -> list:
+    api = FakeBotAPI(args.latency, args.jitter)
+    await api.start()
+    try:
+        return [await run_transport(name, api, args) for name in args.transports]
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('transports', nargs='*', metavar='transport',
+                        help=f"transports to compare: {', '.join(TRANSPORTS)} (default: all)")
+    parser.add_argument('--ops', type=int, default=500, help="sendMessage calls per transport")
+    parser.add_argument('--concurrency', type=int, default=32, help="calls in flight at once")
+    parser.add_argument('--pool-size', type=int, default=4, help="connections of the API call pool")
+    parser.add_argument('--poll-timeout', type=int, default=2, help="seconds a long poll is held open")
+    parser.add_argument('--latency', type=float, default=0.02, help="fake API latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    args = parser.parse_args()
+    unknown = set(args.transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error(f"unknown transports: {', '.join(sorted(unknown))}")
+    args.transports = args.transports or list(TRANSPORTS)
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    results = asyncio.run(run_benchmarks(args))
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""A local stand-in for the Telegram Bot API, for offline benchmarks.
+
+Answers the methods the bot uses with plausible results after a configurable
+latency, and can answer a share of requests with a 429 flood wait so the
+rate limiter's retry path is exercised. Every call is counted by method.
+
+    python benchmarks/fake_bot_api.py --port 8081 --latency 0.05 --retry-after-rate 0.01
+
+Point a bot at it with ``base_url=f"http://127.0.0.1:{port}/bot"``.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import zlib
+from collections import Counter
+from urllib.parse import parse_qsl
+
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+# Fixed identities of the fake world
+BOT_ID = 999
+CREATOR_ID = 1
+ADMIN_ID = 2
+
+ACCEPTED_GIFT_TYPES = {
+    'unlimited_gifts': True,
+    'limited_gifts': True,
+    'unique_gifts': True,
+    'premium_subscription': True,
+    'gifts_from_channels': True,
+}
+
+
+def user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': user_id == BOT_ID, 'first_name': f"User{user_id}"}
+
+
+def chat(chat_id: int) -> dict:
+    if chat_id > 0:
+        return {'id': chat_id, 'type': 'private', 'first_name': f"User{chat_id}"}
+    return {'id': chat_id, 'type': 'channel', 'title': f"Channel {chat_id}"}
+
+
+def user_id_for(username: str) -> int:
+    """Give every username a stable user id."""
+    return 100000 + zlib.crc32(username.lower().encode()) % 1000000000
+
+
+class FakeBotAPI:
+    """Serves ``/bot<token>/<method>`` like Telegram would.
+
+    Each request waits ``latency`` seconds (plus up to ``jitter`` more)
+    before it is answered. A ``retry_after_rate`` share of requests is
+    answered with 429 and ``retry_after`` seconds to wait.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, retry_after_rate: float = 0.0,
+                 retry_after: int = 1, host: str = '127.0.0.1', port: int = 0, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.retry_afters = 0
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(100000)
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self) -> None:
+        """Start serving on the event loop; with port 0 the port is picked by the system."""
+        sockets = bind_sockets(self.port, self.host)
+        self.port = sockets[0].getsockname()[1]
+        self._server = HTTPServer(Application([(r'/bot[^/]+/(\w+)', BotAPIHandler, {'api': self})]))
+        self._server.add_sockets(sockets)
+
+    async def stop(self) -> None:
+        self._server.stop()
+        await self._server.close_all_connections()
+
+    def reset(self) -> None:
+        """Forget the call counts."""
+        self.calls.clear()
+        self.retry_afters = 0
+
+    @staticmethod
+    def parse_params(body: bytes, content_type: str) -> dict:
+        """Decode the form or JSON body of a Bot API request."""
+        if not body:
+            return {}
+        if content_type.startswith('application/json'):
+            return json.loads(body)
+        params = {}
+        for name, value in parse_qsl(body.decode()):
+            # Non-string parameters are sent JSON encoded
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        return params
+
+    async def handle(self, method: str, params: dict) -> tuple:
+        """Answer one Bot API call. Returns the HTTP status and the JSON payload."""
+        self.calls[method] += 1
+
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.retry_after_rate and self._random.random() < self.retry_after_rate:
+            self.retry_afters += 1
+            return 429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }
+
+        if method == 'getUpdates':
+            # There are never updates, so long polls are held open like Telegram does
+            await asyncio.sleep(float(params.get('timeout') or 0))
+
+        answer = getattr(self, f"api_{method}", None)
+        if answer is None:
+            # Everything else (bans, deletions, answerCallbackQuery, ...) just succeeds
+            return 200, {'ok': True, 'result': True}
+        return 200, {'ok': True, 'result': answer(params)}
+
+    def message(self, chat_id: int, text: str = None) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': chat(chat_id),
+            'from': user(BOT_ID),
+            'text': text or '',
+        }
+
+    def api_getMe(self, params: dict) -> dict:
+        return {**user(BOT_ID), 'username': 'bench_bot', 'can_join_groups': True}
+
+    def api_getChat(self, params: dict) -> dict:
+        chat_id = params['chat_id']
+        if isinstance(chat_id, str):
+            # @username lookups resolve to a private chat with a stable id
+            username = chat_id.lstrip('@')
+            info = {'id': user_id_for(username), 'type': 'private', 'first_name': username, 'username': username}
+        else:
+            info = chat(chat_id)
+        return {**info, 'accent_color_id': 0, 'max_reaction_count': 11, 'accepted_gift_types': ACCEPTED_GIFT_TYPES}
+
+    def api_getChatAdministrators(self, params: dict) -> list:
+        return [
+            {'status': 'creator', 'user': user(CREATOR_ID), 'is_anonymous': False},
+            {
+                'status': 'administrator', 'user': user(ADMIN_ID), 'can_be_edited': False,
+                'is_anonymous': False, 'can_manage_chat': True, 'can_delete_messages': True,
+                'can_manage_video_chats': True, 'can_restrict_members': True, 'can_promote_members': False,
+                'can_change_info': True, 'can_invite_users': True, 'can_post_stories': True,
+                'can_edit_stories': True, 'can_delete_stories': True,
+            },
+        ]
+
+    def api_getChatMember(self, params: dict) -> dict:
+        user_id = int(params['user_id'])
+        if user_id == CREATOR_ID:
+            return {'status': 'creator', 'user': user(user_id), 'is_anonymous': False}
+        if user_id == ADMIN_ID:
+            return self.api_getChatAdministrators(params)[1]
+        return {'status': 'member', 'user': user(user_id)}
+
+    def api_getUpdates(self, params: dict) -> list:
+        return []
+
+    def api_sendMessage(self, params: dict) -> dict:
+        return self.message(int(params['chat_id']), params.get('text'))
+
+    def api_editMessageText(self, params: dict) -> dict:
+        return self.message(int(params.get('chat_id') or CREATOR_ID), params.get('text'))
+
+    def api_copyMessage(self, params: dict) -> dict:
+        return {'message_id': next(self._message_ids)}
+
+    def api_copyMessages(self, params: dict) -> list:
+        return [{'message_id': next(self._message_ids)} for _ in params['message_ids']]
+
+
+class BotAPIHandler(RequestHandler):
+    """Hands ``/bot<token>/<method>`` requests to the FakeBotAPI."""
+
+    def initialize(self, api: FakeBotAPI) -> None:
+        self.api = api
+
+    async def post(self, method: str) -> None:
+        params = self.api.parse_params(self.request.body, self.request.headers.get('Content-Type', ''))
+        status, payload = await self.api.handle(method, params)
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(payload))
+
+    get = post
+
+
+async def serve(args) -> None:
+    api = FakeBotAPI(args.latency, args.jitter, args.retry_after_rate, args.retry_after, args.host, args.port)
+    await api.start()
+    print(f"Fake Bot API listening on {api.base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before every answer")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="seconds to wait after a 429")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
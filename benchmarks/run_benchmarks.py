@@ -0,0 +1,339 @@
+"""Benchmark the bot's handlers offline against the fake Bot API server.
+
+Each scenario drives one handler of bot.py with synthetic Updates through a
+real ExtBot (HTTP client, rate limiter and all) pointed at a local
+FakeBotAPI, and reports handler latency percentiles, Bot API calls per
+operation and throughput.
+
+    python benchmarks/run_benchmarks.py --ops 200 --latency 0.02 --retry-after-rate 0.01
+
+Scenarios: ban (ban_command), channel_post (handle_channel_post), approval
+(handle_approval_response) and add_users (an add job run by run_add_job).
+
+add_users runs the add pipeline as it is. Usernames resolve, but the
+pipeline invites them with ``bot.invite_chat_member``, which
+python-telegram-bot doesn't have, so as written it can't add anyone:
+every invite fails with AttributeError. The scenario measures that path
+and reports the users that weren't added.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, CallbackContext, ExtBot, Job  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+import bot  # noqa: E402
+import config  # noqa: E402
+from add_jobs import AddJobStore  # noqa: E402
+from dispatch import KeyedUpdateProcessor  # noqa: E402
+from pending_store import PendingPostStore  # noqa: E402
+from ratelimit import PriorityRateLimiter  # noqa: E402
+from resolver import UsernameCache  # noqa: E402
+
+from fake_bot_api import ADMIN_ID, CREATOR_ID, FakeBotAPI  # noqa: E402
+
+TOKEN = '123456:BENCHMARK'
+GROUP_ID = -1001000000000
+CHANNEL_ID = -1002000000000
+
+SCENARIOS = ('ban', 'channel_post', 'approval', 'add_users')
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Scenario:
+    """Builds the Updates of one scenario and runs its handler on them."""
+
+    def __init__(self, application, update_id_start: int):
+        self.application = application
+        self._update_id = update_id_start
+
+    def next_update_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    def update(self, data: dict) -> Update:
+        return Update.de_json({'update_id': self.next_update_id(), **data}, self.application.bot)
+
+    def context(self, update: Update) -> CallbackContext:
+        return CallbackContext.from_update(update, self.application)
+
+    async def prepare(self, ops: int) -> list:
+        """Return the arguments of every operation."""
+        return list(range(ops))
+
+    async def run(self, arg) -> None:
+        raise NotImplementedError
+
+    def notes(self) -> list:
+        """Return what the summary should point out about the operations that ran."""
+        return []
+
+
+class BanScenario(Scenario):
+    """An admin replies /ban to a member's message."""
+
+    def group_message(self, index: int) -> dict:
+        return {
+            'message_id': 10 + index,
+            'date': int(time.time()),
+            'chat': {'id': GROUP_ID - index % 10, 'type': 'supergroup', 'title': 'Bench group'},
+            'from': {'id': ADMIN_ID, 'is_bot': False, 'first_name': 'Admin'},
+            'text': '/ban',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 4}],
+            'reply_to_message': {
+                'message_id': 5 + index,
+                'date': int(time.time()),
+                'chat': {'id': GROUP_ID - index % 10, 'type': 'supergroup', 'title': 'Bench group'},
+                'from': {'id': 5000 + index, 'is_bot': False, 'first_name': 'Spammer'},
+                'text': 'spam',
+            },
+        }
+
+    async def run(self, index: int) -> None:
+        update = self.update({'message': self.group_message(index)})
+        await bot.ban_command(update, self.context(update))
+
+
+class ChannelPostScenario(Scenario):
+    """An admin posts to a channel and the post is moved to the creator for approval."""
+
+    def channel_post(self, index: int) -> dict:
+        return {
+            'message_id': 100 + index,
+            'date': int(time.time()),
+            'chat': {'id': CHANNEL_ID - index % 10, 'type': 'channel', 'title': 'Bench channel'},
+            'from': {'id': ADMIN_ID, 'is_bot': False, 'first_name': 'Admin'},
+            'text': f"Post number {index}",
+        }
+
+    async def run(self, index: int) -> None:
+        update = self.update({'channel_post': self.channel_post(index)})
+        await bot.handle_channel_post(update, self.context(update))
+
+
+class ApprovalScenario(ChannelPostScenario):
+    """The creator approves pending posts; setting them up isn't measured."""
+
+    async def prepare(self, ops: int) -> list:
+        before = set(bot.bot_state(self.application).pending_posts._posts)
+        # Posts are identified by their message, so stay clear of the channel_post scenario's messages
+        await asyncio.gather(*(ChannelPostScenario.run(self, 1000000 + index) for index in range(ops)))
+        return [post_id for post_id in bot.bot_state(self.application).pending_posts._posts if post_id not in before]
+
+    async def run(self, post_id: str) -> None:
+        creator = {'id': CREATOR_ID, 'is_bot': False, 'first_name': 'Owner'}
+        update = self.update({'callback_query': {
+            'id': str(self.next_update_id()),
+            'from': creator,
+            'chat_instance': 'bench',
+            'data': f"approve_{post_id}",
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': CREATOR_ID, 'type': 'private', 'first_name': 'Owner'},
+                'text': 'New post needs approval',
+            },
+        }})
+        await bot.handle_approval_response(update, self.context(update))
+
+
+class AddUsersScenario(Scenario):
+    """A user adds a list of usernames to a channel; every operation uses fresh usernames."""
+
+    def __init__(self, application, update_id_start: int, users_per_op: int):
+        super().__init__(application, update_id_start)
+        self.users_per_op = users_per_op
+        self.added = 0
+        self.failed = 0
+
+    async def run(self, index: int) -> None:
+        usernames = [f"bench_{index}_{number}" for number in range(self.users_per_op)]
+        add_jobs = bot.bot_state(self.application).add_jobs
+        job = add_jobs.create(7000 + index, 7000 + index, CHANNEL_ID, usernames=usernames)
+        await bot.run_add_job(CallbackContext.from_job(Job(bot.run_add_job, data=job.job_id), self.application))
+        job = add_jobs.get(job.job_id)
+        self.added += job.added
+        self.failed += job.failed
+
+    def notes(self) -> list:
+        if not self.failed:
+            return []
+        note = f"{self.failed} of {self.added + self.failed} users were not added"
+        if not hasattr(self.application.bot, 'invite_chat_member'):
+            note += " (add_pipeline calls bot.invite_chat_member, which python-telegram-bot doesn't have)"
+        return [note]
+
+
+async def run_scenario(name: str, scenario: Scenario, api: FakeBotAPI, ops: int, concurrency: int) -> dict:
+    """Run ``ops`` operations, ``concurrency`` at a time, and summarize them."""
+    args = await scenario.prepare(ops)
+    bot.MEMBER_CACHE.clear()
+    bot.ROSTER_CACHE.clear()
+    api.reset()
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(arg) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await scenario.run(arg)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(arg) for arg in args))
+    elapsed = time.perf_counter() - started
+
+    calls = sum(api.calls.values())
+    return {
+        'scenario': name,
+        'ops': len(latencies),
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'calls_per_op': calls / len(latencies) if latencies else 0.0,
+        'calls': dict(api.calls),
+        'retry_afters': api.retry_afters,
+        'notes': scenario.notes(),
+    }
+
+
+def print_results(results: list) -> None:
+    header = f"{'scenario':<14}{'ops':>6}{'ops/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}" \
+             f"{'max ms':>10}{'calls/op':>10}{'429s':>6}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(
+            f"{result['scenario']:<14}{result['ops']:>6}{result['throughput']:>10.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p90_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{result['max_ms']:>10.1f}{result['calls_per_op']:>10.2f}{result['retry_afters']:>6}"
+        )
+    print()
+    for result in results:
+        calls = ', '.join(f"{method}={count}" for method, count in sorted(result['calls'].items()))
+        print(f"{result['scenario']}: {calls}")
+    for result in results:
+        for note in result['notes']:
+            print(f"{result['scenario']}: {note}")
+
+
+async def run_benchmarks(args) -> list:
+    api = FakeBotAPI(args.latency, args.jitter, args.retry_after_rate, args.retry_after)
+    await api.start()
+
+    if args.telegram_limits:
+        rate_limiter = PriorityRateLimiter(
+            global_rate=config.RATE_GLOBAL_PER_SECOND,
+            group_rate_per_minute=config.RATE_GROUP_PER_MINUTE,
+            private_rate=config.RATE_PRIVATE_PER_SECOND,
+            max_retries=config.RATE_MAX_RETRIES
+        )
+    else:
+        # Still goes through the scheduler, but never makes a call wait for a token
+        rate_limiter = PriorityRateLimiter(
+            global_rate=1000000,
+            group_rate_per_minute=60000000,
+            private_rate=1000000,
+            max_retries=config.RATE_MAX_RETRIES
+        )
+
+    bench_bot = ExtBot(
+        TOKEN,
+        base_url=api.base_url,
+        request=HTTPXRequest(connection_pool_size=args.concurrency * 2),
+        rate_limiter=rate_limiter
+    )
+    application = (
+        Application.builder()
+        .bot(bench_bot)
+        .concurrent_updates(KeyedUpdateProcessor(config.UPDATE_CONCURRENCY))
+        .build()
+    )
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        state = bot.BOTS[application] = bot.BotState(
+            PendingPostStore(os.path.join(directory, 'pending.sqlite3'), ttl=config.PENDING_POST_TTL),
+            AddJobStore(os.path.join(directory, 'add_jobs.sqlite3'))
+        )
+        bot.USERNAME_CACHE = UsernameCache(
+            os.path.join(directory, 'usernames.sqlite3'),
+            positive_ttl=config.USERNAME_POSITIVE_TTL,
+            negative_ttl=config.USERNAME_NEGATIVE_TTL
+        )
+        try:
+            async with application:
+                # Add jobs stop early when the application isn't running
+                await application.start()
+                scenarios = {
+                    'ban': BanScenario(application, 0),
+                    'channel_post': ChannelPostScenario(application, 100000),
+                    'approval': ApprovalScenario(application, 200000),
+                    'add_users': AddUsersScenario(application, 300000, args.add_users),
+                }
+                for name in args.scenarios:
+                    ops = args.add_ops if name == 'add_users' else args.ops
+                    results.append(await run_scenario(name, scenarios[name], api, ops, args.concurrency))
+                await application.stop()
+        finally:
+            state.pending_posts.close()
+            state.add_jobs.close()
+            bot.USERNAME_CACHE.close()
+            await api.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--ops', type=int, default=200, help="operations per scenario")
+    parser.add_argument('--add-ops', type=int, default=5, help="add_users operations")
+    parser.add_argument('--add-users', type=int, default=200, help="usernames per add_users operation")
+    parser.add_argument('--concurrency', type=int, default=16, help="operations in flight at once")
+    parser.add_argument('--latency', type=float, default=0.0, help="fake API latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="seconds to wait after a 429")
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help="apply the configured Telegram rate limits instead of unlimited ones")
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    # Handler errors still show up, routine logging doesn't
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    config.PROGRESS_INTERVAL = 0.5
+
+    results = asyncio.run(run_benchmarks(args))
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,145 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove, ChatPermissions
+from telegram import InputMediaAnimation, InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters, ContextTypes, 
-    CallbackQueryHandler, ConversationHandler, CallbackContext
+    CallbackQueryHandler, ConversationHandler, CallbackContext, ChatMemberHandler
 )
+from telegram.error import BadRequest
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import re
+import asyncio
 
-# Set up logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+import config
+from cache import TTLCache, ChannelRoster
+from pending_store import PendingPost, PendingPostStore, pending_post_id
+from add_pipeline import add_users
+from add_jobs import ACTIVE_STATES, CANCELLED, DONE, FAILED, PAUSED, QUEUED, RUNNING, AddJob, AddJobStore
+from resolver import UsernameCache
+from ratelimit import Priority, PriorityRateLimiter, api_priority
+from progress import ProgressReporter
+from webhook import webhook_args, webhook_settings
+from shard import run_sharded, shard_for_chat
+from snapshot import load_snapshot, save_snapshot
+from ingest import IngestStats, iter_chunks, iter_lines, iter_usernames
+from dispatch import KeyedUpdateProcessor
+from bulk import parse_targets, resolve_targets, run_bulk
+from antiflood import FloodDetector
+from persistence import SQLitePersistence
+from prometheus_client import Counter, Gauge
+
+from metrics import REGISTRY, InstrumentedRequest, MetricsServer, instrument_application
+from transport import SharedRequest, build_download_client, build_request
+from multibot import run_bots
+from logqueue import setup_logging, stats as logging_stats
+
+# Set up logging; records are formatted and written off the event loop
+setup_logging(
+    level=logging.getLevelName(config.LOG_LEVEL.upper()),
+    json_format=config.LOG_FORMAT != "text",
+    repeat_limit=config.LOG_REPEAT_LIMIT,
+    repeat_window=config.LOG_REPEAT_WINDOW,
+    queue_size=config.LOG_QUEUE_SIZE
 )
 logger = logging.getLogger(__name__)
 
-# Dictionary to store pending posts: {post_id: {'chat_id': chat_id, 'message': message, 'admin_id': admin_id}}
-PENDING_POSTS = {}
+class BotState:
+    """What one bot keeps to itself when several bots run in this process.
+    
+    The username, membership and roster caches and the HTTP connection pools
+    are shared by every bot; pending posts, add jobs, albums being collected,
+    flood tracking and conversations belong to the bot that saw them.
+    """
+    
+    __slots__ = ('pending_posts', 'add_jobs', 'running_add_jobs', 'album_buffers', 'flood_detector', 'rosters')
+    
+    def __init__(self, pending_posts: PendingPostStore, add_jobs: AddJobStore):
+        # Posts waiting for approval: {post_id: PendingPost}
+        self.pending_posts = pending_posts
+        # Background add jobs and their checkpoints
+        self.add_jobs = add_jobs
+        # Add jobs running in this process: {job_id: None, or PAUSED/CANCELLED when asked to stop}
+        self.running_add_jobs = {}
+        # Albums being collected before approval: {(chat_id, media_group_id): {'messages': [...], 'deadline': float}}
+        self.album_buffers = {}
+        # Automatic flood and raid protection for groups
+        self.flood_detector = FloodDetector(
+            message_limit=config.FLOOD_MESSAGES,
+            message_window=config.FLOOD_WINDOW,
+            chat_message_limit=config.RAID_CHAT_MESSAGES,
+            join_limit=config.RAID_JOINS,
+            join_window=config.RAID_WINDOW,
+            raid_duration=config.RAID_DURATION,
+            flood_action=config.FLOOD_ACTION,
+            raid_action=config.RAID_ACTION,
+            max_chats=config.ANTIFLOOD_MAX_CHATS,
+            max_users_per_chat=config.ANTIFLOOD_MAX_USERS_PER_CHAT
+        )
+        # Channels whose cached roster this bot keeps fresh
+        self.rosters = set()
+
+# State of every bot in this process, in the order they were built: {Application: BotState}
+BOTS = {}
+
+def bot_state(application: Application) -> BotState:
+    """Return the state of the bot running ``application``."""
+    return BOTS[application]
+
+def is_primary(application: Application) -> bool:
+    """Whether ``application`` is the first bot of the process, which looks after the shared state."""
+    return next(iter(BOTS)) is application
+
+# Persistent username -> user_id resolutions, shared by all bots, opened in build_application()
+USERNAME_CACHE = None
+
+# Cache of chat member lookups, shared by all bots: {(chat_id, user_id): ChatMember}
+MEMBER_CACHE = TTLCache(maxsize=config.MEMBER_CACHE_SIZE, ttl=config.MEMBER_CACHE_TTL)
+
+# Chat member lookups in flight, shared by concurrent misses: {(chat_id, user_id): asyncio.Task}
+MEMBER_LOOKUPS = {}
+
+# Cache of channel rosters, shared by all bots: {chat_id: ChannelRoster}
+ROSTER_CACHE = TTLCache(maxsize=config.ROSTER_CACHE_SIZE, ttl=config.ROSTER_CACHE_TTL)
+
+ADMIN_STATUSES = ('administrator', 'creator')
+
+# Metrics endpoint, started in on_startup() when METRICS_PORT is set (off by default)
+METRICS_SERVER = None
+
+# HTTP client streaming uploaded username lists, shared by all bots, opened in on_startup()
+DOWNLOAD_CLIENT = None
+
+# Index of this process in sharded mode (0 otherwise) and the number of shards, set by build_application()
+SHARD_INDEX = 0
+SHARD_COUNT = 1
+
+PENDING_POSTS_GAUGE = Gauge('bot_pending_posts', "Posts waiting for the creator's approval.")
+PENDING_POSTS_GAUGE.set_function(lambda: sum(len(state.pending_posts) for state in BOTS.values()))
+ALBUM_BUFFERS_GAUGE = Gauge('bot_album_buffers', "Albums being collected before approval.")
+ALBUM_BUFFERS_GAUGE.set_function(lambda: sum(len(state.album_buffers) for state in BOTS.values()))
+
+def rate_limiter_waiting() -> int:
+    """Return the API calls of every bot waiting for a rate limit token."""
+    waiting = 0
+    for application in BOTS:
+        if isinstance(application.bot.rate_limiter, PriorityRateLimiter):
+            stats = application.bot.rate_limiter.stats()
+            waiting += stats['global_waiting'] + stats['chat_waiting']
+    return waiting
+
+RATE_LIMITER_WAITING = Gauge('bot_rate_limiter_waiting', "API calls waiting for a rate limit token.")
+RATE_LIMITER_WAITING.set_function(rate_limiter_waiting)
+
+LOG_RECORDS_SUPPRESSED = Gauge(
+    'bot_log_records_suppressed', "Repeated warnings and errors dropped by the log rate limit."
+)
+LOG_RECORDS_SUPPRESSED.set_function(lambda: logging_stats()['suppressed'])
+LOG_RECORDS_DROPPED = Gauge('bot_log_records_dropped', "Log records dropped because the log writer fell behind.")
+LOG_RECORDS_DROPPED.set_function(lambda: logging_stats()['dropped'])
+ADD_JOBS_ACTIVE = Gauge('bot_add_jobs_active', "User addition jobs running.")
+ADD_USERS_REMAINING = Gauge('bot_add_users_remaining', "Users not processed yet by running addition jobs.")
+ADD_USERS = Counter('bot_add_users', "Users processed by addition jobs.", ('outcome',))
 
 # Define conversation states
 CHANNEL, GROUP_LINK, CHANNEL_FOR_GROUP = range(3)
@@ -28,8 +151,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "Available commands:\n"
         "/ban - Ban a user (reply to their message)\n"
         "/unban - Unban a user (reply to their message)\n"
+        "/bulkban, /bulkunban, /bulkrestrict - Moderate many users at once\n"
         "/add - Add users from a group to a channel\n"
         "/addgroup - Add users from a specific group link\n"
+        "/jobs - List your add jobs\n"
+        "/pending - Review the posts waiting for your approval\n"
         "/help - Show this help message"
     )
 
@@ -39,8 +165,16 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "Available commands:\n"
         "/ban - Ban a user (reply to their message)\n"
         "/unban - Unban a user (reply to their message)\n"
+        "/bulkban <ids or usernames> - Ban many users (or reply to a .txt file with the list)\n"
+        "/bulkunban <ids or usernames> - Unban many users\n"
+        "/bulkrestrict <ids or usernames> - Mute many users\n"
         "/add - Start the user addition wizard\n"
         "/addgroup <group_link> - Add users from a specific group link\n"
+        "/jobs - List your add jobs\n"
+        "/jobstatus <job> - Show the progress of an add job\n"
+        "/pausejob, /resumejob, /canceljob <job> - Control an add job\n"
+        "/pending [channel_id] - Page through the posts waiting for your approval and approve or reject them all\n"
+        "/cachestats - Show membership cache statistics\n"
         "/help - Show this help message\n\n"
         "Channel Features:\n"
         "• All posts from admins are sent to the channel creator for approval\n"
@@ -48,6 +182,33 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "• You can add users from a group to a channel using the /add or /addgroup commands"
     )
 
+async def get_chat_member_cached(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int):
+    """Get a chat member, serving repeated lookups from MEMBER_CACHE.
+    
+    Concurrent misses for the same member wait for a single get_chat_member call.
+    """
+    key = (chat_id, user_id)
+    member = MEMBER_CACHE.get(key)
+    if member is not None:
+        return member
+    
+    lookup = MEMBER_LOOKUPS.get(key)
+    if lookup is None:
+        lookup = MEMBER_LOOKUPS[key] = asyncio.ensure_future(
+            context.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+        )
+        lookup.add_done_callback(lambda done: member_lookup_done(key, done))
+    # One waiter being cancelled mustn't cancel the lookup the others are waiting for
+    return await asyncio.shield(lookup)
+
+def member_lookup_done(key: tuple, lookup: asyncio.Future) -> None:
+    """Cache the result of a finished lookup, unless the member was invalidated meanwhile."""
+    if MEMBER_LOOKUPS.get(key) is not lookup:
+        return
+    del MEMBER_LOOKUPS[key]
+    if not lookup.cancelled() and lookup.exception() is None:
+        MEMBER_CACHE.set(key, lookup.result())
+
 async def check_admin_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if the user is an admin or the creator of the group."""
     try:
@@ -55,7 +216,7 @@ async def check_admin_status(update: Update, context: ContextTypes.DEFAULT_TYPE)
         user_id = update.effective_user.id
         
         # Get the member status
-        member = await context.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+        member = await get_chat_member_cached(context, chat_id, user_id)
         
         # Check if the user is an admin or the creator
         if member.status in ['administrator', 'creator']:
@@ -64,7 +225,7 @@ async def check_admin_status(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("Only admins can use this command.")
             return False
     except Exception as e:
-        logger.error(f"Error checking admin status: {e}")
+        logger.error("Error checking admin status: %s", e)
         await update.message.reply_text("An error occurred while checking admin permissions.")
         return False
 
@@ -93,7 +254,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_to_ban.id)
         await update.message.reply_text(f"User {user_to_ban.first_name} has been banned.")
     except Exception as e:
-        logger.error(f"Error banning user: {e}")
+        logger.error("Error banning user: %s", e)
         await update.message.reply_text("An error occurred while trying to ban the user.")
 
 async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -116,9 +277,154 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await context.bot.unban_chat_member(chat_id=chat_id, user_id=user_to_unban.id)
         await update.message.reply_text(f"User {user_to_unban.first_name} has been unbanned.")
     except Exception as e:
-        logger.error(f"Error unbanning user: {e}")
+        logger.error("Error unbanning user: %s", e)
         await update.message.reply_text("An error occurred while trying to unban the user.")
 
+async def apply_moderation(bot, chat_id: int, user_id: int, action: str, until_date: datetime = None) -> None:
+    """Ban, unban or restrict (mute) a user in a group."""
+    if action == 'ban':
+        await bot.ban_chat_member(chat_id=chat_id, user_id=user_id, until_date=until_date)
+    elif action == 'unban':
+        await bot.unban_chat_member(chat_id=chat_id, user_id=user_id, only_if_banned=True)
+    elif action == 'restrict':
+        await bot.restrict_chat_member(
+            chat_id=chat_id,
+            user_id=user_id,
+            permissions=ChatPermissions.no_permissions(),
+            until_date=until_date
+        )
+    else:
+        raise ValueError(f"Unknown moderation action: {action}")
+
+# Bulk moderation: {action: (verb, past tense)}
+BULK_ACTIONS = {
+    'ban': ('ban', 'banned'),
+    'unban': ('unban', 'unbanned'),
+    'restrict': ('restrict', 'restricted'),
+}
+
+async def read_bulk_targets(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Collect the target list from the command arguments and a replied-to .txt/.csv file."""
+    text = ' '.join(context.args or [])
+    
+    # A CommandHandler only sees text messages, so a file can only come with the message replied to
+    reply = update.message.reply_to_message
+    document = reply.document if reply else None
+    if document:
+        if document.file_size and document.file_size > config.BULK_MAX_FILE_SIZE:
+            raise ValueError(f"The file is too large (limit is {config.BULK_MAX_FILE_SIZE // 1024} KB)")
+        file = await context.bot.get_file(document.file_id)
+        data = await file.download_as_bytearray()
+        text += '\n' + data.decode('utf-8', errors='ignore')
+    
+    return text
+
+async def run_bulk_moderation(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str) -> None:
+    """Ban, unban or restrict every user in the given list."""
+    verb, past = BULK_ACTIONS[action]
+    
+    # Check admin status once for the whole batch
+    if not await check_admin_status(update, context):
+        return
+    
+    try:
+        targets, invalid = parse_targets(await read_bulk_targets(update, context))
+    except Exception as e:
+        logger.error("Error reading bulk targets: %s", e)
+        await update.message.reply_text(f"I couldn't read the list of users: {e}")
+        return
+    
+    if not targets:
+        await update.message.reply_text(
+            f"Please provide user IDs or usernames after the command, for example:\n"
+            f"/bulk{action} 12345 @spammer1 @spammer2\n"
+            "or reply to a .txt file with one user per line."
+        )
+        return
+    
+    chat_id = update.effective_chat.id
+    progress_message = await update.message.reply_text(f"Starting to {verb} {len(targets)} users...")
+    progress = ProgressReporter(progress_message, interval=config.PROGRESS_INTERVAL, label="users")
+    
+    async def moderate(target) -> None:
+        user_id = resolved[target]
+        if isinstance(user_id, Exception):
+            raise user_id
+        if user_id in (update.effective_user.id, context.bot.id):
+            raise ValueError("Refusing to act on yourself or the bot")
+        await apply_moderation(context.bot, chat_id, user_id, action)
+    
+    async def report_progress(report) -> None:
+        progress.update(report.processed, report.total, f"Done: {report.succeeded}, Failed: {len(report.failures)}")
+    
+    with api_priority(Priority.MODERATION):
+        resolved = await resolve_targets(context.bot, targets, USERNAME_CACHE)
+        report = await run_bulk(targets, moderate, concurrency=config.BULK_CONCURRENCY, on_progress=report_progress)
+    await progress.finish()
+    
+    failures = [(token, "not a user ID or username") for token in invalid] + report.failures
+    text = (
+        f"Bulk {verb} complete in {report.elapsed:.1f}s!\n\n"
+        f"✅ {past.capitalize()}: {report.succeeded} users\n"
+        f"❌ Failed: {len(failures)}"
+    )
+    if failures:
+        failed_list = '\n'.join(f"{target}: {reason}" for target, reason in failures[:10])
+        additional_failed = len(failures) - 10 if len(failures) > 10 else 0
+        text += f"\n\nFailures (first 10):\n{failed_list}"
+        if additional_failed:
+            text += f"\n... and {additional_failed} more"
+    await update.message.reply_text(text)
+
+async def bulk_ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ban a list of users from the group."""
+    await run_bulk_moderation(update, context, 'ban')
+
+async def bulk_unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Unban a list of users from the group."""
+    await run_bulk_moderation(update, context, 'unban')
+
+async def bulk_restrict_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mute a list of users in the group."""
+    await run_bulk_moderation(update, context, 'restrict')
+
+async def watch_group_messages(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Feed every group message and join into the flood detector and act on what it reports."""
+    message = update.message
+    if not message or not message.from_user or message.sender_chat:
+        return
+    chat_id = message.chat_id
+    flood_detector = bot_state(context.application).flood_detector
+    
+    if message.new_chat_members:
+        action = flood_detector.on_join(chat_id, len(message.new_chat_members))
+        if action:
+            for member in message.new_chat_members:
+                if not member.is_bot:
+                    context.application.create_task(enforce_flood_action(context, chat_id, member, action, "raid"))
+        return
+    
+    action = flood_detector.on_message(chat_id, message.from_user.id)
+    if action:
+        context.application.create_task(enforce_flood_action(context, chat_id, message.from_user, action, "flood"))
+
+async def enforce_flood_action(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user, action: str, reason: str) -> None:
+    """Apply an automatic moderation action, sparing admins."""
+    try:
+        member = await get_chat_member_cached(context, chat_id, user.id)
+        if member.status in ADMIN_STATUSES:
+            return
+        
+        until_date = None
+        if action == 'restrict':
+            # Naive datetimes are taken as UTC, so it must be an aware one
+            until_date = datetime.now(timezone.utc) + timedelta(seconds=config.FLOOD_MUTE_SECONDS)
+        with api_priority(Priority.MODERATION):
+            await apply_moderation(context.bot, chat_id, user.id, action, until_date)
+        logger.info("Automatic %s of user %s in chat %s (%s detected)", action, user.id, chat_id, reason)
+    except Exception as e:
+        logger.error("Error applying automatic %s to user %s: %s", action, user.id, e)
+
 async def handle_text_commands(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle text-based 'ban' and 'unban' commands for backward compatibility."""
     text = update.message.text.lower()
@@ -128,18 +434,86 @@ async def handle_text_commands(update: Update, context: ContextTypes.DEFAULT_TYP
     elif text == "unban":
         await unban_command(update, context)
 
-async def check_user_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Check if the user is an admin, creator, or regular member."""
-    try:
-        chat_id = update.effective_chat.id
-        user_id = update.effective_user.id
-        
-        # Get the member status
-        member = await context.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
-        return member.status
-    except Exception as e:
-        logger.error(f"Error checking user status: {e}")
-        return None
+async def fetch_channel_roster(bot, chat_id: int) -> ChannelRoster:
+    """Fetch the title and administrators of a channel and cache them in ROSTER_CACHE."""
+    chat, admins = await asyncio.gather(
+        bot.get_chat(chat_id),
+        bot.get_chat_administrators(chat_id)
+    )
+    creator = next((admin.user for admin in admins if admin.status == 'creator'), None)
+    roster = ChannelRoster(
+        chat_id=chat_id,
+        title=chat.title,
+        creator=creator,
+        admins={admin.user.id: admin.status for admin in admins}
+    )
+    ROSTER_CACHE.set(chat_id, roster)
+    return roster
+
+async def get_channel_roster(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> ChannelRoster:
+    """Get a channel roster, fetching it on first use."""
+    roster = ROSTER_CACHE.get(chat_id)
+    if roster is None:
+        roster = await fetch_channel_roster(context.bot, chat_id)
+    # The bot that uses a roster keeps it fresh; another bot may not be in the channel
+    bot_state(context.application).rosters.add(chat_id)
+    return roster
+
+async def refresh_channel_rosters(context: CallbackContext) -> None:
+    """Periodically re-fetch the cached rosters this bot uses so the approval path never waits for one."""
+    rosters = bot_state(context.application).rosters
+    # Forget the channels whose roster expired or was dropped
+    rosters.intersection_update(ROSTER_CACHE.keys())
+    chat_ids = list(rosters)
+    if not chat_ids:
+        return
+    
+    results = await asyncio.gather(
+        *(fetch_channel_roster(context.bot, chat_id) for chat_id in chat_ids),
+        return_exceptions=True
+    )
+    for chat_id, result in zip(chat_ids, results):
+        if isinstance(result, Exception):
+            logger.error("Error refreshing roster for channel %s: %s", chat_id, result)
+            ROSTER_CACHE.invalidate(chat_id)
+            rosters.discard(chat_id)
+
+async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop cached membership when a member (or the bot itself) is promoted, demoted or leaves."""
+    member_update = update.chat_member or update.my_chat_member
+    if not member_update:
+        return
+    
+    chat_id = member_update.chat.id
+    user_id = member_update.new_chat_member.user.id
+    MEMBER_CACHE.invalidate((chat_id, user_id))
+    MEMBER_LOOKUPS.pop((chat_id, user_id), None)
+    
+    # The roster only changes when an admin is involved or the bot's own rights change
+    statuses = {member_update.old_chat_member.status, member_update.new_chat_member.status}
+    if update.my_chat_member or statuses.intersection(ADMIN_STATUSES):
+        ROSTER_CACHE.invalidate(chat_id)
+
+async def cache_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the membership and username cache hit/miss counters."""
+    # Check if user is admin
+    if not await check_admin_status(update, context):
+        return
+    
+    stats = MEMBER_CACHE.stats()
+    username_stats = USERNAME_CACHE.stats()
+    flood_stats = bot_state(context.application).flood_detector.stats()
+    await update.message.reply_text(
+        "Membership cache:\n"
+        f"Entries: {stats['size']}/{stats['maxsize']}\n"
+        f"Hits: {stats['hits']}, Misses: {stats['misses']} ({stats['hit_rate']:.0%} hit rate)\n"
+        f"Evictions: {stats['evictions']}\n\n"
+        "Username cache:\n"
+        f"Hits: {username_stats['hits']}, Misses: {username_stats['misses']}\n\n"
+        "Flood protection:\n"
+        f"Chats tracked: {flood_stats['chats']}\n"
+        f"Floods: {flood_stats['floods_detected']}, Raids: {flood_stats['raids_detected']}"
+    )
 
 async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle posts in channels - require approval from creator for admin posts."""
@@ -158,71 +532,294 @@ async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     
-    # Check if the poster is an admin but not the creator
-    user_status = await check_user_status(update, context)
+    try:
+        # Admins, creator and title all come from the cached roster
+        roster = await get_channel_roster(context, chat_id)
+    except Exception as e:
+        logger.error("Error getting channel roster: %s", e)
+        return
     
-    if user_status == 'administrator':
-        # Find the creator of the channel
-        chat = await context.bot.get_chat(chat_id)
-        
+    # Check if the poster is an admin but not the creator
+    if roster.status_of(user_id) == 'administrator':
         # Some channels may not have a primary creator accessible via API
         # In that case, we'll use a designated admin as the approver
         # This would need to be configured separately
+        if not roster.creator:
+            # If we can't find the creator, let the post through
+            logger.warning("Could not find channel creator, allowing post without approval")
+            return
+        
+        # An edit of a post waiting for approval updates it instead of asking again
+        if update.edited_channel_post and await apply_post_edit(context, roster, post):
+            return
+        
+        if post.media_group_id:
+            # Albums arrive as one update per item, collect them into a single approval
+            buffer_album_part(context, roster, post, update.effective_user)
+        else:
+            await request_approval(context, roster, [post], update.effective_user)
+    
+    # If it's the creator posting or we had an error, do nothing and let the post go through
+
+def buffer_album_part(context: ContextTypes.DEFAULT_TYPE, roster: ChannelRoster, post, admin) -> None:
+    """Collect the items of an album until no new item arrived for ALBUM_DEBOUNCE seconds."""
+    key = (post.chat_id, post.media_group_id)
+    album_buffers = bot_state(context.application).album_buffers
+    album = album_buffers.get(key)
+    if album is None:
+        album = album_buffers[key] = {'messages': [], 'deadline': 0.0}
+        context.application.create_task(flush_album(context, roster, key, admin))
+    album['messages'].append(post)
+    album['deadline'] = asyncio.get_running_loop().time() + config.ALBUM_DEBOUNCE
+
+async def flush_album(context: ContextTypes.DEFAULT_TYPE, roster: ChannelRoster, key: tuple, admin) -> None:
+    """Wait for the album to be complete, then request approval for it as one post."""
+    loop = asyncio.get_running_loop()
+    album_buffers = bot_state(context.application).album_buffers
+    album = album_buffers[key]
+    while loop.time() < album['deadline']:
+        await asyncio.sleep(album['deadline'] - loop.time())
+    del album_buffers[key]
+    
+    messages = sorted(album['messages'], key=lambda message: message.message_id)
+    await request_approval(context, roster, messages, admin)
+
+def approval_keyboard(post_id: str) -> InlineKeyboardMarkup:
+    """Approve/reject buttons of a pending post."""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("Approve", callback_data=f"approve_{post_id}"),
+            InlineKeyboardButton("Reject", callback_data=f"reject_{post_id}")
+        ]
+    ])
+
+def input_media_of(message):
+    """Return the InputMedia that puts the media and caption of ``message`` into a preview, or None."""
+    caption = {'caption': message.caption, 'caption_entities': message.caption_entities}
+    if message.photo:
+        return InputMediaPhoto(message.photo[-1].file_id, **caption)
+    if message.video:
+        return InputMediaVideo(message.video.file_id, **caption)
+    # Animations come with a document too, so they are checked first
+    if message.animation:
+        return InputMediaAnimation(message.animation.file_id, **caption)
+    if message.document:
+        return InputMediaDocument(message.document.file_id, **caption)
+    if message.audio:
+        return InputMediaAudio(message.audio.file_id, **caption)
+    return None
+
+async def update_preview(context: ContextTypes.DEFAULT_TYPE, pending: PendingPost, preview_id: int, message) -> bool:
+    """Make the preview ``preview_id`` of a pending post match the edited ``message``. Returns False if it can't."""
+    try:
+        if message.text is not None:
+            await context.bot.edit_message_text(
+                chat_id=pending.source_chat_id,
+                message_id=preview_id,
+                text=message.text,
+                entities=message.entities
+            )
+            return True
         
+        # The media may have been replaced too, so the whole preview is replaced, not just its caption
+        media = input_media_of(message)
+        if media is None:
+            logger.error("Can't update the preview of pending post %s with a %s", pending.post_id, pending.kind)
+            return False
+        await context.bot.edit_message_media(
+            chat_id=pending.source_chat_id,
+            message_id=preview_id,
+            media=media
+        )
+    except BadRequest as e:
+        # Telegram refuses edits that change nothing, e.g. a re-sent edit
+        if "not modified" not in str(e).lower():
+            logger.error("Error updating the preview of pending post %s: %s", pending.post_id, e)
+            return False
+    return True
+
+async def discard_pending_post(context: ContextTypes.DEFAULT_TYPE, pending: PendingPost) -> None:
+    """Drop a pending post together with its preview and approval request."""
+    bot_state(context.application).pending_posts.pop(pending.post_id)
+    message_ids = list(pending.source_message_ids)
+    if pending.approval_message_id:
+        message_ids.append(pending.approval_message_id)
+    try:
+        await context.bot.delete_messages(chat_id=pending.source_chat_id, message_ids=message_ids)
+    except BadRequest as e:
+        logger.error("Error deleting the preview of pending post %s: %s", pending.post_id, e)
+
+def approval_request_text(pending: PendingPost, title: str, edited: bool = False, stale_item: int = None) -> str:
+    """Text of the message asking the creator to approve a pending post.
+    
+    ``stale_item`` is the album item whose edit the preview couldn't follow.
+    """
+    if pending.kind == 'album':
+        description = f"New album of {len(pending.source_message_ids)} items"
+    else:
+        description = "New post"
+    text = f"{description} from admin {pending.admin_name} needs approval for channel {title}."
+    if stale_item:
+        text += (
+            f"\n\n⚠️ The admin edited item {stale_item}, but its preview couldn't be updated: "
+            "approving publishes the previous version."
+        )
+    elif edited:
+        text += "\n\n✏️ The admin edited the post; the preview shows the latest version."
+    return text
+
+async def apply_post_edit(context: ContextTypes.DEFAULT_TYPE, roster: ChannelRoster, message) -> bool:
+    """Apply an edited channel message to the post it belongs to. Returns False if it isn't pending.
+    
+    Album items still being collected are replaced in the buffer. For a pending
+    post, the preview is edited in place and the approval message updated,
+    so the creator doesn't get a second request. A single post whose preview
+    can't be updated is dropped and False returned, so it is asked for again.
+    """
+    state = bot_state(context.application)
+    if message.media_group_id:
+        album = state.album_buffers.get((message.chat_id, message.media_group_id))
+        if album is not None:
+            album['messages'] = [
+                message if item.message_id == message.message_id else item for item in album['messages']
+            ]
+            return True
+    
+    pending = state.pending_posts.get(pending_post_id(message))
+    if pending is None:
+        return False
+    
+    index = pending.message_ids.index(message.message_id) if message.message_id in pending.message_ids else 0
+    stale_item = None
+    if not await update_preview(context, pending, pending.source_message_ids[index], message):
+        if pending.kind != 'album':
+            # Approving would publish the old version, so ask for the edited post afresh
+            await discard_pending_post(context, pending)
+            return False
+        # The album can't be asked for again without its other items, so say the preview is outdated
+        stale_item = index + 1
+    
+    # Replace the pending content in place, unless the preview still shows the old one
+    if stale_item is None:
+        if pending.kind == 'album':
+            if message.caption or index == 0:
+                pending.text = message.caption
+        else:
+            pending.text = message.text or message.caption
+        state.pending_posts.add(pending)
+    
+    if pending.approval_message_id:
         try:
-            # Try to get chat administrators and find the creator
-            admins = await context.bot.get_chat_administrators(chat_id)
-            creator = next((admin.user for admin in admins if admin.status == 'creator'), None)
-            
-            if creator:
-                # Store the post for approval
-                post_id = f"{chat_id}_{datetime.now().timestamp()}"
-                
-                # Store message content, possibly handle different message types
-                message_content = post.text or "Non-text content"
-                
-                PENDING_POSTS[post_id] = {
-                    'chat_id': chat_id,
-                    'message': post,
-                    'admin_id': user_id,
-                    'admin_name': update.effective_user.full_name
-                }
-                
-                # Create approval buttons
-                keyboard = [
-                    [
-                        InlineKeyboardButton("Approve", callback_data=f"approve_{post_id}"),
-                        InlineKeyboardButton("Reject", callback_data=f"reject_{post_id}")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                # Send approval request to creator
-                await context.bot.send_message(
-                    chat_id=creator.id,
-                    text=f"New post from admin {update.effective_user.full_name} needs approval for channel {chat.title}:\n\n{message_content}",
-                    reply_markup=reply_markup
-                )
-                
-                # Delete the original message to prevent it from being posted
-                await context.bot.delete_message(chat_id=chat_id, message_id=post.message_id)
-                
-                # Notify admin that post is pending approval
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=f"Your post to {chat.title} has been sent to the channel owner for approval."
-                    )
-                except Exception as e:
-                    logger.error(f"Could not notify admin: {e}")
-            else:
-                # If we can't find the creator, let the post through
-                logger.warning("Could not find channel creator, allowing post without approval")
-                
+            await context.bot.edit_message_text(
+                chat_id=pending.source_chat_id,
+                message_id=pending.approval_message_id,
+                text=approval_request_text(pending, roster.title, edited=True, stale_item=stale_item),
+                reply_markup=approval_keyboard(pending.post_id)
+            )
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.error("Error updating the approval request of pending post %s: %s", pending.post_id, e)
+    return True
+
+async def request_approval(context: ContextTypes.DEFAULT_TYPE, roster: ChannelRoster, messages: list, admin) -> None:
+    """Move a post (one message, or all items of an album) from the channel to the creator for approval."""
+    chat_id = roster.chat_id
+    creator = roster.creator
+    message_ids = [message.message_id for message in messages]
+    pending_posts = bot_state(context.application).pending_posts
+    
+    try:
+        # Store the post for approval
+        post_id = pending_post_id(messages[0])
+        pending = PendingPost.from_message(post_id, messages[0], admin.id, admin.full_name)
+        
+        # Copy the post to the creator as a preview; approving publishes a copy of it
+        if len(messages) == 1:
+            preview_ids = [(await context.bot.copy_message(
+                chat_id=creator.id,
+                from_chat_id=chat_id,
+                message_id=message_ids[0]
+            )).message_id]
+        else:
+            # copy_messages keeps the items grouped as an album
+            pending.kind = 'album'
+            pending.text = next((message.caption for message in messages if message.caption), None)
+            pending.message_ids = message_ids
+            preview_ids = [copy.message_id for copy in await context.bot.copy_messages(
+                chat_id=creator.id,
+                from_chat_id=chat_id,
+                message_ids=message_ids
+            )]
+        pending.source_chat_id = creator.id
+        pending.source_message_ids = preview_ids
+        pending_posts.add(pending)
+        
+        # Send approval request to creator, attached to the preview
+        approval_message = await context.bot.send_message(
+            chat_id=creator.id,
+            text=approval_request_text(pending, roster.title),
+            reply_to_message_id=preview_ids[0],
+            reply_markup=approval_keyboard(post_id)
+        )
+        # Remembered so edits of the post can update the request
+        pending.approval_message_id = approval_message.message_id
+        pending_posts.add(pending)
+        
+        # Delete the original messages to prevent them from being posted
+        if len(message_ids) == 1:
+            await context.bot.delete_message(chat_id=chat_id, message_id=message_ids[0])
+        else:
+            await context.bot.delete_messages(chat_id=chat_id, message_ids=message_ids)
+        
+        # Notify admin that post is pending approval
+        try:
+            await context.bot.send_message(
+                chat_id=admin.id,
+                text=f"Your post to {roster.title} has been sent to the channel owner for approval."
+            )
         except Exception as e:
-            logger.error(f"Error processing channel post: {e}")
+            logger.error("Could not notify admin: %s", e)
+            
+    except Exception as e:
+        logger.error("Error processing channel post: %s", e)
+
+async def publish_posts(context: ContextTypes.DEFAULT_TYPE, posts: list) -> None:
+    """Publish approved posts, in order, by copying their previews to the channels.
     
-    # If it's the creator posting or we had an error, do nothing and let the post go through
+    Copying works for every content type and keeps formatting, entities and
+    albums. Consecutive posts for the same channel share one copy_messages call.
+    """
+    batch = []
+    for post in posts:
+        if batch and (batch[0].chat_id, batch[0].source_chat_id) != (post.chat_id, post.source_chat_id):
+            await _copy_batch(context, batch)
+            batch = []
+        batch.append(post)
+    if batch:
+        await _copy_batch(context, batch)
+
+async def _copy_batch(context: ContextTypes.DEFAULT_TYPE, posts: list) -> None:
+    """Copy the previews of posts sharing a channel and a source chat."""
+    message_ids = [message_id for post in posts for message_id in post.source_message_ids]
+    if len(message_ids) == 1:
+        await context.bot.copy_message(
+            chat_id=posts[0].chat_id,
+            from_chat_id=posts[0].source_chat_id,
+            message_id=message_ids[0]
+        )
+        return
+    
+    # copy_messages accepts up to 100 ids and keeps their order
+    for start in range(0, len(message_ids), 100):
+        await context.bot.copy_messages(
+            chat_id=posts[0].chat_id,
+            from_chat_id=posts[0].source_chat_id,
+            message_ids=message_ids[start:start + 100]
+        )
+
+async def publish_post(context: ContextTypes.DEFAULT_TYPE, post: PendingPost) -> None:
+    """Publish one approved post to its channel."""
+    await publish_posts(context, [post])
 
 async def handle_approval_response(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle creator's response to post approval request."""
@@ -234,87 +831,16 @@ async def handle_approval_response(update: Update, context: ContextTypes.DEFAULT
     action = data[0]
     post_id = "_".join(data[1:])  # Reconstruct post_id in case it contains underscores
     
-    if post_id in PENDING_POSTS:
-        post_data = PENDING_POSTS[post_id]
-        chat_id = post_data['chat_id']
-        admin_id = post_data['admin_id']
-        admin_name = post_data['admin_name']
-        message = post_data['message']
+    post = bot_state(context.application).pending_posts.pop(post_id)
+    if post:
+        admin_id = post.admin_id
+        admin_name = post.admin_name
         
         if action == "approve":
             try:
-                # Forward the approved message to the channel based on its type
-                if message.text:
-                    await context.bot.send_message(chat_id=chat_id, text=message.text)
-                
-                elif message.photo:
-                    # Handle photos
-                    photo = message.photo[-1]  # Get the largest photo
-                    await context.bot.send_photo(
-                        chat_id=chat_id, 
-                        photo=photo.file_id, 
-                        caption=message.caption
-                    )
-                
-                elif message.video:
-                    # Handle videos
-                    await context.bot.send_video(
-                        chat_id=chat_id,
-                        video=message.video.file_id,
-                        caption=message.caption
-                    )
-                
-                elif message.document:
-                    # Handle documents/files
-                    await context.bot.send_document(
-                        chat_id=chat_id,
-                        document=message.document.file_id,
-                        caption=message.caption
-                    )
-                
-                elif message.audio:
-                    # Handle audio files
-                    await context.bot.send_audio(
-                        chat_id=chat_id,
-                        audio=message.audio.file_id,
-                        caption=message.caption
-                    )
-                
-                elif message.voice:
-                    # Handle voice messages
-                    await context.bot.send_voice(
-                        chat_id=chat_id,
-                        voice=message.voice.file_id,
-                        caption=message.caption
-                    )
-                
-                elif message.animation:
-                    # Handle GIFs/animations
-                    await context.bot.send_animation(
-                        chat_id=chat_id,
-                        animation=message.animation.file_id,
-                        caption=message.caption
-                    )
-                
-                elif message.poll:
-                    # Handle polls
-                    # We need to recreate the poll as polls can't be forwarded by file_id
-                    await context.bot.send_poll(
-                        chat_id=chat_id,
-                        question=message.poll.question,
-                        options=[option.text for option in message.poll.options],
-                        is_anonymous=message.poll.is_anonymous,
-                        allows_multiple_answers=message.poll.allows_multiple_answers,
-                        type=message.poll.type
-                    )
-                
-                else:
-                    # For any other types we don't handle specifically
-                    logger.warning(f"Unhandled message type for post {post_id}")
-                    await context.bot.send_message(
-                        chat_id=chat_id,
-                        text="Content was approved but could not be properly forwarded due to unsupported format."
-                    )
+                # Publish the approved content ahead of notifications and background work
+                with api_priority(Priority.PUBLISHING):
+                    await publish_post(context, post)
                 
                 await query.edit_message_text(text=f"✅ Post from {admin_name} has been approved and published.")
                 
@@ -325,10 +851,10 @@ async def handle_approval_response(update: Update, context: ContextTypes.DEFAULT
                         text=f"Your post to the channel has been approved and published."
                     )
                 except Exception as e:
-                    logger.error(f"Could not notify admin about approval: {e}")
+                    logger.error("Could not notify admin about approval: %s", e)
                     
             except Exception as e:
-                logger.error(f"Error publishing approved post: {e}")
+                logger.error("Error publishing approved post: %s", e)
                 await query.edit_message_text(text=f"⚠️ Error publishing the post: {str(e)}")
         
         elif action == "reject":
@@ -341,13 +867,180 @@ async def handle_approval_response(update: Update, context: ContextTypes.DEFAULT
                     text=f"Your post to the channel has been rejected by the channel owner."
                 )
             except Exception as e:
-                logger.error(f"Could not notify admin about rejection: {e}")
-        
-        # Clean up the pending post
-        del PENDING_POSTS[post_id]
+                logger.error("Could not notify admin about rejection: %s", e)
     else:
         await query.edit_message_text(text="This approval request is no longer valid.")
 
+async def channel_title(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> str:
+    """Return a channel's title from its roster, or its id if the roster can't be fetched."""
+    try:
+        return (await get_channel_roster(context, chat_id)).title
+    except Exception as e:
+        logger.error("Error getting channel roster: %s", e)
+        return str(chat_id)
+
+def pending_post_line(number: int, post: PendingPost) -> str:
+    """One line describing a pending post in the /pending listing."""
+    line = f"{number}. {post.kind} by {post.admin_name}, {datetime.fromtimestamp(post.created_at):%Y-%m-%d %H:%M}"
+    text = (post.text or '').replace('\n', ' ')
+    if len(text) > 40:
+        text = text[:40] + '…'
+    return f"{line}: {text}" if text else line
+
+async def render_pending_page(context: ContextTypes.DEFAULT_TYPE, approver_id: int, chat_id: int, page: int) -> tuple:
+    """Return the text and buttons of one page of the posts a channel has waiting for approval."""
+    posts = bot_state(context.application).pending_posts.for_channel(approver_id, chat_id)
+    if not posts:
+        return "No posts are waiting for your approval in this channel.", None
+    
+    size = config.PENDING_PAGE_SIZE
+    pages = (len(posts) + size - 1) // size
+    page = max(0, min(page, pages - 1))
+    start = page * size
+    lines = [pending_post_line(start + number + 1, post) for number, post in enumerate(posts[start:start + size])]
+    text = (
+        f"{len(posts)} posts waiting for approval in {await channel_title(context, chat_id)} "
+        f"(page {page + 1} of {pages}):\n\n" + '\n'.join(lines)
+    )
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Previous", callback_data=f"pending_{chat_id}_{page - 1}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"pending_{chat_id}_{page + 1}"))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([
+        InlineKeyboardButton("Approve all", callback_data=f"approveall_{chat_id}"),
+        InlineKeyboardButton("Reject all", callback_data=f"rejectall_{chat_id}")
+    ])
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """List the channels with posts waiting for the user's approval, or the posts of one channel."""
+    approver_id = update.effective_user.id
+    if context.args:
+        try:
+            chat_id = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("Please provide a channel ID, for example: /pending -1001234567890")
+            return
+        text, reply_markup = await render_pending_page(context, approver_id, chat_id, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        return
+    
+    channels = bot_state(context.application).pending_posts.channels(approver_id)
+    if not channels:
+        await update.message.reply_text("No posts are waiting for your approval.")
+        return
+    titles = await asyncio.gather(*(channel_title(context, chat_id) for chat_id in channels))
+    keyboard = [
+        [InlineKeyboardButton(f"{title} ({count})", callback_data=f"pending_{chat_id}_0")]
+        for title, (chat_id, count) in zip(titles, channels.items())
+    ]
+    await update.message.reply_text(
+        f"{sum(channels.values())} posts are waiting for your approval. Choose a channel:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def handle_pending_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show another page of a channel's pending posts."""
+    query = update.callback_query
+    await query.answer()
+    
+    _, chat_id, page = query.data.split("_")
+    text, reply_markup = await render_pending_page(context, query.from_user.id, int(chat_id), int(page))
+    try:
+        await query.edit_message_text(text=text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Tapping a button twice asks for the page already shown
+        if "not modified" not in str(e).lower():
+            raise
+
+async def publish_in_order(context: ContextTypes.DEFAULT_TYPE, posts: list) -> tuple:
+    """Publish posts in order, up to 100 messages per call, stopping at the first error.
+    
+    Returns (published posts, the error or None).
+    """
+    chunks = [[]]
+    size = 0
+    for post in posts:
+        if chunks[-1] and size + len(post.source_message_ids) > 100:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(post)
+        size += len(post.source_message_ids)
+    
+    published = []
+    for chunk in chunks:
+        try:
+            await publish_posts(context, chunk)
+        except Exception as e:
+            logger.error("Error publishing approved posts: %s", e)
+            return published, e
+        published.extend(chunk)
+    return published, None
+
+async def handle_bulk_decision(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Approve or reject every post a channel has waiting for the user's approval."""
+    query = update.callback_query
+    await query.answer()
+    
+    action, chat_id = query.data.split("_", 1)
+    chat_id = int(chat_id)
+    approver_id = query.from_user.id
+    approve = action == "approveall"
+    
+    # Claim the posts first, so their own buttons (or another shard) can't decide on them again
+    pending_posts = bot_state(context.application).pending_posts
+    claimed = (pending_posts.pop(post.post_id) for post in pending_posts.for_channel(approver_id, chat_id))
+    posts = [post for post in claimed if post is not None]
+    if not posts:
+        await query.edit_message_text(text="No posts are waiting for your approval in this channel.")
+        return
+    title = await channel_title(context, chat_id)
+    
+    error = None
+    decided = posts
+    if approve:
+        await query.edit_message_text(text=f"Publishing {len(posts)} posts to {title}...")
+        # One channel keeps the order of its posts, so the copies go out in order and in batches
+        with api_priority(Priority.PUBLISHING):
+            decided, error = await publish_in_order(context, posts)
+        # Posts that weren't published stay pending
+        for post in posts[len(decided):]:
+            pending_posts.add(post)
+    
+    with api_priority(Priority.NOTIFICATION):
+        # The approval requests of decided posts are stale
+        approval_ids = [post.approval_message_id for post in decided if post.approval_message_id]
+        for start in range(0, len(approval_ids), 100):
+            try:
+                await context.bot.delete_messages(chat_id=approver_id, message_ids=approval_ids[start:start + 100])
+            except Exception as e:
+                logger.error("Could not delete approval requests: %s", e)
+        
+        # One message per admin, however many of their posts were decided
+        counts = {}
+        for post in decided:
+            counts[post.admin_id] = counts.get(post.admin_id, 0) + 1
+        outcome = "approved and published" if approve else "rejected by the channel owner"
+        
+        async def notify(admin_id: int) -> None:
+            await context.bot.send_message(
+                chat_id=admin_id,
+                text=f"{counts[admin_id]} of your posts to {title} have been {outcome}."
+            )
+        
+        await run_bulk(list(counts), notify, concurrency=config.BULK_CONCURRENCY)
+    
+    if approve:
+        text = f"✅ Published {len(decided)} posts to {title}."
+        if error:
+            text += f"\n⚠️ Stopped after an error: {error}\n{len(posts) - len(decided)} posts are still pending."
+    else:
+        text = f"❌ Rejected {len(decided)} posts for {title}."
+    await query.edit_message_text(text=text)
+
 # Add Users Conversation Handlers
 async def add_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of adding users to a channel."""
@@ -379,7 +1072,7 @@ async def get_channel_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         context.user_data['channel_id'] = chat.id
         
         # Check if the bot is an admin
-        bot_member = await context.bot.get_chat_member(chat.id, context.bot.id)
+        bot_member = await get_chat_member_cached(context, chat.id, context.bot.id)
         
         if bot_member.status != 'administrator':
             await update.message.reply_text(
@@ -399,12 +1092,12 @@ async def get_channel_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text(
             f"Great! I'm an admin in the channel {chat.title}.\n\n"
             "Now, please send me the link to the group or a list of usernames (one per line) "
-            "from which you want to add users."
+            "from which you want to add users. For long lists, upload a .txt or .csv file."
         )
         return GROUP_LINK
         
     except Exception as e:
-        logger.error(f"Error checking channel: {e}")
+        logger.error("Error checking channel: %s", e)
         await update.message.reply_text(
             "I couldn't access that channel. Please make sure:\n"
             "1. The channel exists\n"
@@ -425,7 +1118,9 @@ async def get_group_info(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         usernames = []
         if not group_info.startswith('https://'):
             # It's a list of usernames
-            usernames = [username.strip(' @') for username in group_info.split('\n') if username.strip()]
+            usernames = [line.strip().strip('@') for line in group_info.split('\n')]
+            # A line holding only '@' is no username
+            usernames = [username for username in usernames if username]
         else:
             # It's a group link - try to get members
             # Extract the group username or invite code
@@ -453,7 +1148,7 @@ async def get_group_info(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         "I'll proceed with adding these users to the channel."
                     )
                 except Exception as e:
-                    logger.error(f"Error getting group members: {e}")
+                    logger.error("Error getting group members: %s", e)
                     await update.message.reply_text(
                         "I couldn't access the group members. Please provide a list of usernames instead (one per line)."
                     )
@@ -474,13 +1169,39 @@ async def get_group_info(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return await add_users_to_channel(update, context, usernames)
         
     except Exception as e:
-        logger.error(f"Error in add users process: {e}")
+        logger.error("Error in add users process: %s", e)
         await update.message.reply_text(
             f"An error occurred while processing your request: {str(e)}\n"
             "Please try again later."
         )
         return ConversationHandler.END
 
+async def get_group_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Add the users listed in an uploaded .txt/.csv file in a background job."""
+    document = update.message.document
+    if document.file_size and document.file_size > config.ADD_MAX_FILE_SIZE:
+        await update.message.reply_text(
+            f"The file is too large (limit is {config.ADD_MAX_FILE_SIZE // (1024 * 1024)} MB)."
+        )
+        return ConversationHandler.END
+    
+    try:
+        # The file is read by the job, which invites users while the download progresses
+        return await add_users_to_channel(
+            update,
+            context,
+            file_id=document.file_id,
+            csv_format=(document.file_name or '').lower().endswith('.csv')
+        )
+        
+    except Exception as e:
+        logger.error("Error starting add job for username file: %s", e)
+        await update.message.reply_text(
+            f"An error occurred while reading the file: {str(e)}\n"
+            "Please try again later."
+        )
+        return ConversationHandler.END
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the conversation."""
     await update.message.reply_text(
@@ -544,7 +1265,7 @@ async def process_channel_for_group(update: Update, context: ContextTypes.DEFAUL
         context.user_data['channel_id'] = chat.id
         
         # Check if the bot is an admin
-        bot_member = await context.bot.get_chat_member(chat.id, context.bot.id)
+        bot_member = await get_chat_member_cached(context, chat.id, context.bot.id)
         
         if bot_member.status != 'administrator':
             await update.message.reply_text(
@@ -571,7 +1292,7 @@ async def process_channel_for_group(update: Update, context: ContextTypes.DEFAUL
         return await process_group_link(update, context, context.user_data['group_link'])
         
     except Exception as e:
-        logger.error(f"Error checking channel: {e}")
+        logger.error("Error checking channel: %s", e)
         await update.message.reply_text(
             "I couldn't access that channel. Please make sure:\n"
             "1. The channel exists\n"
@@ -619,7 +1340,7 @@ async def process_group_link(update: Update, context: ContextTypes.DEFAULT_TYPE,
                 return await add_users_to_channel(update, context, usernames)
                 
             except Exception as e:
-                logger.error(f"Error getting group members: {e}")
+                logger.error("Error getting group members: %s", e)
                 await update.message.reply_text(
                     "I couldn't access the group members. Please make sure:\n"
                     "1. The group exists\n"
@@ -635,128 +1356,558 @@ async def process_group_link(update: Update, context: ContextTypes.DEFAULT_TYPE,
             return ConversationHandler.END
             
     except Exception as e:
-        logger.error(f"Error processing group link: {e}")
+        logger.error("Error processing group link: %s", e)
         await update.message.reply_text(
             f"An error occurred while processing the group link: {str(e)}\n"
             "Please try again later."
         )
         return ConversationHandler.END
 
-async def add_users_to_channel(update: Update, context: ContextTypes.DEFAULT_TYPE, usernames: list) -> int:
-    """Add the provided list of usernames to the channel."""
-    channel_id = context.user_data['channel_id']
-    added_count = 0
-    failed_count = 0
-    failed_users = []
+async def add_users_to_channel(update: Update, context: ContextTypes.DEFAULT_TYPE, usernames: list = None,
+                               file_id: str = None, csv_format: bool = False) -> int:
+    """Queue a background job adding the usernames (or those listed in an uploaded file) to the channel."""
+    add_jobs = bot_state(context.application).add_jobs
+    job = add_jobs.create(
+        owner_id=update.effective_user.id,
+        chat_id=update.effective_chat.id,
+        channel_id=context.user_data['channel_id'],
+        usernames=usernames,
+        file_id=file_id,
+        csv_format=csv_format
+    )
+    schedule_add_job(context.application, job.job_id)
     
-    # Create a progress message
-    progress_message = await update.message.reply_text(f"Starting to add users to the channel...")
+    # The conversation ends here; the job reports its progress in this chat
+    await update.message.reply_text(
+        f"Add job #{job.job_id} started"
+        f"{f' for {job.total} users' if job.total else ''}. I'll report its progress here.\n\n"
+        f"/jobstatus {job.job_id} - Show its progress\n"
+        f"/pausejob {job.job_id} - Pause it (resume with /resumejob {job.job_id})\n"
+        f"/canceljob {job.job_id} - Cancel it"
+    )
+    return ConversationHandler.END
+
+def schedule_add_job(application: Application, job_id: int) -> None:
+    """Run an add job on the job queue as soon as possible."""
+    application.job_queue.run_once(run_add_job, when=0, data=job_id, name=f"add_job_{job_id}")
+
+async def add_job_source(application: Application, job: AddJob, stats: IngestStats):
+    """Yield the usernames of an add job that have no outcome yet.
     
-    for i, username in enumerate(usernames):
-        try:
-            # Try to get the user by username
-            if not username:
-                continue
-            
-            user = None
-            try:
-                user = await context.bot.get_chat(username)
-            except Exception as e:
-                failed_count += 1
-                failed_users.append(username)
-                logger.error(f"Error getting user {username}: {e}")
-                continue
-            
-            # Try to add the user to the channel
-            try:
-                # Use invite_chat_member to add user to channel
-                await context.bot.invite_chat_member(
-                    chat_id=channel_id,
-                    user_id=user.id
-                )
-                added_count += 1
-            except Exception as e:
-                # User might already be in the channel or can't be added for other reasons
-                error_message = str(e).lower()
-                if "already a member" in error_message:
-                    # User is already in the channel, consider this a success
-                    added_count += 1
-                else:
-                    failed_count += 1
-                    failed_users.append(username)
-                    logger.error(f"Error adding user {username} to channel: {e}")
-            
-            # Update progress every 5 users or at the end
-            if (i + 1) % 5 == 0 or i == len(usernames) - 1:
-                await progress_message.edit_text(
-                    f"Progress: {i + 1}/{len(usernames)} users processed.\n"
-                    f"Added: {added_count}, Failed: {failed_count}"
-                )
-            
-        except Exception as e:
-            failed_count += 1
-            failed_users.append(username)
-            logger.error(f"Error processing user {username}: {e}")
+    Usernames recorded earlier come first. A file that wasn't read to the end
+    is then read again, skipping the usernames the job already has, and new
+    ones are recorded before they are handed out. Stops early when the job is
+    paused or cancelled, or the application is shutting down.
+    """
+    state = bot_state(application)
+    add_jobs = state.add_jobs
+    running_add_jobs = state.running_add_jobs
+    def stopping() -> bool:
+        return running_add_jobs.get(job.job_id) is not None or not application.running
+    
+    for username in add_jobs.pending_usernames(job.job_id):
+        if stopping():
+            return
+        yield username
+    if job.source_complete or stopping():
+        return
+    
+    file = await application.bot.get_file(job.file_id)
+    usernames = iter_usernames(
+        iter_lines(iter_chunks(file.file_path, DOWNLOAD_CLIENT), config.ADD_MAX_FILE_SIZE, stats),
+        csv_format=job.csv_format,
+        stats=stats
+    )
+    batch = []
+    async for username in usernames:
+        batch.append(username)
+        if len(batch) < config.ADD_JOB_CHECKPOINT_EVERY:
             continue
+        for new in add_jobs.add_usernames(job.job_id, batch):
+            if stopping():
+                return
+            yield new
+        batch = []
+    for new in add_jobs.add_usernames(job.job_id, batch):
+        if stopping():
+            return
+        yield new
+    add_jobs.mark_source_complete(job.job_id)
+
+async def run_add_job(context: CallbackContext) -> None:
+    """Run an add job from its last checkpoint until it is done, paused or cancelled."""
+    state = bot_state(context.application)
+    add_jobs = state.add_jobs
+    running_add_jobs = state.running_add_jobs
+    job_id = context.job.data
+    job = add_jobs.get(job_id)
+    if job is None or job.status not in ACTIVE_STATES or job_id in running_add_jobs:
+        return
+    
+    running_add_jobs[job_id] = None
+    add_jobs.set_status(job_id, RUNNING)
+    resumed = job.processed > 0
+    progress_message = await context.bot.send_message(
+        job.chat_id,
+        f"{'Resuming' if resumed else 'Starting'} add job #{job_id}..."
+    )
+    progress = ProgressReporter(progress_message, interval=config.PROGRESS_INTERVAL, label="users")
+    
+    # Outcomes not checkpointed yet: [(username, added)]
+    outcomes = []
+    # Progress already exported to the metrics: [added, failed]
+    reported = [0, 0]
+    remaining = max(0, job.total - job.processed)
+    
+    def on_user(username: str, added: bool) -> None:
+        outcomes.append((username, added))
+        if len(outcomes) >= config.ADD_JOB_CHECKPOINT_EVERY:
+            add_jobs.record(job_id, outcomes)
+            outcomes.clear()
+    
+    async def report_progress(result) -> None:
+        total = job.total if job.source_complete else None
+        progress.update(
+            job.processed + result.processed,
+            total,
+            f"Added: {job.added + result.added}, Failed: {job.failed + result.failed}"
+        )
+        ADD_USERS.labels(outcome='added').inc(result.added - reported[0])
+        ADD_USERS.labels(outcome='failed').inc(result.failed - reported[1])
+        if job.source_complete:
+            ADD_USERS_REMAINING.dec(result.added + result.failed - sum(reported))
+        reported[:] = [result.added, result.failed]
+    
+    # Resolve and invite the users concurrently, yielding to moderation and publishing
+    stats = IngestStats()
+    error = None
+    ADD_JOBS_ACTIVE.inc()
+    if job.source_complete:
+        ADD_USERS_REMAINING.inc(remaining)
+    try:
+        with api_priority(Priority.BACKGROUND):
+            result = await add_users(
+                context.bot,
+                job.channel_id,
+                add_job_source(context.application, job, stats),
+                resolve_workers=config.ADD_RESOLVE_WORKERS,
+                invite_workers=config.ADD_INVITE_WORKERS,
+                on_progress=report_progress,
+                username_cache=USERNAME_CACHE,
+                on_user=on_user
+            )
+    except Exception as e:
+        logger.error("Error in add job %s: %s", job_id, e)
+        error = str(e)
+    finally:
+        # Checkpoint whatever was processed, even when interrupted
+        add_jobs.record(job_id, outcomes)
+        ADD_JOBS_ACTIVE.dec()
+        if job.source_complete:
+            ADD_USERS_REMAINING.dec(remaining - sum(reported))
+        stop = running_add_jobs.pop(job_id, None)
+    await progress.finish()
+    
+    job = add_jobs.get(job_id)
+    if error is not None:
+        add_jobs.set_status(job_id, FAILED, error=error)
+        await context.bot.send_message(
+            job.chat_id,
+            f"Add job #{job_id} stopped after {job.processed} users because of an error: {error}\n"
+            f"Use /resumejob {job_id} to continue from where it stopped."
+        )
+        return
+    if stop is not None:
+        add_jobs.set_status(job_id, stop)
+        if stop == PAUSED:
+            text = f"Add job #{job_id} paused after {job.processed} users. Use /resumejob {job_id} to continue."
+        else:
+            text = f"Add job #{job_id} cancelled after {job.processed} users."
+        await context.bot.send_message(job.chat_id, text)
+        return
+    if not context.application.running:
+        # Shutting down: the job stays running and is resumed at the next start
+        logger.info("Add job %s interrupted by shutdown after %s users", job_id, job.processed)
+        return
+    
+    add_jobs.set_status(job_id, DONE)
+    throughput = f"⏱ {result.processed} users in {result.elapsed:.1f}s ({result.rate:.2f} users/sec)"
+    if stats.lines:
+        throughput = (
+            f"📄 Read {stats.lines} lines: {stats.accepted} usernames, "
+            f"{stats.duplicates} duplicates and {stats.invalid} invalid entries skipped"
+            f"{' (stopped at the size limit)' if stats.truncated else ''}\n"
+            f"{throughput}"
+        )
+        if stats.invalid_samples:
+            throughput += "\nInvalid entries (first 10): " + ", ".join(stats.invalid_samples)
     
     # Final report
-    if failed_users:
-        failed_list = '\n'.join(failed_users[:10])
-        additional_failed = len(failed_users) - 10 if len(failed_users) > 10 else 0
+    if job.failed:
+        failed_list = '\n'.join(add_jobs.failed_usernames(job_id, limit=10))
+        additional_failed = job.failed - 10 if job.failed > 10 else 0
         
-        await update.message.reply_text(
-            f"User addition complete!\n\n"
-            f"✅ Successfully added: {added_count} users\n"
-            f"❌ Failed to add: {failed_count} users\n\n"
+        await context.bot.send_message(
+            job.chat_id,
+            f"Add job #{job_id} complete!\n\n"
+            f"✅ Successfully added: {job.added} users\n"
+            f"❌ Failed to add: {job.failed} users\n\n"
             f"Some users that couldn't be added (first 10):\n{failed_list}"
-            f"{f'... and {additional_failed} more' if additional_failed else ''}"
+            f"{f'... and {additional_failed} more' if additional_failed else ''}\n\n"
+            f"{throughput}"
         )
     else:
-        await update.message.reply_text(
-            f"User addition complete!\n\n"
-            f"✅ Successfully added: {added_count} users\n"
-            f"All users were added successfully!"
+        await context.bot.send_message(
+            job.chat_id,
+            f"Add job #{job_id} complete!\n\n"
+            f"✅ Successfully added: {job.added} users\n"
+            f"All users were added successfully!\n\n"
+            f"{throughput}"
         )
+
+def describe_add_job(job: AddJob) -> str:
+    """One line summary of an add job for /jobs and /jobstatus."""
+    total = job.total if job.source_complete else f"{job.total}+"
+    return (
+        f"#{job.job_id} {job.status}: {job.processed}/{total} users "
+        f"(added {job.added}, failed {job.failed}) to channel {job.channel_id}"
+    )
+
+async def get_owned_job(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str):
+    """Return the add job named in the command's argument if the user started it, else reply and return None."""
+    add_jobs = bot_state(context.application).add_jobs
+    if not context.args or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text(f"Please provide a job number, for example: /{command} 12\nUse /jobs to list your jobs.")
+        return None
+    job = add_jobs.get(int(context.args[0].lstrip('#')))
+    if job is None or job.owner_id != update.effective_user.id:
+        await update.message.reply_text("I couldn't find that job. Use /jobs to list your jobs.")
+        return None
+    return job
+
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """List the user's latest add jobs."""
+    add_jobs = bot_state(context.application).add_jobs
+    jobs = add_jobs.list_for_owner(update.effective_user.id, limit=10)
+    if not jobs:
+        await update.message.reply_text("You have no add jobs. Start one with /add or /addgroup.")
+        return
+    await update.message.reply_text(
+        "Your latest add jobs:\n\n" + '\n'.join(describe_add_job(job) for job in jobs)
+    )
+
+async def job_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the progress of an add job."""
+    add_jobs = bot_state(context.application).add_jobs
+    job = await get_owned_job(update, context, "jobstatus")
+    if job is None:
+        return
+    text = describe_add_job(job)
+    text += f"\nStarted {datetime.fromtimestamp(job.created_at):%Y-%m-%d %H:%M}, last update {datetime.fromtimestamp(job.updated_at):%Y-%m-%d %H:%M}"
+    if job.error:
+        text += f"\nError: {job.error}"
+    failed = add_jobs.failed_usernames(job.job_id, limit=10)
+    if failed:
+        text += "\nUsers that couldn't be added (first 10): " + ", ".join(failed)
+    await update.message.reply_text(text)
+
+async def stop_add_job(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str, status: str) -> None:
+    """Pause or cancel an add job; a running job stops after the users already handed to the workers."""
+    state = bot_state(context.application)
+    add_jobs = state.add_jobs
+    running_add_jobs = state.running_add_jobs
+    job = await get_owned_job(update, context, command)
+    if job is None:
+        return
+    if job.status not in ACTIVE_STATES and not (status == CANCELLED and job.status in (PAUSED, FAILED)):
+        await update.message.reply_text(f"Add job #{job.job_id} is {job.status}.")
+        return
+    if job.job_id in running_add_jobs:
+        # The job stops itself and reports where it stopped
+        running_add_jobs[job.job_id] = status
+        await update.message.reply_text(f"Stopping add job #{job.job_id}...")
+    else:
+        add_jobs.set_status(job.job_id, status)
+        await update.message.reply_text(f"Add job #{job.job_id} is now {status}.")
+
+async def pause_job_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Pause an add job."""
+    await stop_add_job(update, context, "pausejob", PAUSED)
+
+async def cancel_job_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Cancel an add job."""
+    await stop_add_job(update, context, "canceljob", CANCELLED)
+
+async def resume_job_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Resume a paused or failed add job from its last checkpoint."""
+    add_jobs = bot_state(context.application).add_jobs
+    job = await get_owned_job(update, context, "resumejob")
+    if job is None:
+        return
+    if job.status not in (PAUSED, FAILED):
+        await update.message.reply_text(f"Add job #{job.job_id} is {job.status}.")
+        return
+    add_jobs.set_status(job.job_id, QUEUED)
+    schedule_add_job(context.application, job.job_id)
+    await update.message.reply_text(f"Resuming add job #{job.job_id}...")
+
+async def maintain_storage(context: CallbackContext) -> None:
+    """Expire stale pending posts and write buffered changes to disk."""
+    pending_posts = bot_state(context.application).pending_posts
+    expired = pending_posts.expire()
+    if expired:
+        logger.info("Expired %s pending posts without a decision", expired)
+    pending_posts.flush()
+    if is_primary(context.application):
+        USERNAME_CACHE.flush()
+    if context.application.persistence:
+        context.application.persistence.write()
+
+def shard_path(path: str) -> str:
+    """Return this process's copy of the file ``path``; shards each keep their own."""
+    if SHARD_INDEX:
+        return f"{path}.shard{SHARD_INDEX}"
+    return path
+
+def snapshot_path() -> str:
+    """Return the cache snapshot file of this process."""
+    return shard_path(config.SNAPSHOT_PATH)
+
+async def save_cache_snapshot(context: CallbackContext) -> None:
+    """Periodically snapshot the caches, so a crash still leaves a recent one."""
+    try:
+        save_snapshot(snapshot_path(), ROSTER_CACHE, MEMBER_CACHE)
+    except Exception as e:
+        logger.error("Error saving cache snapshot: %s", e)
+
+async def warm_up_rosters(application: Application) -> None:
+    """Re-fetch the rosters that would expire before the periodic refresh gets to them."""
+    rosters = bot_state(application).rosters
+    chat_ids = [
+        chat_id for chat_id, _, ttl in ROSTER_CACHE.entries()
+        if chat_id in rosters and ttl < config.ROSTER_REFRESH_INTERVAL
+    ]
+    if not chat_ids:
+        return
     
-    return ConversationHandler.END
+    semaphore = asyncio.Semaphore(config.SNAPSHOT_REFRESH_CONCURRENCY)
+    
+    async def refresh(chat_id: int) -> None:
+        async with semaphore:
+            try:
+                await fetch_channel_roster(application.bot, chat_id)
+            except Exception as e:
+                logger.error("Error refreshing roster for channel %s: %s", chat_id, e)
+                ROSTER_CACHE.invalidate(chat_id)
+                rosters.discard(chat_id)
+    
+    # Behind everything the first updates after the restart need
+    with api_priority(Priority.BACKGROUND):
+        await asyncio.gather(*(refresh(chat_id) for chat_id in chat_ids))
+    logger.info("Refreshed %s rosters close to expiry", len(chat_ids))
 
-def main() -> None:
-    """Set up and run the Telegram bot."""
-    # Get the token from environment variable
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
+async def on_startup(application: Application) -> None:
+    """Load the cache snapshot, resume interrupted add jobs and start the metrics endpoint.
+    
+    The caches, the download client and the metrics endpoint are shared, so only the first bot of the
+    process sets them up.
+    """
+    global METRICS_SERVER, DOWNLOAD_CLIENT
+    if is_primary(application):
+        DOWNLOAD_CLIENT = build_download_client(
+            keepalive_expiry=config.TRANSPORT_KEEPALIVE_EXPIRY,
+            http2=bool(config.TRANSPORT_HTTP2),
+            connect_timeout=config.TRANSPORT_CONNECT_TIMEOUT,
+            read_timeout=config.TRANSPORT_DOWNLOAD_TIMEOUT,
+            pool_timeout=config.TRANSPORT_POOL_TIMEOUT
+        )
+        rosters, members = load_snapshot(snapshot_path(), ROSTER_CACHE, MEMBER_CACHE)
+        logger.info("Loaded %s rosters and %s chat members from the cache snapshot", rosters, members)
+        # The snapshot doesn't say which bot used a roster; the first one keeps them fresh until they expire
+        bot_state(application).rosters.update(ROSTER_CACHE.keys())
+        application.create_task(warm_up_rosters(application))
+    
+    # Resume the add jobs interrupted by the last shutdown; each shard runs the jobs of its chats
+    for job in bot_state(application).add_jobs.active():
+        if shard_for_chat(job.chat_id, SHARD_COUNT) == SHARD_INDEX:
+            schedule_add_job(application, job.job_id)
+            logger.info("Resuming add job %s after %s of %s users", job.job_id, job.processed, job.total)
+    
+    if config.METRICS_PORT and is_primary(application):
+        # Each shard serves its own metrics on the next port
+        METRICS_SERVER = MetricsServer(REGISTRY, config.METRICS_HOST, config.METRICS_PORT + SHARD_INDEX)
+        METRICS_SERVER.start()
+
+async def on_shutdown(application: Application) -> None:
+    """Persist buffered state and the cache snapshot before the process exits.
+    
+    The first bot of the process is shut down last and closes the shared state.
+    """
+    state = bot_state(application)
+    state.pending_posts.close()
+    state.add_jobs.close()
+    if not is_primary(application):
+        return
+    if METRICS_SERVER:
+        METRICS_SERVER.stop()
+    if DOWNLOAD_CLIENT:
+        await DOWNLOAD_CLIENT.aclose()
+    try:
+        save_snapshot(snapshot_path(), ROSTER_CACHE, MEMBER_CACHE)
+    except Exception as e:
+        logger.error("Error saving cache snapshot: %s", e)
+    USERNAME_CACHE.close()
+
+def load_tokens() -> list:
+    """Read the bot tokens from the environment or config.txt. Returns an empty list if there are none.
+    
+    TELEGRAM_BOT_TOKENS (or TELEGRAM_BOT_TOKEN) holds one or more tokens separated by
+    commas or spaces; config.txt holds one per line, lines starting with '#' are skipped.
+    """
+    # Get the tokens from environment variables
+    value = os.environ.get("TELEGRAM_BOT_TOKENS") or os.environ.get("TELEGRAM_BOT_TOKEN")
     
     # Fallback to a config file if not in environment
-    if not token:
+    if not value:
         try:
             # Try to read from a config file
             with open("config.txt", "r") as file:
-                token = file.read().strip()
+                value = "\n".join(line for line in file if not line.lstrip().startswith("#"))
         except FileNotFoundError:
             logger.error("No token found. Please set the TELEGRAM_BOT_TOKEN environment variable or create a config.txt file.")
-            return
+            return []
+    tokens = list(dict.fromkeys(token for token in re.split(r'[\s,]+', value) if token))
     
     # Replace with placeholder if still not set (for development only)
-    if not token or token == "YOUR_TOKEN":
+    if not tokens or tokens == ["YOUR_TOKEN"]:
         logger.warning("Using placeholder token. Please set a real token for production.")
-        token = "YOUR_TOKEN"  # This should be replaced with a real token
+        tokens = ["YOUR_TOKEN"]  # This should be replaced with a real token
+    return tokens
+
+def build_api_request():
+    """Build the connection pool for API calls, with per-method timeouts."""
+    return build_request(
+        config.TRANSPORT_POOL_SIZE,
+        keepalive_expiry=config.TRANSPORT_KEEPALIVE_EXPIRY,
+        http2=bool(config.TRANSPORT_HTTP2),
+        connect_timeout=config.TRANSPORT_CONNECT_TIMEOUT,
+        read_timeout=config.TRANSPORT_READ_TIMEOUT,
+        write_timeout=config.TRANSPORT_WRITE_TIMEOUT,
+        pool_timeout=config.TRANSPORT_POOL_TIMEOUT,
+        media_write_timeout=config.TRANSPORT_UPLOAD_TIMEOUT,
+        method_timeouts={
+            'upload': {'read': config.TRANSPORT_UPLOAD_TIMEOUT, 'write': config.TRANSPORT_UPLOAD_TIMEOUT},
+            'download': {'read': config.TRANSPORT_DOWNLOAD_TIMEOUT},
+            'interactive': {'read': config.TRANSPORT_INTERACTIVE_TIMEOUT},
+        }
+    )
+
+def build_poll_request(bots: int = 1):
+    """Build the connection pool for the getUpdates of ``bots`` bots; long polls set their own read timeout."""
+    return build_request(
+        config.TRANSPORT_POLL_POOL_SIZE * bots,
+        keepalive_expiry=config.TRANSPORT_KEEPALIVE_EXPIRY,
+        http2=bool(config.TRANSPORT_HTTP2),
+        connect_timeout=config.TRANSPORT_CONNECT_TIMEOUT,
+        read_timeout=config.TRANSPORT_READ_TIMEOUT,
+        write_timeout=config.TRANSPORT_WRITE_TIMEOUT,
+        pool_timeout=config.TRANSPORT_POOL_TIMEOUT
+    )
+
+def build_application(token: str, shard_index: int = 0, shards: int = 1, suffix: str = "",
+                      request=None, get_updates_request=None) -> Application:
+    """Open the stores and set up the Application with all handlers and jobs.
+    
+    In sharded mode every worker process builds its own Application: the
+    global rate limit is split between the shards and pending posts are
+    shared through SQLite, so any shard can handle an approval. Conversation
+    state is kept per shard, since a chat's updates always go to the same one.
+    
+    When several bots run in one process, each is built with its own
+    ``suffix``, appended to the paths of the databases it keeps to itself,
+    and with the shared ``request`` and ``get_updates_request``.
+    """
+    global SHARD_INDEX, SHARD_COUNT
+    SHARD_INDEX = shard_index
+    SHARD_COUNT = shards
+    
+    # The username cache is opened once and shared by every bot of the process
+    global USERNAME_CACHE
+    if USERNAME_CACHE is None:
+        USERNAME_CACHE = UsernameCache(
+            config.USERNAME_DB_PATH,
+            positive_ttl=config.USERNAME_POSITIVE_TTL,
+            negative_ttl=config.USERNAME_NEGATIVE_TTL
+        )
+    
+    # Pending posts and add jobs belong to the bot
+    pending_posts = PendingPostStore(config.PENDING_DB_PATH + suffix, ttl=config.PENDING_POST_TTL, shared=shards > 1)
+    add_jobs = AddJobStore(config.ADD_JOBS_DB_PATH + suffix)
+    
+    # Every outbound API call goes through the priority scheduler
+    rate_limiter = PriorityRateLimiter(
+        global_rate=config.RATE_GLOBAL_PER_SECOND / shards,
+        group_rate_per_minute=config.RATE_GROUP_PER_MINUTE,
+        private_rate=config.RATE_PRIVATE_PER_SECOND,
+        max_retries=config.RATE_MAX_RETRIES
+    )
+    
+    # Create the Application and pass it the bot's token. Updates of different chats
+    # are handled concurrently, updates of the same chat in order, which is what the
+    # ConversationHandlers (keyed by chat and user) rely on. Every API request is timed
+    # and counted for the metrics endpoint. Long polls have a pool of their own, so they
+    # never hold a connection a handler is waiting for.
+    application = (
+        Application.builder()
+        .token(token)
+        .request(InstrumentedRequest(request or build_api_request()))
+        .get_updates_request(InstrumentedRequest(get_updates_request or build_poll_request()))
+        .rate_limiter(rate_limiter)
+        .concurrent_updates(KeyedUpdateProcessor(config.UPDATE_CONCURRENCY))
+        .persistence(SQLitePersistence(shard_path(config.STATE_DB_PATH + suffix),
+                                       update_interval=config.STATE_UPDATE_INTERVAL))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+    BOTS[application] = BotState(pending_posts, add_jobs)
     
-    # Create the Application and pass it the bot's token
-    application = Application.builder().token(token).build()
+    # Flood and raid detection sees every group message before the other handlers
+    if config.ANTIFLOOD_ENABLED:
+        application.add_handler(MessageHandler(filters.ChatType.GROUPS, watch_group_messages), group=-1)
     
     # Command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("ban", ban_command))
     application.add_handler(CommandHandler("unban", unban_command))
+    application.add_handler(CommandHandler("bulkban", bulk_ban_command))
+    application.add_handler(CommandHandler("bulkunban", bulk_unban_command))
+    application.add_handler(CommandHandler("bulkrestrict", bulk_restrict_command))
+    application.add_handler(CommandHandler("cachestats", cache_stats_command))
+    application.add_handler(CommandHandler("pending", pending_command))
+    application.add_handler(CommandHandler("jobs", jobs_command))
+    application.add_handler(CommandHandler("jobstatus", job_status_command))
+    application.add_handler(CommandHandler("pausejob", pause_job_command))
+    application.add_handler(CommandHandler("resumejob", resume_job_command))
+    application.add_handler(CommandHandler("canceljob", cancel_job_command))
+    
+    # Keep the membership cache in sync with promotions, demotions and leaves
+    application.add_handler(ChatMemberHandler(handle_chat_member_update, ChatMemberHandler.ANY_CHAT_MEMBER))
     
     # Add conversation handler for the regular add command
     add_conv_handler = ConversationHandler(
         entry_points=[CommandHandler("add", add_command)],
         states={
             CHANNEL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_channel_info)],
-            GROUP_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_group_info)],
+            GROUP_LINK: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, get_group_info),
+                MessageHandler(filters.Document.FileExtension("txt") | filters.Document.FileExtension("csv"), get_group_file),
+            ],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="add_conversation",
+        persistent=True,
     )
     application.add_handler(add_conv_handler)
     
@@ -767,20 +1918,107 @@ def main() -> None:
             CHANNEL_FOR_GROUP: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_channel_for_group)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="addgroup_conversation",
+        persistent=True,
     )
     application.add_handler(addgroup_conv_handler)
     
     # Channel post handler
     application.add_handler(MessageHandler(filters.ChatType.CHANNEL, handle_channel_post))
     
-    # Callback query handler for approval buttons
+    # Callback query handlers for the /pending pages, bulk decisions and approval buttons
+    application.add_handler(CallbackQueryHandler(handle_pending_page, pattern=r"^pending_"))
+    application.add_handler(CallbackQueryHandler(handle_bulk_decision, pattern=r"^(approveall|rejectall)_"))
     application.add_handler(CallbackQueryHandler(handle_approval_response))
     
     # Keep the old text-command functionality for backward compatibility
     application.add_handler(MessageHandler(filters.TEXT & filters.REPLY & filters.ChatType.GROUPS, handle_text_commands))
     
-    # Start the Bot
-    application.run_polling()
+    # Time every handler and count its errors
+    instrument_application(application)
+    
+    # Keep cached channel rosters fresh and on-disk state flushed in the background
+    if application.job_queue:
+        application.job_queue.run_repeating(
+            refresh_channel_rosters,
+            interval=config.ROSTER_REFRESH_INTERVAL,
+            first=config.ROSTER_REFRESH_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            maintain_storage,
+            interval=config.PENDING_FLUSH_INTERVAL,
+            first=config.PENDING_FLUSH_INTERVAL
+        )
+        if is_primary(application):
+            application.job_queue.run_repeating(
+                save_cache_snapshot,
+                interval=config.SNAPSHOT_INTERVAL,
+                first=config.SNAPSHOT_INTERVAL
+            )
+    else:
+        logger.warning("JobQueue is not available, rosters and on-disk state are only maintained on demand.")
+    
+    return application
+
+def main() -> None:
+    """Set up and run the Telegram bot, or every bot when several tokens are configured."""
+    tokens = load_tokens()
+    if not tokens:
+        return
+    
+    if len(tokens) > 1:
+        if config.SHARDS > 1 or config.WEBHOOK_URL:
+            logger.error("Several bots can only run by polling in a single process; unset SHARDS and WEBHOOK_URL.")
+            return
+        # The bots share the event loop, the connection pools and the read-mostly caches;
+        # each keeps its own databases, named after its bot id
+        request = SharedRequest(build_api_request())
+        get_updates_request = SharedRequest(build_poll_request(len(tokens)))
+        applications = [
+            build_application(
+                token,
+                suffix=f".bot{token.split(':', 1)[0]}",
+                request=request,
+                get_updates_request=get_updates_request
+            )
+            for token in tokens
+        ]
+        asyncio.run(run_bots(applications, allowed_updates=Update.ALL_TYPES))
+        return
+    
+    token = tokens[0]
+    
+    webhook = None
+    if config.WEBHOOK_URL:
+        webhook = webhook_settings(
+            token,
+            config.WEBHOOK_URL,
+            config.WEBHOOK_LISTEN,
+            config.WEBHOOK_PORT,
+            path=config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET_TOKEN
+        )
+    
+    # Start the Bot (chat_member updates are only delivered when requested explicitly)
+    if config.SHARDS > 1:
+        # This process only receives updates; each shard runs the handlers for its chats
+        run_sharded(
+            token,
+            config.SHARDS,
+            build_application,
+            allowed_updates=Update.ALL_TYPES,
+            webhook=webhook,
+            queue_size=config.SHARD_QUEUE_SIZE,
+            request=build_api_request(),
+            get_updates_request=build_poll_request()
+        )
+        return
+    
+    application = build_application(token)
+    if webhook:
+        application.run_webhook(**webhook_args(webhook), allowed_updates=Update.ALL_TYPES)
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
     logger.info("Bot is running...")
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+"""Batched, concurrent execution of moderation actions on many users."""
+import asyncio
+import logging
+import re
+import time
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+USERNAME_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9_]{4,31}$')
+
+
+def parse_targets(text: str) -> tuple:
+    """Split a list of user ids and usernames separated by spaces, commas or newlines.
+
+    Returns (targets, invalid): targets are ints (user ids) or usernames
+    without '@', deduplicated in their original order; invalid holds the
+    tokens that are neither.
+    """
+    targets = []
+    invalid = []
+    seen = set()
+    for token in re.split(r'[\s,;]+', text):
+        token = token.strip(' @')
+        if not token:
+            continue
+        if token.isdigit():
+            target = int(token)
+        elif USERNAME_PATTERN.match(token):
+            target = token
+        else:
+            invalid.append(token)
+            continue
+        key = target.lower() if isinstance(target, str) else target
+        if key not in seen:
+            seen.add(key)
+            targets.append(target)
+    return targets, invalid
+
+
+class BulkReport:
+    """Outcome of a bulk action."""
+
+    __slots__ = ('total', 'processed', 'succeeded', 'failures', 'started_at', 'finished_at')
+
+    def __init__(self, total: int):
+        self.total = total
+        self.processed = 0
+        self.succeeded = 0
+        # [(target, reason)]
+        self.failures = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+
+async def resolve_targets(bot, targets: list, username_cache=None, concurrency: int = 4) -> dict:
+    """Map every target to a user id, or to an exception if it can't be resolved.
+
+    User ids map to themselves. Usernames are looked up in ``username_cache``
+    first and only the rest are resolved with get_chat.
+    """
+    resolved = {target: target for target in targets if isinstance(target, int)}
+    usernames = [target for target in targets if isinstance(target, str)]
+    cached = username_cache.get_many(usernames) if username_cache else {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(username: str) -> None:
+        if username in cached:
+            user_id = cached[username]
+            resolved[username] = user_id if user_id is not None else BadRequest("User not found")
+            return
+        async with semaphore:
+            try:
+                chat = await bot.get_chat(username)
+            except Exception as e:
+                if username_cache and isinstance(e, BadRequest):
+                    username_cache.set_missing(username)
+                resolved[username] = e
+                return
+        if username_cache:
+            username_cache.set(username, chat.id)
+        resolved[username] = chat.id
+
+    await asyncio.gather(*(resolve(username) for username in usernames))
+    return resolved
+
+
+async def run_bulk(targets: list, action, concurrency: int = 8, on_progress=None) -> BulkReport:
+    """Run ``await action(target)`` for every target, ``concurrency`` at a time.
+
+    A target fails when its action raises; the reason is kept in the report.
+    ``on_progress(report)`` is awaited after every target.
+    """
+    report = BulkReport(len(targets))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(target) -> None:
+        async with semaphore:
+            try:
+                await action(target)
+                report.succeeded += 1
+            except Exception as e:
+                logger.error("Bulk action failed for %s: %s", target, e)
+                report.failures.append((target, str(e)))
+        report.processed += 1
+        if on_progress:
+            await on_progress(report)
+
+    await asyncio.gather(*(run(target) for target in targets))
+    report.finished_at = time.monotonic()
+    return report
@@ -0,0 +1,113 @@
+"""In-memory caches used to avoid repeated Bot API lookups."""
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """A size-bounded LRU mapping whose entries expire after ``ttl`` seconds.
+
+    Hits, misses and evictions are counted so the cache efficiency can be
+    reported with ``stats()``.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        # {key: (expires_at, value)}, least recently used first
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key`` or ``default`` if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None) -> None:
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def keys(self) -> list:
+        """Return the keys of the entries that have not expired yet."""
+        now = self._clock()
+        return [key for key, (expires_at, _) in self._data.items() if expires_at > now]
+
+    def entries(self) -> list:
+        """Return (key, value, seconds left) for the entries that have not expired yet."""
+        now = self._clock()
+        return [(key, value, expires_at - now) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def invalidate(self, key) -> bool:
+        """Drop ``key`` from the cache. Returns True if it was present."""
+        return self._data.pop(key, None) is not None
+
+    def invalidate_where(self, predicate) -> int:
+        """Drop every entry whose key matches ``predicate``. Returns the number dropped."""
+        stale = [key for key in self._data if predicate(key)]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters."""
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Return the cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ChannelRoster:
+    """The administrators, creator and title of a channel."""
+
+    __slots__ = ('chat_id', 'title', 'creator', 'admins')
+
+    def __init__(self, chat_id: int, title: str, creator, admins: dict):
+        self.chat_id = chat_id
+        self.title = title
+        # telegram.User of the channel creator, or None if it isn't visible to the bot
+        self.creator = creator
+        # {user_id: status} for every administrator, including the creator
+        self.admins = admins
+
+    def status_of(self, user_id: int):
+        """Return 'creator', 'administrator' or None for a regular member."""
+        return self.admins.get(user_id)
@@ -0,0 +1,145 @@
+"""Runtime settings for the bot.
+
+Every value can be overridden with an environment variable of the same name.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def _env_str(name: str, default: str) -> str:
+    """Read a string setting from the environment."""
+    return os.environ.get(name) or default
+
+
+# Directory for the bot's on-disk state
+DATA_DIR = _env_str("DATA_DIR", "data")
+
+# Membership cache used by the admin/member status checks
+MEMBER_CACHE_TTL = _env_int("MEMBER_CACHE_TTL", 300)
+MEMBER_CACHE_SIZE = _env_int("MEMBER_CACHE_SIZE", 10000)
+
+# Channel roster cache (admins, creator and title) used by post approval
+ROSTER_CACHE_TTL = _env_int("ROSTER_CACHE_TTL", 3600)
+ROSTER_CACHE_SIZE = _env_int("ROSTER_CACHE_SIZE", 1000)
+ROSTER_REFRESH_INTERVAL = _env_int("ROSTER_REFRESH_INTERVAL", 900)
+
+# Posts waiting for approval, persisted to SQLite
+PENDING_DB_PATH = _env_str("PENDING_DB_PATH", os.path.join(DATA_DIR, "pending_posts.sqlite3"))
+PENDING_POST_TTL = _env_int("PENDING_POST_TTL", 7 * 24 * 3600)
+PENDING_FLUSH_INTERVAL = _env_int("PENDING_FLUSH_INTERVAL", 5)
+# Posts listed per page of /pending
+PENDING_PAGE_SIZE = _env_int("PENDING_PAGE_SIZE", 10)
+
+# Seconds to wait for more items of an album before requesting approval for it
+ALBUM_DEBOUNCE = _env_float("ALBUM_DEBOUNCE", 1.5)
+
+# Workers of the add-users pipeline: username resolution and channel invitation
+ADD_RESOLVE_WORKERS = _env_int("ADD_RESOLVE_WORKERS", 4)
+ADD_INVITE_WORKERS = _env_int("ADD_INVITE_WORKERS", 2)
+# Largest uploaded username list read, in bytes (Telegram lets bots download up to 20 MB)
+ADD_MAX_FILE_SIZE = _env_int("ADD_MAX_FILE_SIZE", 20 * 1024 * 1024)
+# Add jobs run in the background and record their progress every ADD_JOB_CHECKPOINT_EVERY users,
+# so they resume where they stopped after a restart
+ADD_JOBS_DB_PATH = _env_str("ADD_JOBS_DB_PATH", os.path.join(DATA_DIR, "add_jobs.sqlite3"))
+ADD_JOB_CHECKPOINT_EVERY = _env_int("ADD_JOB_CHECKPOINT_EVERY", 50)
+
+# Persistent username -> user_id resolution cache
+USERNAME_DB_PATH = _env_str("USERNAME_DB_PATH", os.path.join(DATA_DIR, "usernames.sqlite3"))
+USERNAME_POSITIVE_TTL = _env_int("USERNAME_POSITIVE_TTL", 30 * 24 * 3600)
+USERNAME_NEGATIVE_TTL = _env_int("USERNAME_NEGATIVE_TTL", 24 * 3600)
+
+# Outbound API scheduler (token buckets follow Telegram's flood limits)
+RATE_GLOBAL_PER_SECOND = _env_int("RATE_GLOBAL_PER_SECOND", 30)
+RATE_GROUP_PER_MINUTE = _env_int("RATE_GROUP_PER_MINUTE", 20)
+RATE_PRIVATE_PER_SECOND = _env_int("RATE_PRIVATE_PER_SECOND", 1)
+RATE_MAX_RETRIES = _env_int("RATE_MAX_RETRIES", 3)
+
+# HTTP transport: API calls and getUpdates long polls use separate connection pools, so
+# handlers never wait for a connection held by a long poll. Connections are kept alive
+# between calls and, with HTTP/2, concurrent calls share them.
+TRANSPORT_POOL_SIZE = _env_int("TRANSPORT_POOL_SIZE", 256)
+TRANSPORT_POLL_POOL_SIZE = _env_int("TRANSPORT_POLL_POOL_SIZE", 2)
+TRANSPORT_HTTP2 = _env_int("TRANSPORT_HTTP2", 1)
+TRANSPORT_KEEPALIVE_EXPIRY = _env_float("TRANSPORT_KEEPALIVE_EXPIRY", 60)
+# Timeouts in seconds; uploads, file downloads and calls a user is waiting on get their own
+TRANSPORT_CONNECT_TIMEOUT = _env_float("TRANSPORT_CONNECT_TIMEOUT", 5)
+TRANSPORT_READ_TIMEOUT = _env_float("TRANSPORT_READ_TIMEOUT", 10)
+TRANSPORT_WRITE_TIMEOUT = _env_float("TRANSPORT_WRITE_TIMEOUT", 10)
+TRANSPORT_POOL_TIMEOUT = _env_float("TRANSPORT_POOL_TIMEOUT", 5)
+TRANSPORT_UPLOAD_TIMEOUT = _env_float("TRANSPORT_UPLOAD_TIMEOUT", 60)
+TRANSPORT_DOWNLOAD_TIMEOUT = _env_float("TRANSPORT_DOWNLOAD_TIMEOUT", 60)
+TRANSPORT_INTERACTIVE_TIMEOUT = _env_float("TRANSPORT_INTERACTIVE_TIMEOUT", 5)
+
+# Minimum seconds between edits of a progress message
+PROGRESS_INTERVAL = _env_int("PROGRESS_INTERVAL", 3)
+
+# Webhook mode: when WEBHOOK_URL is set, Telegram pushes updates to an embedded server
+# instead of the bot polling for them. The path and secret token default to values
+# derived from the bot token.
+WEBHOOK_URL = _env_str("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = _env_str("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = _env_int("WEBHOOK_PORT", 8443)
+WEBHOOK_PATH = _env_str("WEBHOOK_PATH", "")
+WEBHOOK_SECRET_TOKEN = _env_str("WEBHOOK_SECRET_TOKEN", "")
+
+# Updates handled at once; updates of the same chat always run one after another
+UPDATE_CONCURRENCY = _env_int("UPDATE_CONCURRENCY", 16)
+
+# Bulk moderation commands
+BULK_CONCURRENCY = _env_int("BULK_CONCURRENCY", 8)
+BULK_MAX_FILE_SIZE = _env_int("BULK_MAX_FILE_SIZE", 1024 * 1024)
+
+# Automatic flood and raid protection in groups, off unless turned on
+ANTIFLOOD_ENABLED = _env_int("ANTIFLOOD_ENABLED", 0)
+FLOOD_MESSAGES = _env_int("FLOOD_MESSAGES", 8)
+FLOOD_WINDOW = _env_float("FLOOD_WINDOW", 10)
+FLOOD_ACTION = _env_str("FLOOD_ACTION", "restrict")
+FLOOD_MUTE_SECONDS = _env_int("FLOOD_MUTE_SECONDS", 600)
+RAID_CHAT_MESSAGES = _env_int("RAID_CHAT_MESSAGES", 100)
+RAID_JOINS = _env_int("RAID_JOINS", 10)
+RAID_WINDOW = _env_float("RAID_WINDOW", 30)
+RAID_DURATION = _env_int("RAID_DURATION", 300)
+RAID_ACTION = _env_str("RAID_ACTION", "restrict")
+ANTIFLOOD_MAX_CHATS = _env_int("ANTIFLOOD_MAX_CHATS", 10000)
+ANTIFLOOD_MAX_USERS_PER_CHAT = _env_int("ANTIFLOOD_MAX_USERS_PER_CHAT", 1000)
+
+# Prometheus metrics endpoint (GET /metrics); port 0 turns it off
+METRICS_HOST = _env_str("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _env_int("METRICS_PORT", 0)
+
+# Conversation states and user_data, so /add and /addgroup survive restarts
+STATE_DB_PATH = _env_str("STATE_DB_PATH", os.path.join(DATA_DIR, "state.sqlite3"))
+STATE_UPDATE_INTERVAL = _env_float("STATE_UPDATE_INTERVAL", 5)
+
+# Sharded mode: worker processes handling updates, routed by chat
+SHARDS = _env_int("SHARDS", 1)
+SHARD_QUEUE_SIZE = _env_int("SHARD_QUEUE_SIZE", 1000)
+
+# Warm-start snapshot of the roster and membership caches
+SNAPSHOT_PATH = _env_str("SNAPSHOT_PATH", os.path.join(DATA_DIR, "cache_snapshot.json.gz"))
+SNAPSHOT_INTERVAL = _env_int("SNAPSHOT_INTERVAL", 300)
+SNAPSHOT_REFRESH_CONCURRENCY = _env_int("SNAPSHOT_REFRESH_CONCURRENCY", 8)
+
+# Logging: records are written by a background thread, as JSON lines unless LOG_FORMAT is "text".
+# A warning or error repeating the same message more than LOG_REPEAT_LIMIT times per
+# LOG_REPEAT_WINDOW seconds is dropped; the next one let through counts the dropped ones.
+LOG_LEVEL = _env_str("LOG_LEVEL", "INFO")
+LOG_FORMAT = _env_str("LOG_FORMAT", "json")
+LOG_REPEAT_LIMIT = _env_int("LOG_REPEAT_LIMIT", 10)
+LOG_REPEAT_WINDOW = _env_float("LOG_REPEAT_WINDOW", 60)
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)
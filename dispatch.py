@@ -0,0 +1,66 @@
+"""Concurrent update processing that keeps the updates of each chat in order."""
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats in parallel and updates of the same chat in order.
+
+    Updates are keyed by their chat, which also keeps every conversation
+    (keyed by chat and user) strictly ordered. At most
+    ``max_concurrent_updates`` handlers run at once. Updates waiting behind
+    an earlier update of their chat don't take up one of those slots, so one
+    busy chat can't stall the others. ``max_queued_updates`` bounds the total
+    number of updates in flight, waiting or running.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_queued_updates: int = 4096):
+        super().__init__(max(max_queued_updates, max_concurrent_updates))
+        self.concurrency = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # {key: [asyncio.Lock, number of updates holding or waiting for it]}
+        self._locks = {}
+
+    @staticmethod
+    def key_for(update):
+        """Return the ordering key of an update, or None if it can run unordered."""
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return ('chat', chat.id)
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return ('user', user.id)
+        return None
+
+    @property
+    def active_keys(self) -> int:
+        """Number of chats with updates being processed or waiting."""
+        return len(self._locks)
+
+    async def do_process_update(self, update, coroutine) -> None:
+        """Wait for earlier updates of the same chat, then for a free slot, then run the handlers."""
+        key = self.key_for(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        """Does nothing."""
+
+    async def shutdown(self) -> None:
+        """Does nothing."""
@@ -0,0 +1,111 @@
+"""Streaming parsing of uploaded username lists (.txt or .csv)."""
+import asyncio
+import codecs
+import csv
+import re
+
+import httpx
+
+from bulk import USERNAME_PATTERN
+
+# Bytes read from the file at a time
+CHUNK_SIZE = 64 * 1024
+
+
+class IngestStats:
+    """What was read from an uploaded list."""
+
+    __slots__ = ('lines', 'accepted', 'duplicates', 'invalid', 'invalid_samples', 'truncated')
+
+    def __init__(self):
+        self.lines = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        # The first few entries that aren't usernames, to show the user
+        self.invalid_samples = []
+        # True if reading stopped at the size limit
+        self.truncated = False
+
+
+async def iter_chunks(file_path: str, client: httpx.AsyncClient, chunk_size: int = CHUNK_SIZE):
+    """Yield the bytes of a Telegram file as they are downloaded.
+
+    ``file_path`` is the URL of telegram.File.file_path, downloaded with
+    ``client``, or a local path when the bot runs against a local Bot API
+    server.
+    """
+    if file_path.startswith(('http://', 'https://')):
+        async with client.stream('GET', file_path) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+    else:
+        with open(file_path, 'rb') as file:
+            while True:
+                chunk = await asyncio.to_thread(file.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+async def iter_lines(chunks, max_bytes: int, stats: IngestStats):
+    """Decode UTF-8 chunks into lines, stopping after ``max_bytes``."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    buffered = ''
+    read = 0
+    async for chunk in chunks:
+        read += len(chunk)
+        if read > max_bytes:
+            chunk = chunk[:len(chunk) - (read - max_bytes)]
+            stats.truncated = True
+        buffered += decoder.decode(chunk)
+        *lines, buffered = buffered.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+        if stats.truncated:
+            # The last, partial line is dropped with the rest of the file
+            return
+    buffered += decoder.decode(b'', final=True)
+    if buffered:
+        yield buffered.rstrip('\r')
+
+
+async def iter_usernames(lines, csv_format: bool, stats: IngestStats):
+    """Yield the valid, not yet seen usernames (without '@') found in ``lines``.
+
+    Text files may hold several usernames per line, separated by spaces,
+    commas or semicolons. CSV files are read from their ``username`` column,
+    or the first column if there is no such header.
+    """
+    seen = set()
+    column = None
+    async for line in lines:
+        stats.lines += 1
+        if csv_format:
+            row = next(csv.reader([line]), [])
+            if column is None:
+                headers = [cell.strip().lower() for cell in row]
+                column = headers.index('username') if 'username' in headers else 0
+                if 'username' in headers:
+                    continue
+            tokens = [row[column]] if len(row) > column else []
+        else:
+            tokens = re.split(r'[\s,;]+', line)
+
+        for token in tokens:
+            username = token.strip().lstrip('@')
+            if not username:
+                continue
+            if not USERNAME_PATTERN.match(username):
+                stats.invalid += 1
+                if len(stats.invalid_samples) < 10:
+                    stats.invalid_samples.append(username[:64])
+                continue
+            key = username.lower()
+            if key in seen:
+                stats.duplicates += 1
+                continue
+            seen.add(key)
+            stats.accepted += 1
+            yield username
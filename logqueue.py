@@ -0,0 +1,197 @@
+"""Logging off the event loop: records are queued and formatted and written by a background thread."""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# Attributes every LogRecord has; anything else was passed with ``extra`` and is written as a field
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'suppressed'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line.
+
+    Fields passed with ``extra={...}`` are written alongside the message, and
+    ``suppressed`` counts the identical records RepeatFilter dropped before it.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info or record.exc_text:
+            entry['exception'] = record.exc_text or self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RepeatFilter(logging.Filter):
+    """Lets through at most ``limit`` records per ``window`` seconds for each message template.
+
+    Records are told apart by logger, level and unformatted message, so
+    "Error getting user %s: %s" counts as one message whatever the user. The
+    first record let through after a window reports how many were dropped
+    in ``record.suppressed``. Records below ``min_level`` always pass.
+    """
+
+    def __init__(self, limit: int = 10, window: float = 60.0, min_level: int = logging.WARNING,
+                 max_keys: int = 1000, clock=time.monotonic):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.min_level = min_level
+        self.max_keys = max_keys
+        self._clock = clock
+        # {(logger, level, template): [window start, records let through, records dropped]}
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level or self.limit <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = self._clock()
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None or now - counts[0] >= self.window:
+                dropped = counts[2] if counts else 0
+                self._counts[key] = [now, 1, 0]
+                self._counts.move_to_end(key)
+                if len(self._counts) > self.max_keys:
+                    self._counts.popitem(last=False)
+                record.suppressed = dropped
+                return True
+            if counts[1] < self.limit:
+                counts[1] += 1
+                record.suppressed = 0
+                return True
+            counts[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them; the listener's thread formats them.
+
+    The stdlib QueueHandler formats the message in the logging thread. Here
+    only the traceback text is rendered up front (the frames may change
+    later), and records are dropped rather than waited for when the queue
+    is full.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Pipeline:
+    """The queue handler and writer thread installed by setup_logging()."""
+
+    def __init__(self, handler: LazyQueueHandler, writer: logging.Handler, queue_size: int):
+        self.handler = handler
+        self.writer = writer
+        self.queue_size = queue_size
+        self.listener = None
+
+    def start(self) -> None:
+        self.handler.queue = queue.Queue(self.queue_size)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, self.writer, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+_PIPELINE = None
+
+
+def setup_logging(level: int = logging.INFO, json_format: bool = True, repeat_limit: int = 10,
+                  repeat_window: float = 60.0, queue_size: int = 10000) -> None:
+    """Send all logging through a bounded queue to a writer thread printing to stderr.
+
+    With ``json_format`` every record is one JSON object per line, otherwise
+    the usual text format. Warnings and errors repeating the same message
+    more than ``repeat_limit`` times per ``repeat_window`` seconds are
+    dropped before they are queued. Calling it again replaces the pipeline.
+    """
+    global _PIPELINE
+    if _PIPELINE is not None:
+        _PIPELINE.stop()
+
+    writer = logging.StreamHandler()
+    if json_format:
+        writer.setFormatter(JSONFormatter())
+    else:
+        writer.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    handler = LazyQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(RepeatFilter(limit=repeat_limit, window=repeat_window))
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _PIPELINE = _Pipeline(handler, writer, queue_size)
+    _PIPELINE.start()
+
+
+def stats() -> dict:
+    """Return the number of records dropped as repeats and because the queue was full."""
+    if _PIPELINE is None:
+        return {'suppressed': 0, 'dropped': 0}
+    suppressed = sum(f.suppressed for f in _PIPELINE.handler.filters if isinstance(f, RepeatFilter))
+    return {'suppressed': suppressed, 'dropped': _PIPELINE.handler.dropped}
+
+
+def _stop() -> None:
+    if _PIPELINE is not None:
+        _PIPELINE.stop()
+
+
+def _restart_in_child() -> None:
+    # A forked process inherits the queue but not the writer thread
+    if _PIPELINE is not None:
+        _PIPELINE.listener = None
+        _PIPELINE.start()
+
+
+def _stop_with_process(_) -> None:
+    # Processes started by multiprocessing skip atexit but run its finalizers,
+    # registered after it cleared the ones inherited from the parent
+    multiprocessing.util.Finalize(None, _stop, exitpriority=0)
+
+
+atexit.register(_stop)
+os.register_at_fork(after_in_child=_restart_in_child)
+multiprocessing.util.register_after_fork(_stop, _stop_with_process)
@@ -0,0 +1,128 @@
+"""Prometheus metrics of the bot, recorded with prometheus_client.
+
+Handlers and outbound Bot API calls are instrumented by wrapping them
+(``instrument_application`` and ``InstrumentedRequest``). The endpoint is
+prometheus_client's own HTTP server, which runs in a thread; gauges
+computed at scrape time only read sizes and counters of the bot's state.
+"""
+import functools
+import logging
+import time
+
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from telegram.ext import ConversationHandler
+from telegram.request import BaseRequest
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cache hit to a flood wait
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HANDLER_SECONDS = Histogram(
+    'bot_handler_duration_seconds', "Time spent in update handlers.", ('handler',), buckets=DEFAULT_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors', "Exceptions raised by update handlers.", ('handler', 'error')
+)
+API_SECONDS = Histogram(
+    'bot_api_request_duration_seconds', "Time spent on Bot API requests, per attempt.", ('method',),
+    buckets=DEFAULT_BUCKETS
+)
+API_REQUESTS = Counter(
+    'bot_api_requests', "Bot API requests by method and outcome.", ('method', 'outcome')
+)
+
+
+def instrument_callback(callback, name: str):
+    """Wrap a handler callback to record its duration and the exceptions it raises."""
+
+    @functools.wraps(callback)
+    async def instrumented(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception as e:
+            HANDLER_ERRORS.labels(handler=name, error=type(e).__name__).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(handler=name).observe(time.perf_counter() - started)
+
+    return instrumented
+
+
+def _instrument_handler(handler) -> None:
+    if isinstance(handler, ConversationHandler):
+        for inner in handler.entry_points + handler.fallbacks:
+            _instrument_handler(inner)
+        for handlers in handler.states.values():
+            for inner in handlers:
+                _instrument_handler(inner)
+        return
+    callback = handler.callback
+    if not getattr(callback, '__wrapped__', None):
+        handler.callback = instrument_callback(callback, callback.__name__)
+
+
+def instrument_application(application) -> None:
+    """Instrument the callbacks of every handler registered on ``application``."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+
+
+class InstrumentedRequest(BaseRequest):
+    """Wraps another BaseRequest and records every Bot API request it makes.
+
+    Each HTTP attempt is timed and counted by method and outcome: 'ok', or the
+    name of the raised error (RetryAfter, BadRequest, TimedOut, ...).
+    """
+
+    def __init__(self, request: BaseRequest):
+        self.request = request
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        await self.request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.request.shutdown()
+
+    async def do_request(self, *args, **kwargs):
+        return await self.request.do_request(*args, **kwargs)
+
+    async def post(self, url: str, *args, **kwargs):
+        method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await super().post(url, *args, **kwargs)
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            API_SECONDS.labels(method=method).observe(time.perf_counter() - started)
+            API_REQUESTS.labels(method=method, outcome=outcome).inc()
+
+
+class MetricsServer:
+    """Serves ``registry`` at GET /metrics with prometheus_client's HTTP server."""
+
+    def __init__(self, registry=REGISTRY, host: str = '127.0.0.1', port: int = 0):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self) -> None:
+        """Start serving in a daemon thread; with port 0 the port is picked by the system."""
+        self._server, self._thread = start_http_server(self.port, self.host, self.registry)
+        self.port = self._server.server_port
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
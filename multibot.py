@@ -0,0 +1,49 @@
+"""Running several bots in one process, on one event loop."""
+import asyncio
+import logging
+import signal
+
+logger = logging.getLogger(__name__)
+
+
+async def run_bots(applications: list, allowed_updates=None) -> None:
+    """Poll for updates of every application until SIGINT/SIGTERM, like Application.run_polling.
+
+    The applications are started in order and stopped in reverse order, so
+    the first one, which sets up the state the bots share, is the last to
+    shut down.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Signal handlers aren't available on Windows event loops
+            pass
+
+    started = []
+    try:
+        for application in applications:
+            await application.initialize()
+            started.append(application)
+            if application.post_init:
+                await application.post_init(application)
+            await application.updater.start_polling(allowed_updates=allowed_updates)
+            await application.start()
+        logger.info("%s bots are running...", len(applications))
+
+        await stop.wait()
+    finally:
+        for application in reversed(started):
+            try:
+                if application.updater.running:
+                    await application.updater.stop()
+                if application.running:
+                    await application.stop()
+                    if application.post_stop:
+                        await application.post_stop(application)
+                await application.shutdown()
+            finally:
+                if application.post_shutdown:
+                    await application.post_shutdown(application)
@@ -0,0 +1,290 @@
+"""Durable storage for channel posts that are waiting for the creator's approval."""
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Message attributes checked, in order, to describe what a post contains
+CONTENT_KINDS = ('text', 'photo', 'video', 'document', 'audio', 'voice', 'animation', 'poll')
+
+# PendingPost fields holding lists, stored as JSON
+LIST_FIELDS = ('source_message_ids', 'message_ids')
+
+
+def pending_post_id(message) -> str:
+    """Return the id of the pending post a channel message belongs to.
+
+    A post is identified by its channel and message, or its album, so an
+    edit of the message finds the post it is part of.
+    """
+    return f"{message.chat_id}_{message.media_group_id or message.message_id}"
+
+
+class PendingPost:
+    """A channel post waiting for approval.
+
+    The content itself isn't stored: it is copied to the approver's private
+    chat as a preview, and publishing copies that preview back to the channel.
+    """
+
+    __slots__ = (
+        'post_id', 'chat_id', 'message_id', 'admin_id', 'admin_name', 'kind',
+        'text', 'created_at', 'source_chat_id', 'source_message_ids', 'message_ids', 'approval_message_id',
+    )
+
+    def __init__(self, post_id: str, chat_id: int, message_id: int, admin_id: int, admin_name: str,
+                 kind: str, text: str = None, created_at: float = None, source_chat_id: int = None,
+                 source_message_ids: list = None, message_ids: list = None, approval_message_id: int = None):
+        self.post_id = post_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.admin_id = admin_id
+        self.admin_name = admin_name
+        # One of CONTENT_KINDS or 'other', for display only
+        self.kind = kind
+        # Text or caption of the post, for display only
+        self.text = text
+        self.created_at = time.time() if created_at is None else created_at
+        # Chat and messages holding the copy that gets published on approval
+        self.source_chat_id = source_chat_id
+        self.source_message_ids = source_message_ids or []
+        # Messages of the post in the channel, in the order of source_message_ids
+        self.message_ids = message_ids or [message_id]
+        # Message with the approve/reject buttons, edited when the post is edited
+        self.approval_message_id = approval_message_id
+
+    @classmethod
+    def from_message(cls, post_id: str, message, admin_id: int, admin_name: str) -> 'PendingPost':
+        """Describe a telegram.Message waiting for approval."""
+        kind = next((kind for kind in CONTENT_KINDS if getattr(message, kind)), 'other')
+        return cls(
+            post_id, message.chat_id, message.message_id, admin_id, admin_name,
+            kind=kind, text=message.text or message.caption
+        )
+
+    def to_row(self) -> tuple:
+        """Return the post as a row of the pending_posts table."""
+        return tuple(
+            json.dumps(getattr(self, name)) if name in LIST_FIELDS else getattr(self, name)
+            for name in self.__slots__
+        )
+
+    @classmethod
+    def from_row(cls, row) -> 'PendingPost':
+        """Build a post from a row of the pending_posts table."""
+        values = dict(zip(cls.__slots__, row))
+        for name in LIST_FIELDS:
+            values[name] = json.loads(values[name] or '[]')
+        return cls(**values)
+
+
+class PendingPostStore:
+    """Pending posts kept in memory and written behind to SQLite.
+
+    Changes are buffered and written in one transaction by ``flush()``. Posts
+    expire ``ttl`` seconds after they were created; ``expire()`` pops them off
+    a heap ordered by expiry time, so it only touches posts that are due.
+    A secondary index groups the posts by approver and channel, for listing
+    and deciding on a channel's whole queue.
+
+    With ``shared`` set, several processes use the same database: changes
+    to a post are written immediately, ``get()`` reads the post from the
+    database so it sees other processes' changes, and ``pop()`` only returns
+    a post to the one process that deleted its row.
+    """
+
+    def __init__(self, path: str, ttl: float, clock=time.time, shared: bool = False):
+        self.path = path
+        self.ttl = ttl
+        self.shared = shared
+        self._clock = clock
+        self._posts = {}
+        # (expires_at, post_id) for every post in _posts
+        self._expiry = []
+        # {post_id: PendingPost to upsert, or None to delete}
+        self._dirty = {}
+        # {(source_chat_id, chat_id): {post_id: None}} for every post in _posts
+        self._by_channel = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Wait for writers in other processes instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pending_posts ("
+                "post_id TEXT PRIMARY KEY, chat_id INTEGER, message_id INTEGER, admin_id INTEGER, admin_name TEXT, "
+                "kind TEXT, text TEXT, created_at REAL, source_chat_id INTEGER, source_message_ids TEXT, "
+                "message_ids TEXT, approval_message_id INTEGER)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS pending_posts_by_channel "
+                "ON pending_posts (source_chat_id, chat_id, created_at)"
+            )
+        self._load()
+
+    def _load(self) -> None:
+        """Drop expired rows and load the remaining posts into memory."""
+        with self._db:
+            self._db.execute("DELETE FROM pending_posts WHERE created_at <= ?", (self._clock() - self.ttl,))
+        columns = ', '.join(PendingPost.__slots__)
+        for row in self._db.execute(f"SELECT {columns} FROM pending_posts"):
+            post = PendingPost.from_row(row)
+            self._remember(post)
+            heapq.heappush(self._expiry, (post.created_at + self.ttl, post.post_id))
+        logger.info("Loaded %s pending posts from %s", len(self._posts), self.path)
+
+    def __len__(self) -> int:
+        return len(self._posts)
+
+    def __contains__(self, post_id: str) -> bool:
+        return self.get(post_id) is not None
+
+    def add(self, post: PendingPost) -> None:
+        """Add or replace a pending post."""
+        self._remember(post)
+        self._dirty[post.post_id] = post
+        heapq.heappush(self._expiry, (post.created_at + self.ttl, post.post_id))
+        if self.shared:
+            # Other processes may be asked to approve it right away
+            self.flush()
+
+    def get(self, post_id: str):
+        """Return the pending post with ``post_id``, or None if it is unknown or expired."""
+        if self.shared:
+            post = self._read(post_id)
+        else:
+            post = self._posts.get(post_id)
+        if post is not None and post.created_at + self.ttl <= self._clock():
+            self._discard(post_id)
+            return None
+        return post
+
+    def _read(self, post_id: str):
+        """Read a post from the database, which other processes may have added, replaced or removed."""
+        columns = ', '.join(PendingPost.__slots__)
+        row = self._db.execute(f"SELECT {columns} FROM pending_posts WHERE post_id = ?", (post_id,)).fetchone()
+        cached = self._posts.get(post_id)
+        if cached is not None:
+            self._forget(post_id)
+        if row is None:
+            return None
+        post = PendingPost.from_row(row)
+        self._remember(post)
+        if cached is None or cached.created_at != post.created_at:
+            heapq.heappush(self._expiry, (post.created_at + self.ttl, post.post_id))
+        return post
+
+    def pop(self, post_id: str):
+        """Remove and return the pending post with ``post_id``, or None if it is unknown."""
+        post = self.get(post_id)
+        if post is None:
+            return None
+        self._discard(post_id)
+        if self.shared:
+            # Only the process whose delete removed the row gets the post
+            del self._dirty[post_id]
+            with self._db:
+                claimed = self._db.execute("DELETE FROM pending_posts WHERE post_id = ?", (post_id,)).rowcount
+            if not claimed:
+                return None
+        return post
+
+    def _remember(self, post: PendingPost) -> None:
+        self._posts[post.post_id] = post
+        self._by_channel.setdefault((post.source_chat_id, post.chat_id), {})[post.post_id] = None
+
+    def _forget(self, post_id: str) -> None:
+        post = self._posts.pop(post_id)
+        key = (post.source_chat_id, post.chat_id)
+        posts = self._by_channel[key]
+        del posts[post_id]
+        if not posts:
+            del self._by_channel[key]
+
+    def _discard(self, post_id: str) -> None:
+        self._forget(post_id)
+        self._dirty[post_id] = None
+
+    def channels(self, approver_id: int) -> dict:
+        """Return {chat_id: number of pending posts} for the channels ``approver_id`` decides on."""
+        if self.shared:
+            # Including posts other processes added
+            self.flush()
+            rows = self._db.execute(
+                "SELECT chat_id, COUNT(*) FROM pending_posts WHERE source_chat_id = ? AND created_at > ? "
+                "GROUP BY chat_id",
+                (approver_id, self._clock() - self.ttl)
+            )
+            return dict(rows)
+        now = self._clock()
+        counts = {}
+        for (source_chat_id, chat_id), post_ids in self._by_channel.items():
+            if source_chat_id != approver_id:
+                continue
+            count = sum(1 for post_id in post_ids if self._posts[post_id].created_at + self.ttl > now)
+            if count:
+                counts[chat_id] = count
+        return counts
+
+    def for_channel(self, approver_id: int, chat_id: int) -> list:
+        """Return the posts of ``chat_id`` waiting for ``approver_id``, oldest first."""
+        if self.shared:
+            self.flush()
+            post_ids = [row[0] for row in self._db.execute(
+                "SELECT post_id FROM pending_posts WHERE source_chat_id = ? AND chat_id = ? ORDER BY created_at",
+                (approver_id, chat_id)
+            )]
+        else:
+            post_ids = list(self._by_channel.get((approver_id, chat_id), ()))
+        posts = [post for post in map(self.get, post_ids) if post is not None]
+        posts.sort(key=lambda post: (post.created_at, post.message_id))
+        return posts
+
+    def expire(self) -> int:
+        """Drop every post whose TTL has passed. Returns the number of posts dropped."""
+        now = self._clock()
+        expired = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, post_id = heapq.heappop(self._expiry)
+            post = self._posts.get(post_id)
+            # Skip heap entries left behind by posts that were replaced or already removed
+            if post is not None and post.created_at + self.ttl == expires_at:
+                self._discard(post_id)
+                expired += 1
+        if self.shared:
+            # Including posts this process never loaded
+            with self._db:
+                self._db.execute("DELETE FROM pending_posts WHERE created_at <= ?", (now - self.ttl,))
+        return expired
+
+    def flush(self) -> int:
+        """Write buffered changes to SQLite in one transaction. Returns the number of changes."""
+        if not self._dirty:
+            return 0
+
+        dirty, self._dirty = self._dirty, {}
+        upserts = [post.to_row() for post in dirty.values() if post is not None]
+        deletes = [(post_id,) for post_id, post in dirty.items() if post is None]
+        columns = ', '.join(PendingPost.__slots__)
+        placeholders = ', '.join('?' * len(PendingPost.__slots__))
+        with self._db:
+            if upserts:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO pending_posts ({columns}) VALUES ({placeholders})", upserts
+                )
+            if deletes:
+                self._db.executemany("DELETE FROM pending_posts WHERE post_id = ?", deletes)
+        return len(dirty)
+
+    def close(self) -> None:
+        """Flush buffered changes and close the database."""
+        self.flush()
+        self._db.close()
@@ -0,0 +1,153 @@
+"""SQLite persistence for conversation states and user_data."""
+import json
+import logging
+import os
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Keeps ConversationHandler states and user_data in SQLite.
+
+    Every user and every conversation is its own row, so saving touches only
+    what changed instead of rewriting everything like PicklePersistence.
+    Changes handed over by the Application are buffered and written in one
+    transaction by ``write()``. user_data isn't loaded at startup: each
+    user's row is read the first time an update of that user arrives.
+
+    Values must be JSON serializable. Chat data, bot data and callback data
+    aren't stored.
+    """
+
+    def __init__(self, path: str, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        # Users whose stored user_data has been read into memory
+        self._loaded_users = set()
+        # {user_id: JSON of the data to upsert, or None to delete}
+        self._dirty_users = {}
+        # {(name, JSON of the key): JSON of the state to upsert, or None to delete}
+        self._dirty_conversations = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, PRIMARY KEY (name, key))"
+            )
+
+    # user_data
+
+    async def get_user_data(self) -> dict:
+        """Return nothing; user_data is loaded per user by refresh_user_data()."""
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """Load the stored user_data of ``user_id`` the first time the user shows up."""
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        row = self._db.execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        if row:
+            # Keep anything set in memory before the row was read
+            user_data.update({**json.loads(row[0]), **user_data})
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        """Buffer the user_data of ``user_id`` for the next write()."""
+        if user_id not in self._loaded_users and not data:
+            # Nothing was read or changed, keep whatever is stored
+            return
+        self._loaded_users.add(user_id)
+        self._dirty_users[user_id] = json.dumps(data) if data else None
+
+    async def drop_user_data(self, user_id: int) -> None:
+        """Delete the user_data of ``user_id``."""
+        self._loaded_users.discard(user_id)
+        self._dirty_users[user_id] = None
+
+    # Conversations
+
+    async def get_conversations(self, name: str) -> dict:
+        """Return the stored states of the ConversationHandler called ``name``."""
+        rows = self._db.execute("SELECT key, state FROM conversations WHERE name = ?", (name,))
+        conversations = {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+        logger.info("Loaded %s %s conversations from %s", len(conversations), name, self.path)
+        return conversations
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        """Buffer a conversation state for the next write(); None ends the conversation."""
+        self._dirty_conversations[(name, json.dumps(key))] = None if new_state is None else json.dumps(new_state)
+
+    # Not stored
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    # Writing
+
+    def write(self) -> int:
+        """Write buffered changes to SQLite in one transaction. Returns the number of changes."""
+        if not self._dirty_users and not self._dirty_conversations:
+            return 0
+
+        users, self._dirty_users = self._dirty_users, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+                [(user_id, data) for user_id, data in users.items() if data is not None]
+            )
+            self._db.executemany(
+                "DELETE FROM user_data WHERE user_id = ?",
+                [(user_id,) for user_id, data in users.items() if data is None]
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+            )
+            self._db.executemany(
+                "DELETE FROM conversations WHERE name = ? AND key = ?",
+                [(name, key) for (name, key), state in conversations.items() if state is None]
+            )
+        return len(users) + len(conversations)
+
+    async def flush(self) -> None:
+        """Write buffered changes and close the database; called when the Application shuts down."""
+        self.write()
+        self._db.close()
@@ -0,0 +1,97 @@
+"""Progress messages for long-running operations."""
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds: float) -> str:
+    """Format a number of seconds as e.g. '1h 02m', '3m 05s' or '42s'."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressReporter:
+    """Keeps a status message up to date without spending the API budget on it.
+
+    ``update()`` only records the latest state and returns immediately. The
+    message is edited in the background at most once every ``interval``
+    seconds, always with the latest state, and only when its text changed.
+    Each edit shows the processing rate and an ETA when the total is known.
+    """
+
+    def __init__(self, message, interval: float = 3.0, label: str = "items", clock=time.monotonic):
+        self.message = message
+        self.interval = interval
+        self.label = label
+        self._clock = clock
+        self._started_at = clock()
+        self._next_edit_at = 0.0
+        self._last_text = message.text
+        self._state = None
+        self._flush_task = None
+        self.edits = 0
+
+    def render(self, done: int, total: int = None, details: str = None) -> str:
+        """Build the progress text for ``done`` of ``total`` items."""
+        elapsed = self._clock() - self._started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+
+        if total is not None:
+            lines = [f"Progress: {done}/{total} {self.label} processed."]
+        else:
+            lines = [f"Progress: {done} {self.label} processed."]
+        if details:
+            lines.append(details)
+
+        stats = f"Rate: {rate:.1f}/s"
+        if total is not None and rate > 0 and done < total:
+            stats += f", ETA: {format_duration((total - done) / rate)}"
+        lines.append(stats)
+        return "\n".join(lines)
+
+    def update(self, done: int, total: int = None, details: str = None) -> None:
+        """Record the latest progress; the message is edited when the interval allows."""
+        self._state = (done, total, details)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        delay = self._next_edit_at - self._clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._edit(self.render(*self._state))
+
+    async def _edit(self, text: str) -> None:
+        if text == self._last_text:
+            return
+        self._next_edit_at = self._clock() + self.interval
+        try:
+            await self.message.edit_text(text)
+            self._last_text = text
+            self.edits += 1
+        except BadRequest as e:
+            # Telegram rejects edits that don't change anything
+            if "not modified" not in str(e).lower():
+                logger.error("Error updating progress message: %s", e)
+        except Exception as e:
+            logger.error("Error updating progress message: %s", e)
+
+    async def finish(self, text: str = None) -> None:
+        """Stop background edits and show the final state (or ``text``) right away."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        if text is None and self._state is None:
+            return
+        await self._edit(text if text is not None else self.render(*self._state))
@@ -0,0 +1,249 @@
+"""Helpers for staying within Telegram's flood limits."""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(exc) -> float:
+    """Return the wait time of a telegram.error.RetryAfter in seconds."""
+    value = exc.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class AdaptiveBackoff:
+    """Shared pacing for workers calling the same flood-limited API method.
+
+    Every call is preceded by ``await wait()``, which spaces calls ``delay``
+    seconds apart across all workers. A RetryAfter pauses every worker for the
+    requested time and doubles the delay; each success shrinks it again, so the
+    workers settle just under the rate Telegram accepts.
+    """
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 5.0, clock=time.monotonic):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+        self._clock = clock
+        self._next_slot = 0.0
+        self._resume_at = 0.0
+        self.retry_after_count = 0
+
+    async def wait(self) -> None:
+        """Wait for this worker's turn to make a call."""
+        now = self._clock()
+        slot = max(now, self._next_slot, self._resume_at)
+        self._next_slot = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def on_success(self) -> None:
+        """Shrink the delay after a call went through."""
+        self.delay = max(self.min_delay, self.delay * 0.9 - 0.001)
+
+    def on_retry_after(self, seconds: float) -> None:
+        """Pause every worker for ``seconds`` and slow down afterwards."""
+        self.retry_after_count += 1
+        self._resume_at = max(self._resume_at, self._clock() + seconds)
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.05))
+
+
+class Priority(IntEnum):
+    """Scheduling classes of outbound API calls, most urgent first."""
+
+    MODERATION = 0
+    PUBLISHING = 1
+    NOTIFICATION = 2
+    BACKGROUND = 3
+
+
+# Priority of calls made in the current task, see api_priority()
+_CURRENT_PRIORITY = contextvars.ContextVar('api_priority', default=None)
+
+# Default priority of endpoints when the caller doesn't set one
+ENDPOINT_PRIORITIES = {
+    'banChatMember': Priority.MODERATION,
+    'unbanChatMember': Priority.MODERATION,
+    'restrictChatMember': Priority.MODERATION,
+    'banChatSenderChat': Priority.MODERATION,
+    'deleteMessage': Priority.MODERATION,
+    'deleteMessages': Priority.MODERATION,
+    'getChatMember': Priority.MODERATION,
+}
+
+# Endpoints that count against the per-chat message limits
+_MESSAGE_ENDPOINT_PREFIXES = ('send', 'copy', 'forward', 'edit')
+
+
+@contextlib.contextmanager
+def api_priority(priority: Priority):
+    """Run the API calls made inside the block, and in tasks created there, at ``priority``."""
+    token = _CURRENT_PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _CURRENT_PRIORITY.reset(token)
+
+
+class TokenBucket:
+    """A token bucket that hands out tokens to waiters in priority order.
+
+    Holds up to ``capacity`` tokens and refills ``rate`` tokens per second.
+    ``pause()`` stops handing out tokens for a while, e.g. after a RetryAfter.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+        self._paused_until = 0.0
+        # Heap of (priority, sequence, future)
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        """True when nobody is waiting and the bucket has refilled completely."""
+        self._refill(self._clock())
+        return not self._waiters and self.tokens >= self.capacity
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = Priority.NOTIFICATION) -> None:
+        """Wait for a token, served before any waiter of a lower priority."""
+        now = self._clock()
+        self._refill(now)
+        if not self._waiters and now >= self._paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._schedule(now)
+        await future
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds``."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def _schedule(self, now: float) -> None:
+        if self._timer is not None or not self._waiters:
+            return
+        delay = max(self._paused_until - now, (1 - self.tokens) / self.rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._drain)
+
+    def _drain(self) -> None:
+        self._timer = None
+        now = self._clock()
+        self._refill(now)
+        while self._waiters and now >= self._paused_until and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            # Callers that gave up while waiting don't use up a token
+            if future.done():
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+        self._schedule(now)
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Schedules every outbound Bot API call through global and per-chat token buckets.
+
+    Calls are served by priority: moderation, then publishing, then
+    notifications, then background work. The priority comes from
+    ``rate_limit_args``, the enclosing ``api_priority()`` block or
+    ENDPOINT_PRIORITIES, in that order. A RetryAfter pauses only the bucket
+    of the affected chat (or the global bucket for calls without a chat) and
+    the call is retried up to ``max_retries`` times.
+    """
+
+    def __init__(self, global_rate: float = 30, group_rate_per_minute: float = 20,
+                 private_rate: float = 1, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_rate_per_minute = group_rate_per_minute
+        self.private_rate = private_rate
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self.retry_after_count = 0
+
+    async def initialize(self) -> None:
+        """Does nothing."""
+
+    async def shutdown(self) -> None:
+        """Does nothing."""
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Forget buckets of chats that went quiet, so memory stays bounded
+            if len(self._chat_buckets) > 1024:
+                for key in [key for key, other in self._chat_buckets.items() if other.idle]:
+                    del self._chat_buckets[key]
+
+            if isinstance(chat_id, str) or chat_id < 0:
+                rate = self.group_rate_per_minute / 60
+                bucket = TokenBucket(rate, self.group_rate_per_minute)
+            else:
+                bucket = TokenBucket(self.private_rate, self.private_rate)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def stats(self) -> dict:
+        """Return the number of waiting calls and RetryAfter responses."""
+        return {
+            'global_waiting': self.global_bucket.waiting,
+            'chat_waiting': sum(bucket.waiting for bucket in self._chat_buckets.values()),
+            'chat_buckets': len(self._chat_buckets),
+            'retry_after': self.retry_after_count,
+        }
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        """Wait for the buckets of the call, then make it, retrying on RetryAfter."""
+        priority = rate_limit_args
+        if priority is None:
+            priority = _CURRENT_PRIORITY.get()
+        if priority is None:
+            priority = ENDPOINT_PRIORITIES.get(endpoint, Priority.NOTIFICATION)
+
+        chat_id = data.get('chat_id')
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        chat_bucket = None
+        if chat_id is not None and endpoint.startswith(_MESSAGE_ENDPOINT_PREFIXES):
+            chat_bucket = self._chat_bucket(chat_id)
+
+        for attempt in range(self.max_retries + 1):
+            if chat_bucket:
+                await chat_bucket.acquire(priority)
+            await self.global_bucket.acquire(priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_count += 1
+                if attempt == self.max_retries:
+                    raise
+                seconds = retry_after_seconds(e) + 0.1
+                paused_bucket = chat_bucket or self.global_bucket
+                paused_bucket.pause(seconds)
+                logger.info("Flood limit hit on %s (chat %s), pausing its bucket for %s seconds", endpoint, chat_id, seconds)
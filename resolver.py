@@ -0,0 +1,116 @@
+"""Persistent cache of username to user_id resolutions."""
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_BULK_CHUNK = 500
+
+
+def normalize_username(username: str) -> str:
+    """Normalize a username the way the add commands parse it, case-insensitively."""
+    return username.strip(' @').lower()
+
+
+class UsernameCache:
+    """Username resolutions persisted in SQLite across restarts.
+
+    Found usernames are kept for ``positive_ttl`` seconds and usernames that
+    do not exist for ``negative_ttl`` seconds, so neither is looked up again
+    in the meantime. Writes are buffered and written by ``flush()``.
+    """
+
+    def __init__(self, path: str, positive_ttl: float, negative_ttl: float, clock=time.time):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        # {username: (user_id or None, expires_at)} waiting to be written
+        self._dirty = {}
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS usernames ("
+            "username TEXT PRIMARY KEY, user_id INTEGER, expires_at REAL)"
+        )
+        with self._db:
+            self._db.execute("DELETE FROM usernames WHERE expires_at <= ?", (self._clock(),))
+
+    def get_many(self, usernames) -> dict:
+        """Look up several usernames at once.
+
+        Returns {username: user_id} for every cached username, with None as
+        the user_id of usernames known not to exist. Uncached usernames are
+        left out.
+        """
+        now = self._clock()
+        found = {}
+        pending = {}
+        for username in usernames:
+            key = normalize_username(username)
+            entry = self._dirty.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    found[username] = entry[0]
+            else:
+                pending.setdefault(key, []).append(username)
+
+        keys = list(pending)
+        for start in range(0, len(keys), _BULK_CHUNK):
+            chunk = keys[start:start + _BULK_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self._db.execute(
+                f"SELECT username, user_id FROM usernames WHERE expires_at > ? AND username IN ({placeholders})",
+                (now, *chunk)
+            )
+            for key, user_id in rows:
+                for username in pending[key]:
+                    found[username] = user_id
+
+        self.hits += len(found)
+        self.misses += len(usernames) - len(found)
+        return found
+
+    def get(self, username: str, default=None):
+        """Look up one username. Returns ``default`` when it is not cached."""
+        return self.get_many([username]).get(username, default)
+
+    def set(self, username: str, user_id: int) -> None:
+        """Remember that ``username`` resolves to ``user_id``."""
+        self._dirty[normalize_username(username)] = (user_id, self._clock() + self.positive_ttl)
+
+    def set_missing(self, username: str) -> None:
+        """Remember that ``username`` does not exist."""
+        self._dirty[normalize_username(username)] = (None, self._clock() + self.negative_ttl)
+
+    def flush(self) -> int:
+        """Write buffered resolutions to SQLite in one transaction. Returns the number written."""
+        if not self._dirty:
+            return 0
+
+        dirty, self._dirty = self._dirty, {}
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO usernames VALUES (?, ?, ?)",
+                [(username, user_id, expires_at) for username, (user_id, expires_at) in dirty.items()]
+            )
+        return len(dirty)
+
+    def close(self) -> None:
+        """Flush buffered resolutions and close the database."""
+        self.flush()
+        self._db.close()
+
+    def stats(self) -> dict:
+        """Return the lookup counters."""
+        return {'hits': self.hits, 'misses': self.misses, 'buffered': len(self._dirty)}
@@ -0,0 +1,286 @@
+"""Sharded run mode: one ingress process routes updates to N worker processes by chat."""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import zlib
+
+from telegram import Bot, Update
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import Updater
+
+from dispatch import KeyedUpdateProcessor
+from ratelimit import retry_after_seconds
+from webhook import webhook_args
+
+logger = logging.getLogger(__name__)
+
+# Seconds getUpdates waits for new updates before returning empty
+POLL_TIMEOUT = 10
+
+# Seconds between checks that every worker process is still alive
+WATCH_INTERVAL = 1.0
+
+
+def shard_for(update: Update, shards: int) -> int:
+    """Return the shard handling ``update``: every update of a chat goes to the same shard."""
+    key = KeyedUpdateProcessor.key_for(update)
+    if key is None:
+        return 0
+    return shard_for_chat(key[1], shards)
+
+
+def shard_for_chat(chat_id: int, shards: int) -> int:
+    """Return the shard handling the updates of ``chat_id``."""
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+class ShardRouter:
+    """Sends updates to the worker queue of their shard.
+
+    Every shard has its own backlog and sender task, so a worker that falls
+    behind only delays its own chats. Once a shard's backlog of ``backlog``
+    batches is full too, ``route()`` waits for room, which holds back
+    fetching further updates for every shard instead of losing any. What
+    is sent to a shard whose worker died is dropped and counted in
+    ``dropped``.
+    """
+
+    def __init__(self, bot: Bot, queues: list, backlog: int = 1000):
+        self.bot = bot
+        self.queues = queues
+        self.routed = [0] * len(queues)
+        self.dropped = [0] * len(queues)
+        # Shards whose worker died; what is sent to them is dropped
+        self.dead = set()
+        self._backlogs = [asyncio.Queue(backlog) for _ in queues]
+        self._senders = []
+
+    def start(self) -> None:
+        """Start the sender task of every shard."""
+        self._senders = [asyncio.create_task(self._send(index)) for index in range(len(self.queues))]
+
+    async def stop(self) -> None:
+        """Send what is left in the backlogs, then stop the sender tasks."""
+        for backlog in self._backlogs:
+            await backlog.put(None)
+        await asyncio.gather(*self._senders)
+
+    async def route(self, updates: list) -> None:
+        """Queue a batch of updates, one message per shard, in their original order.
+
+        Waits while the backlog of a shard the batch has updates for is full.
+        """
+        batches = [[] for _ in self.queues]
+        for update in updates:
+            batches[shard_for(update, len(self.queues))].append(update.to_dict())
+        for index, batch in enumerate(batches):
+            if not batch:
+                continue
+            backlog = self._backlogs[index]
+            if backlog.full():
+                logger.warning("Shard %s is too far behind, waiting before fetching more updates", index)
+            await backlog.put(batch)
+
+    def mark_dead(self, index: int) -> None:
+        """Stop sending to the shard ``index``, whose worker is gone."""
+        self.dead.add(index)
+
+    async def _send(self, index: int) -> None:
+        loop = asyncio.get_running_loop()
+        backlog = self._backlogs[index]
+        while True:
+            batch = await backlog.get()
+            if batch is None:
+                return
+            while index not in self.dead:
+                try:
+                    self.queues[index].put_nowait(batch)
+                    break
+                except queue.Full:
+                    pass
+                # The worker is behind: wait for room without blocking the event loop, in
+                # short steps so a worker that died meanwhile is noticed
+                try:
+                    await loop.run_in_executor(None, functools.partial(self.queues[index].put, batch, timeout=1))
+                    break
+                except queue.Full:
+                    continue
+            if index in self.dead:
+                self.dropped[index] += len(batch)
+            else:
+                self.routed[index] += len(batch)
+
+
+async def watch_workers(workers: list, router: ShardRouter, stop: asyncio.Event) -> None:
+    """Stop the ingress as soon as a worker process dies, so whatever supervises the bot can restart it."""
+    while not stop.is_set():
+        for index, worker in enumerate(workers):
+            if not worker.is_alive():
+                logger.error("Shard %s exited with code %s, stopping", index, worker.exitcode)
+                router.mark_dead(index)
+                stop.set()
+                return
+        try:
+            await asyncio.wait_for(stop.wait(), WATCH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def poll(bot: Bot, router: ShardRouter, allowed_updates, stop: asyncio.Event) -> None:
+    """Fetch updates with getUpdates and route them until ``stop`` is set."""
+    offset = 0
+    while not stop.is_set():
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates)
+        except RetryAfter as e:
+            await asyncio.sleep(retry_after_seconds(e))
+            continue
+        except TelegramError as e:
+            logger.error("Error fetching updates: %s", e)
+            await asyncio.sleep(1)
+            continue
+        if updates:
+            # Only confirm updates once every shard has room for them
+            await router.route(updates)
+            offset = updates[-1].update_id + 1
+
+    # Confirm the routed updates so they aren't delivered again after a restart
+    if offset:
+        await bot.get_updates(offset=offset, timeout=0, limit=1)
+
+
+async def forward(updates: asyncio.Queue, router: ShardRouter) -> None:
+    """Route the updates the webhook puts on ``updates`` until it gets None, batching those that arrived together."""
+    while True:
+        batch = [await updates.get()]
+        while not updates.empty():
+            batch.append(updates.get_nowait())
+        done = None in batch
+        batch = [update for update in batch if update is not None]
+        if batch:
+            await router.route(batch)
+        if done:
+            return
+
+
+async def run_ingress(token: str, queues: list, allowed_updates, webhook: dict = None, request=None,
+                      get_updates_request=None, workers: list = None, backlog: int = 1000) -> None:
+    """Receive updates by polling or webhook and route them until SIGINT/SIGTERM or a worker dies.
+
+    ``request`` and ``get_updates_request`` are the bot's BaseRequest objects, or None for the defaults.
+    ``workers`` are the worker processes to watch, ``backlog`` the batches held per shard for a busy worker.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Signal handlers aren't available on Windows event loops
+            pass
+
+    async with Bot(token, request=request, get_updates_request=get_updates_request) as bot:
+        router = ShardRouter(bot, queues, backlog)
+        router.start()
+        watching = asyncio.create_task(watch_workers(workers or [], router, stop))
+        if webhook:
+            updates = asyncio.Queue()
+            async with Updater(bot, updates) as updater:
+                await updater.start_webhook(**webhook_args(webhook), allowed_updates=allowed_updates)
+                forwarding = asyncio.create_task(forward(updates, router))
+                logger.info("Ingress is routing webhook updates to %s shards...", len(queues))
+                await stop.wait()
+                await updater.stop()
+                await updates.put(None)
+                await forwarding
+        else:
+            await bot.delete_webhook()
+            logger.info("Ingress is routing polled updates to %s shards...", len(queues))
+            polling = asyncio.create_task(poll(bot, router, allowed_updates, stop))
+            await stop.wait()
+            await polling
+        await router.stop()
+        watching.cancel()
+        logger.info("Routed updates per shard: %s, dropped: %s", router.routed, router.dropped)
+
+
+async def run_worker(application, updates: multiprocessing.Queue) -> None:
+    """Run ``application`` on the updates the ingress sends until it sends None."""
+    loop = asyncio.get_running_loop()
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+
+            while True:
+                batch = await loop.run_in_executor(None, updates.get)
+                if batch is None:
+                    break
+                for data in batch:
+                    await application.update_queue.put(Update.de_json(data, application.bot))
+
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def worker_main(build_application, token: str, index: int, shards: int, updates: multiprocessing.Queue) -> None:
+    """Entry point of a worker process."""
+    # Shutdown is driven by the ingress, not by the terminal's Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    application = build_application(token, shard_index=index, shards=shards)
+    asyncio.run(run_worker(application, updates))
+    logger.info("Shard %s stopped", index)
+
+
+def run_sharded(token: str, shards: int, build_application, allowed_updates=None, webhook: dict = None,
+                queue_size: int = 1000, request=None, get_updates_request=None) -> None:
+    """Run ``shards`` worker processes fed by an ingress in this process.
+
+    ``build_application(token, shard_index, shards)`` is called in each
+    worker to set up its Application. ``webhook`` holds the url, path,
+    secret_token, host and port to receive updates with; without it the
+    ingress polls. ``request`` and ``get_updates_request`` are the ingress
+    bot's BaseRequest objects. If a worker dies the ingress stops the other
+    workers and the process exits with status 1.
+    """
+    # Workers are forked before the ingress starts its event loop, so they
+    # inherit the loaded modules and nothing else
+    context = multiprocessing.get_context('fork')
+    queues = [context.Queue(maxsize=queue_size) for _ in range(shards)]
+    workers = [
+        context.Process(
+            target=worker_main,
+            args=(build_application, token, index, shards, queues[index]),
+            name=f"shard-{index}"
+        )
+        for index in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info("Started %s shard workers", shards)
+
+    try:
+        asyncio.run(run_ingress(token, queues, allowed_updates, webhook, request, get_updates_request, workers,
+                                queue_size))
+    finally:
+        for worker, updates in zip(workers, queues):
+            # A dead worker's queue may be full and will never be read again
+            if worker.is_alive():
+                updates.put(None)
+        for worker in workers:
+            worker.join()
+
+    failed = [index for index, worker in enumerate(workers) if worker.exitcode]
+    if failed:
+        logger.error("Shards %s failed", failed)
+        sys.exit(1)
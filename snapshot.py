@@ -0,0 +1,97 @@
+"""Warm-start snapshots of the in-memory caches.
+
+The channel rosters and chat member lookups are written to a gzipped JSON
+file together with how long each entry had left to live, and loaded back at
+startup with whatever time remains, so a restart doesn't begin with cold
+caches.
+"""
+import gzip
+import json
+import logging
+import os
+import time
+
+from telegram import ChatMember, User
+
+from cache import ChannelRoster, TTLCache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def _roster_to_dict(roster: ChannelRoster) -> dict:
+    return {
+        'chat_id': roster.chat_id,
+        'title': roster.title,
+        'creator': roster.creator.to_dict() if roster.creator else None,
+        'admins': list(roster.admins.items()),
+    }
+
+
+def _roster_from_dict(data: dict) -> ChannelRoster:
+    return ChannelRoster(
+        chat_id=data['chat_id'],
+        title=data['title'],
+        creator=User.de_json(data['creator'], None) if data['creator'] else None,
+        admins=dict(data['admins'])
+    )
+
+
+def save_snapshot(path: str, rosters: TTLCache, members: TTLCache) -> int:
+    """Write the live entries of both caches to ``path``. Returns the number of entries written."""
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'rosters': [
+            {'ttl': ttl, **_roster_to_dict(roster)}
+            for _, roster, ttl in rosters.entries()
+        ],
+        'members': [
+            {'ttl': ttl, 'chat_id': chat_id, 'member': member.to_dict()}
+            for (chat_id, _), member, ttl in members.entries()
+        ],
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write next to the target and swap it in, so a crash never leaves half a snapshot
+    temporary = f"{path}.tmp"
+    with gzip.open(temporary, 'wt', encoding='utf-8', compresslevel=6) as file:
+        json.dump(snapshot, file, separators=(',', ':'))
+    os.replace(temporary, path)
+    return len(snapshot['rosters']) + len(snapshot['members'])
+
+
+def load_snapshot(path: str, rosters: TTLCache, members: TTLCache) -> tuple:
+    """Fill both caches from the snapshot at ``path``, skipping entries that expired since it was saved.
+
+    Returns the number of (rosters, members) loaded.
+    """
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            snapshot = json.load(file)
+    except FileNotFoundError:
+        return 0, 0
+    except (OSError, ValueError) as e:
+        logger.error("Ignoring unreadable cache snapshot %s: %s", path, e)
+        return 0, 0
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        logger.warning("Ignoring cache snapshot %s of version %s", path, snapshot.get('version'))
+        return 0, 0
+
+    age = max(0.0, time.time() - snapshot['saved_at'])
+    loaded_rosters = loaded_members = 0
+    for data in snapshot['rosters']:
+        ttl = data.pop('ttl') - age
+        if ttl > 0:
+            rosters.set(data['chat_id'], _roster_from_dict(data), ttl=ttl)
+            loaded_rosters += 1
+    for data in snapshot['members']:
+        ttl = data['ttl'] - age
+        if ttl > 0:
+            member = ChatMember.de_json(data['member'], None)
+            members.set((data['chat_id'], member.user.id), member, ttl=ttl)
+            loaded_members += 1
+    return loaded_rosters, loaded_members
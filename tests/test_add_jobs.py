@@ -0,0 +1,105 @@
+"""Tests for add_jobs.AddJobStore and the usernames /addgroup starts a job with."""
+import asyncio
+from types import SimpleNamespace
+
+import bot
+from add_jobs import CANCELLED, DONE, PAUSED, QUEUED, RUNNING, AddJobStore
+
+
+def open_store(tmp_path) -> AddJobStore:
+    return AddJobStore(str(tmp_path / 'add_jobs.sqlite3'))
+
+
+def test_create_records_usernames_once(tmp_path):
+    store = open_store(tmp_path)
+    job = store.create(1, 10, -100, ['alice_smith', 'bob_jones', 'alice_smith'])
+    assert job.status == QUEUED
+    assert job.total == 2
+    assert list(store.pending_usernames(job.job_id)) == ['alice_smith', 'bob_jones']
+    store.close()
+
+
+def test_add_usernames_returns_only_new_ones(tmp_path):
+    store = open_store(tmp_path)
+    job = store.create(1, 10, -100, file_id='file', csv_format=True)
+    assert not job.source_complete
+    assert job.csv_format
+    assert store.add_usernames(job.job_id, ['alice_smith', 'bob_jones']) == ['alice_smith', 'bob_jones']
+    assert store.add_usernames(job.job_id, ['bob_jones', 'carol_king']) == ['carol_king']
+    assert store.add_usernames(job.job_id, ['carol_king']) == []
+    store.mark_source_complete(job.job_id)
+    job = store.get(job.job_id)
+    assert job.total == 3
+    assert job.source_complete
+    assert list(store.pending_usernames(job.job_id)) == ['alice_smith', 'bob_jones', 'carol_king']
+    store.close()
+
+
+def test_resume_after_a_checkpoint(tmp_path):
+    store = open_store(tmp_path)
+    usernames = [f'user_{number:04}' for number in range(2500)]
+    job = store.create(1, 10, -100, usernames)
+    store.record(job.job_id, [(username, number % 10 != 0) for number, username in enumerate(usernames[:1200])])
+    store.set_status(job.job_id, RUNNING)
+    store.close()
+
+    # After a restart the job picks up where its last checkpoint left it
+    store = open_store(tmp_path)
+    assert [active.job_id for active in store.active()] == [job.job_id]
+    job = store.get(job.job_id)
+    assert job.added == 1080
+    assert job.failed == 120
+    assert job.processed == 1200
+    assert list(store.pending_usernames(job.job_id, batch_size=100)) == usernames[1200:]
+    assert store.failed_usernames(job.job_id, limit=3) == ['user_0000', 'user_0010', 'user_0020']
+    store.close()
+
+
+def test_only_queued_and_running_jobs_are_active(tmp_path):
+    store = open_store(tmp_path)
+    jobs = [store.create(1, 10, -100, ['alice_smith']) for _ in range(5)]
+    for job, status in zip(jobs, (QUEUED, RUNNING, PAUSED, CANCELLED, DONE)):
+        store.set_status(job.job_id, status)
+    store.set_status(jobs[4].job_id, DONE, error=None)
+    assert [job.job_id for job in store.active()] == [jobs[0].job_id, jobs[1].job_id]
+    store.close()
+
+
+def test_jobs_of_an_owner_newest_first(tmp_path):
+    store = open_store(tmp_path)
+    first = store.create(1, 10, -100)
+    store.create(2, 20, -100)
+    third = store.create(1, 10, -200)
+    assert [job.job_id for job in store.list_for_owner(1)] == [third.job_id, first.job_id]
+    assert [job.job_id for job in store.list_for_owner(1, limit=1)] == [third.job_id]
+    assert store.get(12345) is None
+    store.close()
+
+
+def run_get_group_info(monkeypatch, text: str) -> tuple:
+    """Send ``text`` to get_group_info; returns the replies and the usernames a job was started with."""
+    replies = []
+    started = []
+
+    async def reply_text(reply, **kwargs):
+        replies.append(reply)
+
+    async def add_users_to_channel(update, context, usernames):
+        started.append(usernames)
+        return bot.ConversationHandler.END
+
+    monkeypatch.setattr(bot, 'add_users_to_channel', add_users_to_channel)
+    update = SimpleNamespace(message=SimpleNamespace(text=text, reply_text=reply_text))
+    asyncio.run(bot.get_group_info(update, SimpleNamespace()))
+    return replies, started
+
+
+def test_group_info_skips_lines_without_a_name(monkeypatch):
+    _, started = run_get_group_info(monkeypatch, "@alice_smith\n@\n\n  bob_jones \n @ ")
+    assert started == [['alice_smith', 'bob_jones']]
+
+
+def test_group_info_with_only_at_signs_starts_nothing(monkeypatch):
+    replies, started = run_get_group_info(monkeypatch, "@\n @")
+    assert started == []
+    assert replies[-1].startswith("No valid usernames found")
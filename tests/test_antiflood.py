@@ -0,0 +1,96 @@
+"""Tests for antiflood.RingCounter and antiflood.FloodDetector."""
+from antiflood import BAN, RESTRICT, FloodDetector, RingCounter
+
+
+def test_ring_counter_fills_within_window():
+    counter = RingCounter(3)
+    assert not counter.hit(0, 10)
+    assert not counter.hit(1, 10)
+    assert counter.hit(2, 10)
+    # The oldest of the last three events is now at 1
+    assert counter.hit(11, 10)
+    assert not counter.hit(25, 10)
+
+
+def test_ring_counter_reset():
+    counter = RingCounter(2)
+    counter.hit(0, 10)
+    counter.reset()
+    assert not counter.hit(1, 10)
+    assert counter.hit(2, 10)
+
+
+def make_detector(clock, **kwargs) -> FloodDetector:
+    settings = dict(message_limit=3, message_window=10, chat_message_limit=100, join_limit=3, join_window=30,
+                    raid_duration=300, clock=clock)
+    settings.update(kwargs)
+    return FloodDetector(**settings)
+
+
+def test_flooding_user_is_acted_on_once(clock):
+    detector = make_detector(clock)
+    assert detector.on_message(-100, 1) is None
+    assert detector.on_message(-100, 1) is None
+    assert detector.on_message(-100, 1) == RESTRICT
+    # The counter starts over after an action
+    assert detector.on_message(-100, 1) is None
+    assert detector.stats()['floods_detected'] == 1
+
+
+def test_slow_messages_are_not_a_flood(clock):
+    detector = make_detector(clock)
+    for _ in range(10):
+        assert detector.on_message(-100, 1) is None
+        clock.advance(6)
+
+
+def test_users_and_chats_are_counted_separately(clock):
+    detector = make_detector(clock)
+    for user_id in (1, 2, 3):
+        assert detector.on_message(-100, user_id) is None
+        assert detector.on_message(-200, user_id) is None
+    assert detector.on_message(-100, 1) is None
+    assert detector.on_message(-100, 1) == RESTRICT
+
+
+def test_join_burst_starts_raid_mode(clock):
+    detector = make_detector(clock, raid_action=BAN)
+    assert detector.on_join(-100) is None
+    assert detector.on_join(-100) is None
+    assert detector.on_join(-100) == BAN
+    assert detector.in_raid(-100)
+    assert not detector.in_raid(-200)
+    # Everyone joining during raid mode is acted on
+    clock.advance(299)
+    assert detector.on_join(-100) == BAN
+    clock.advance(1)
+    assert not detector.in_raid(-100)
+    assert detector.on_join(-100) is None
+    assert detector.stats()['raids_detected'] == 1
+
+
+def test_joins_counted_at_once(clock):
+    detector = make_detector(clock, raid_action=RESTRICT)
+    assert detector.on_join(-100, count=3) == RESTRICT
+
+
+def test_chat_message_burst_starts_raid_mode(clock):
+    detector = make_detector(clock, chat_message_limit=5)
+    for user_id in range(4):
+        detector.on_message(-100, user_id)
+    assert not detector.in_raid(-100)
+    detector.on_message(-100, 4)
+    assert detector.in_raid(-100)
+
+
+def test_tracked_chats_and_users_are_bounded(clock):
+    detector = make_detector(clock, max_chats=2, max_users_per_chat=2)
+    detector.on_message(-100, 1)
+    detector.on_message(-100, 1)
+    for user_id in (2, 3):
+        detector.on_message(-100, user_id)
+    # User 1 was forgotten, so their earlier messages no longer count
+    assert detector.on_message(-100, 1) is None
+    detector.on_message(-200, 1)
+    detector.on_message(-300, 1)
+    assert detector.stats()['chats'] == 2
@@ -0,0 +1,215 @@
+"""Tests for the channel post approval flow in bot.py."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+
+import bot
+from add_jobs import AddJobStore
+from cache import ChannelRoster
+from pending_store import PendingPost, PendingPostStore
+
+ROSTER = ChannelRoster(-100, 'News', SimpleNamespace(id=7), {7: 'creator', 42: 'administrator'})
+
+
+class FakeBot:
+    """Records the Bot API calls made through it; ``fail[method]`` is raised by the next call of ``method``."""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = {}
+
+    def __getattr__(self, method):
+        async def call(**kwargs):
+            self.calls.append((method, kwargs))
+            if method in self.fail:
+                raise self.fail.pop(method)
+            return SimpleNamespace(message_id=1000 + len(self.calls))
+        return call
+
+    def called(self, method) -> list:
+        return [kwargs for name, kwargs in self.calls if name == method]
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    state = bot.BotState(
+        PendingPostStore(str(tmp_path / 'pending.sqlite3'), ttl=3600), AddJobStore(str(tmp_path / 'jobs.sqlite3'))
+    )
+    application = object()
+    monkeypatch.setitem(bot.BOTS, application, state)
+    fake_bot = FakeBot()
+    yield SimpleNamespace(
+        bot=fake_bot, context=SimpleNamespace(bot=fake_bot, application=application),
+        pending_posts=state.pending_posts, album_buffers=state.album_buffers
+    )
+    state.pending_posts.close()
+    state.add_jobs.close()
+
+
+def channel_message(message_id: int, text: str = None, caption: str = None, media_group_id: str = None, **media):
+    message = SimpleNamespace(
+        chat_id=-100, message_id=message_id, media_group_id=media_group_id, text=text, entities=(),
+        caption=caption, caption_entities=(), photo=(), video=None, animation=None, document=None, audio=None
+    )
+    message.__dict__.update(media)
+    return message
+
+
+def pending_text_post(env) -> PendingPost:
+    post = PendingPost(
+        '-100_1', -100, 1, 42, 'Ann', 'text', text='old', source_chat_id=7, source_message_ids=[501],
+        approval_message_id=502
+    )
+    env.pending_posts.add(post)
+    return post
+
+
+def pending_album(env) -> PendingPost:
+    post = PendingPost(
+        '-100_g1', -100, 1, 42, 'Ann', 'album', text='old caption', source_chat_id=7,
+        source_message_ids=[501, 502, 503], message_ids=[1, 2, 3], approval_message_id=504
+    )
+    env.pending_posts.add(post)
+    return post
+
+
+def test_edited_text_updates_preview_and_request(env):
+    pending_text_post(env)
+    assert asyncio.run(bot.apply_post_edit(env.context, ROSTER, channel_message(1, text='new')))
+
+    preview, request = env.bot.called('edit_message_text')
+    assert (preview['chat_id'], preview['message_id'], preview['text']) == (7, 501, 'new')
+    assert (request['chat_id'], request['message_id']) == (7, 502)
+    assert "edited" in request['text']
+    assert request['reply_markup'].inline_keyboard[0][0].callback_data == 'approve_-100_1'
+    assert env.pending_posts.get('-100_1').text == 'new'
+    # No second approval request
+    assert not env.bot.called('send_message')
+
+
+def test_unchanged_edit_still_counts(env):
+    pending_text_post(env)
+    env.bot.fail['edit_message_text'] = BadRequest("Message is not modified")
+    assert asyncio.run(bot.apply_post_edit(env.context, ROSTER, channel_message(1, text='new')))
+    assert env.pending_posts.get('-100_1').text == 'new'
+
+
+def test_edit_of_an_album_item_updates_its_own_preview(env):
+    pending_album(env)
+    edited = channel_message(2, caption='second', media_group_id='g1', photo=[SimpleNamespace(file_id='p2')])
+    assert asyncio.run(bot.apply_post_edit(env.context, ROSTER, edited))
+    _, preview = env.bot.calls[0]
+    assert (preview['chat_id'], preview['message_id']) == (7, 502)
+    # Only the first item's caption, or a new caption, describes the album
+    assert env.pending_posts.get('-100_g1').text == 'second'
+    assert env.bot.called('edit_message_text')[-1]['message_id'] == 504
+
+
+def test_edit_of_an_album_being_collected_replaces_the_buffered_item(env):
+    first, second = channel_message(1, caption='a', media_group_id='g1'), channel_message(2, media_group_id='g1')
+    env.album_buffers[(-100, 'g1')] = {'messages': [first, second], 'deadline': 0.0}
+    edited = channel_message(2, caption='b', media_group_id='g1')
+    assert asyncio.run(bot.apply_post_edit(env.context, ROSTER, edited))
+    assert env.album_buffers[(-100, 'g1')]['messages'] == [first, edited]
+    assert env.bot.calls == []
+
+
+def test_edit_of_a_post_that_is_not_pending(env):
+    assert not asyncio.run(bot.apply_post_edit(env.context, ROSTER, channel_message(9, text='new')))
+    assert env.bot.calls == []
+
+
+def pending_photo_post(env) -> PendingPost:
+    post = PendingPost(
+        '-100_1', -100, 1, 42, 'Ann', 'photo', text='old', source_chat_id=7, source_message_ids=[501],
+        approval_message_id=502
+    )
+    env.pending_posts.add(post)
+    return post
+
+
+def test_edited_media_replaces_the_preview_media(env):
+    pending_photo_post(env)
+    photo = [SimpleNamespace(file_id='small'), SimpleNamespace(file_id='large')]
+    assert asyncio.run(bot.apply_post_edit(env.context, ROSTER, channel_message(1, caption='new', photo=photo)))
+
+    [edit] = env.bot.called('edit_message_media')
+    assert (edit['chat_id'], edit['message_id']) == (7, 501)
+    assert isinstance(edit['media'], InputMediaPhoto)
+    assert edit['media'].media == 'large'
+    assert edit['media'].caption == 'new'
+    assert env.pending_posts.get('-100_1').text == 'new'
+
+
+def test_post_whose_preview_cant_be_updated_is_asked_for_again(env):
+    pending_photo_post(env)
+    env.bot.fail['edit_message_media'] = BadRequest("Message to edit not found")
+    photo = [SimpleNamespace(file_id='large')]
+    assert not asyncio.run(bot.apply_post_edit(env.context, ROSTER, channel_message(1, caption='new', photo=photo)))
+
+    # The stale preview and its request are gone, so the caller requests approval afresh
+    assert env.pending_posts.get('-100_1') is None
+    assert env.bot.called('delete_messages') == [{'chat_id': 7, 'message_ids': [501, 502]}]
+
+
+def test_post_without_replaceable_media_is_asked_for_again(env):
+    pending_photo_post(env)
+    voice = channel_message(1, caption='new', voice=SimpleNamespace(file_id='v'))
+    assert not asyncio.run(bot.apply_post_edit(env.context, ROSTER, voice))
+    assert env.pending_posts.get('-100_1') is None
+    assert not env.bot.called('edit_message_media')
+
+
+def test_album_whose_preview_cant_be_updated_warns_the_approver(env):
+    pending_album(env)
+    env.bot.fail['edit_message_media'] = BadRequest("Message to edit not found")
+    edited = channel_message(2, caption='second', media_group_id='g1', photo=[SimpleNamespace(file_id='p2')])
+    assert asyncio.run(bot.apply_post_edit(env.context, ROSTER, edited))
+
+    [request] = env.bot.called('edit_message_text')
+    assert request['message_id'] == 504
+    assert "⚠️" in request['text'] and "item 2" in request['text']
+    # The album stays pending with the content its preview still shows
+    assert env.pending_posts.get('-100_g1').text == 'old caption'
+
+
+def approved_post(post_id: str, chat_id: int, *message_ids) -> PendingPost:
+    return PendingPost(
+        post_id, chat_id, message_ids[0], 42, 'Ann', 'text', source_chat_id=7, source_message_ids=list(message_ids)
+    )
+
+
+def test_publish_in_order_copies_in_batches_of_100(env):
+    posts = [approved_post(f'p{number}', -100, *range(number * 30, number * 30 + 30)) for number in range(5)]
+    posts.append(approved_post('single', -200, 900))
+    published, error = asyncio.run(bot.publish_in_order(env.context, posts))
+    assert published == posts
+    assert error is None
+
+    copies = env.bot.called('copy_messages')
+    # Posts are never split across calls, so the first call takes three posts (90 messages)
+    assert [len(call['message_ids']) for call in copies] == [90, 60]
+    assert [message_id for call in copies for message_id in call['message_ids']] == list(range(150))
+    assert all((call['chat_id'], call['from_chat_id']) == (-100, 7) for call in copies)
+    assert env.bot.called('copy_message') == [{'chat_id': -200, 'from_chat_id': 7, 'message_id': 900}]
+
+
+def test_publish_in_order_stops_at_the_first_error(env):
+    posts = [approved_post(f'p{number}', -100, *range(number * 60, number * 60 + 60)) for number in range(3)]
+
+    calls = 0
+
+    async def copy_messages(**kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise BadRequest("Message to copy not found")
+
+    env.bot.copy_messages = copy_messages
+    published, error = asyncio.run(bot.publish_in_order(env.context, posts))
+    assert published == posts[:1]
+    assert isinstance(error, BadRequest)
+    assert calls == 2
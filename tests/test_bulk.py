@@ -0,0 +1,130 @@
+"""Tests for bulk target parsing and execution."""
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import BadRequest, NetworkError
+
+import bot
+from bulk import parse_targets, resolve_targets, run_bulk
+from resolver import UsernameCache
+
+
+def test_parse_targets_splits_and_deduplicates():
+    targets, invalid = parse_targets("123, @Alice_Smith\nbob_jones;456 123\n@alice_smith  ,, ")
+    assert targets == [123, 'Alice_Smith', 'bob_jones', 456]
+    assert invalid == []
+
+
+def test_parse_targets_reports_invalid_tokens():
+    targets, invalid = parse_targets("12ab @abc -5 valid_name @")
+    assert targets == ['valid_name']
+    # Usernames need 5 to 32 characters and can't start with a digit
+    assert invalid == ['12ab', 'abc', '-5']
+
+
+def test_parse_targets_of_empty_text():
+    assert parse_targets("") == ([], [])
+    assert parse_targets(" \n, ") == ([], [])
+
+
+class FakeBot:
+    def __init__(self, users: dict):
+        self.users = users
+        self.lookups = []
+
+    async def get_chat(self, username):
+        self.lookups.append(username)
+        if username == 'flaky_user':
+            raise NetworkError("connection reset")
+        if username not in self.users:
+            raise BadRequest("Chat not found")
+        return SimpleNamespace(id=self.users[username])
+
+
+def test_resolve_targets_uses_and_fills_the_cache(tmp_path, clock):
+    cache = UsernameCache(str(tmp_path / 'usernames.sqlite3'), positive_ttl=3600, negative_ttl=60, clock=clock)
+    cache.set('cached_user', 7)
+    bot = FakeBot({'alice_smith': 1})
+    targets = [5, 'cached_user', 'alice_smith', 'ghost_user', 'flaky_user']
+
+    resolved = asyncio.run(resolve_targets(bot, targets, cache))
+    assert resolved[5] == 5
+    assert resolved['cached_user'] == 7
+    assert resolved['alice_smith'] == 1
+    assert isinstance(resolved['ghost_user'], BadRequest)
+    assert isinstance(resolved['flaky_user'], NetworkError)
+    assert sorted(bot.lookups) == ['alice_smith', 'flaky_user', 'ghost_user']
+    # Only usernames Telegram says don't exist are remembered as missing
+    assert cache.get_many(['alice_smith', 'ghost_user', 'flaky_user']) == {'alice_smith': 1, 'ghost_user': None}
+
+    bot.lookups.clear()
+    resolved = asyncio.run(resolve_targets(bot, ['ghost_user'], cache))
+    assert isinstance(resolved['ghost_user'], BadRequest)
+    assert bot.lookups == []
+    cache.close()
+
+
+def test_run_bulk_counts_failures_and_limits_concurrency():
+    running = 0
+    most = 0
+    progress = []
+
+    async def action(target):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        if target % 3 == 0:
+            raise BadRequest("Not enough rights")
+
+    async def on_progress(report):
+        progress.append(report.processed)
+
+    report = asyncio.run(run_bulk(list(range(1, 11)), action, concurrency=4, on_progress=on_progress))
+    assert report.total == 10
+    assert report.processed == 10
+    assert report.succeeded == 7
+    assert sorted(target for target, _ in report.failures) == [3, 6, 9]
+    assert report.failures[0][1] == "Not enough rights"
+    assert most == 4
+    assert progress == list(range(1, 11))
+    assert report.finished_at is not None
+
+
+class FileBot:
+    """Serves one document's contents through get_file."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.file_ids = []
+
+    async def get_file(self, file_id):
+        self.file_ids.append(file_id)
+
+        async def download_as_bytearray():
+            return bytearray(self.data)
+
+        return SimpleNamespace(download_as_bytearray=download_as_bytearray)
+
+
+def command_update(reply=None):
+    return SimpleNamespace(message=SimpleNamespace(reply_to_message=reply))
+
+
+def test_read_bulk_targets_adds_the_replied_to_file():
+    fake_bot = FileBot(b'@alice_smith\n456\n')
+    reply = SimpleNamespace(document=SimpleNamespace(file_id='list', file_size=18))
+    context = SimpleNamespace(args=['123'], bot=fake_bot)
+    text = asyncio.run(bot.read_bulk_targets(command_update(reply), context))
+    assert parse_targets(text) == ([123, 'alice_smith', 456], [])
+    assert fake_bot.file_ids == ['list']
+
+
+def test_read_bulk_targets_without_a_file():
+    fake_bot = FileBot(b'')
+    context = SimpleNamespace(args=['123', '@bob_jones'], bot=fake_bot)
+    text = asyncio.run(bot.read_bulk_targets(command_update(SimpleNamespace(document=None)), context))
+    assert parse_targets(text) == ([123, 'bob_jones'], [])
+    assert asyncio.run(bot.read_bulk_targets(command_update(), context)) == '123 @bob_jones'
+    assert fake_bot.file_ids == []
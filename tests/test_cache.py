@@ -0,0 +1,106 @@
+"""Tests for cache.TTLCache and cache.ChannelRoster."""
+from cache import ChannelRoster, TTLCache
+
+
+def test_get_returns_stored_value(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert 'a' in cache
+    assert cache.get('b', 'missing') == 'missing'
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=120)
+    clock.advance(59)
+    assert cache.get('a') == 1
+    clock.advance(1)
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    # The expired entry was dropped when it was read
+    assert len(cache) == 1
+    assert cache.keys() == ['b']
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # Reading 'a' makes 'b' the least recently used entry
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.evictions == 1
+
+
+def test_zero_maxsize_stores_nothing(clock):
+    cache = TTLCache(maxsize=0, ttl=60, clock=clock)
+    cache.set('a', 1)
+    assert len(cache) == 0
+
+
+def test_stats_count_hits_and_misses(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    clock.advance(60)
+    cache.get('a')
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['hit_rate'] == 0.5
+    assert stats['size'] == 0
+
+
+def test_invalidate(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set((1, 10), 'x')
+    cache.set((1, 11), 'y')
+    cache.set((2, 10), 'z')
+    assert cache.invalidate((2, 10)) is True
+    assert cache.invalidate((2, 10)) is False
+    assert cache.invalidate_where(lambda key: key[0] == 1) == 2
+    assert len(cache) == 0
+
+
+def test_clear_keeps_the_counters(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()['hits'] == 1
+
+
+def test_keys_skip_expired_entries(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1, ttl=10)
+    cache.set('b', 2)
+    clock.advance(10)
+    assert cache.keys() == ['b']
+    # Listing keys doesn't count as a lookup
+    assert cache.stats()['misses'] == 0
+
+
+def test_entries_report_the_time_left(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=10)
+    clock.advance(5)
+    assert cache.entries() == [('a', 1, 55), ('b', 2, 5)]
+    clock.advance(5)
+    assert cache.entries() == [('a', 1, 50)]
+
+
+def test_roster_status_of():
+    roster = ChannelRoster(-100, 'News', creator=None, admins={1: 'creator', 2: 'administrator'})
+    assert roster.status_of(1) == 'creator'
+    assert roster.status_of(2) == 'administrator'
+    assert roster.status_of(3) is None
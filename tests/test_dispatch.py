@@ -0,0 +1,134 @@
+"""Tests for dispatch.KeyedUpdateProcessor."""
+import asyncio
+import random
+from types import SimpleNamespace
+
+from dispatch import KeyedUpdateProcessor
+
+
+def update_in(chat_id=None, user_id=None):
+    chat = SimpleNamespace(id=chat_id) if chat_id is not None else None
+    user = SimpleNamespace(id=user_id) if user_id is not None else None
+    return SimpleNamespace(effective_chat=chat, effective_user=user)
+
+
+def test_key_for():
+    assert KeyedUpdateProcessor.key_for(update_in(chat_id=-100, user_id=5)) == ('chat', -100)
+    assert KeyedUpdateProcessor.key_for(update_in(user_id=5)) == ('user', 5)
+    assert KeyedUpdateProcessor.key_for(update_in()) is None
+    assert KeyedUpdateProcessor.key_for(object()) is None
+
+
+def test_updates_of_a_chat_run_in_order_one_at_a_time():
+    async def main():
+        processor = KeyedUpdateProcessor(8)
+        handled = {chat_id: [] for chat_id in range(4)}
+        running = set()
+        rng = random.Random(1)
+
+        async def handle(chat_id, number):
+            assert chat_id not in running
+            running.add(chat_id)
+            await asyncio.sleep(rng.random() / 1000)
+            running.remove(chat_id)
+            handled[chat_id].append(number)
+
+        updates = [(rng.randrange(4), number) for number in range(200)]
+        await asyncio.gather(*(
+            processor.process_update(update_in(chat_id), handle(chat_id, number))
+            for chat_id, number in updates
+        ))
+        for chat_id, numbers in handled.items():
+            assert numbers == [number for other, number in updates if other == chat_id]
+        assert processor.active_keys == 0
+
+    asyncio.run(main())
+
+
+def test_at_most_max_concurrent_updates_run_at_once():
+    async def main():
+        processor = KeyedUpdateProcessor(3)
+        running = 0
+        most = 0
+
+        async def handle():
+            nonlocal running, most
+            running += 1
+            most = max(most, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(update_in(chat_id), handle()) for chat_id in range(20)))
+        assert most == 3
+
+    asyncio.run(main())
+
+
+def test_busy_chat_does_not_stall_other_chats():
+    async def main():
+        processor = KeyedUpdateProcessor(2)
+        release = asyncio.Event()
+        handled = []
+
+        async def busy(number):
+            await release.wait()
+            handled.append(('busy', number))
+
+        async def quiet():
+            handled.append(('quiet', 0))
+
+        busy_tasks = [
+            asyncio.create_task(processor.process_update(update_in(1), busy(number))) for number in range(5)
+        ]
+        await asyncio.sleep(0)
+        # The busy chat's waiting updates hold no slot, so the other chat gets the second one
+        await asyncio.wait_for(processor.process_update(update_in(2), quiet()), 1)
+        assert handled == [('quiet', 0)]
+        release.set()
+        await asyncio.gather(*busy_tasks)
+        assert handled[1:] == [('busy', number) for number in range(5)]
+
+    asyncio.run(main())
+
+
+def test_updates_without_a_chat_or_user_run_unordered():
+    async def main():
+        processor = KeyedUpdateProcessor(2)
+        release = asyncio.Event()
+        started = []
+
+        async def handle(number):
+            started.append(number)
+            await release.wait()
+
+        tasks = [asyncio.create_task(processor.process_update(update_in(), handle(number))) for number in range(2)]
+        await asyncio.sleep(0.01)
+        assert started == [0, 1]
+        assert processor.active_keys == 0
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+
+def test_failing_handler_releases_its_chat():
+    async def main():
+        processor = KeyedUpdateProcessor(1)
+        handled = []
+
+        async def fail():
+            raise RuntimeError('boom')
+
+        async def handle():
+            handled.append(True)
+
+        results = await asyncio.gather(
+            processor.process_update(update_in(1), fail()),
+            processor.process_update(update_in(1), handle()),
+            return_exceptions=True
+        )
+        assert isinstance(results[0], RuntimeError)
+        assert handled == [True]
+        assert processor.active_keys == 0
+
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""Tests for streaming uploaded username lists."""
+import asyncio
+
+import httpx
+import pytest
+
+from ingest import IngestStats, iter_chunks, iter_lines, iter_usernames
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def collect(items) -> list:
+    return [item async for item in items]
+
+
+def read_lines(data: bytes, size: int = 3, max_bytes: int = 1 << 20) -> tuple:
+    stats = IngestStats()
+    lines = asyncio.run(collect(iter_lines(chunked(data, size), max_bytes, stats)))
+    return lines, stats
+
+
+def read_usernames(text: str, csv_format: bool = False) -> tuple:
+    stats = IngestStats()
+    lines = iter_lines(chunked(text.encode(), 7), 1 << 20, stats)
+    return asyncio.run(collect(iter_usernames(lines, csv_format, stats))), stats
+
+
+def test_lines_are_split_across_chunks():
+    lines, stats = read_lines(b'first\r\nsecond\nthird')
+    assert lines == ['first', 'second', 'third']
+    assert not stats.truncated
+
+
+def test_multibyte_characters_split_across_chunks():
+    data = '﻿José\nüber\n'.encode()
+    for size in range(1, 6):
+        assert read_lines(data, size)[0] == ['José', 'über']
+
+
+def test_reading_stops_at_max_bytes():
+    lines, stats = read_lines(b'alpha\nbravo\ncharlie\n', max_bytes=14)
+    # The line cut off by the limit is dropped
+    assert lines == ['alpha', 'bravo']
+    assert stats.truncated
+
+
+def test_text_usernames():
+    usernames, stats = read_usernames("@alice_smith, bob_jones\n\nAlice_Smith;carol_king  x!\n@@dave_miller")
+    assert usernames == ['alice_smith', 'bob_jones', 'carol_king', 'dave_miller']
+    assert stats.lines == 4
+    assert stats.accepted == 4
+    assert stats.duplicates == 1
+    assert stats.invalid == 1
+    assert stats.invalid_samples == ['x!']
+
+
+def test_csv_usernames_from_the_username_column():
+    text = 'id,Username,name\n1,@alice_smith,Alice\n2,bob_jones,"Jones, Bob"\n3\n'
+    usernames, stats = read_usernames(text, csv_format=True)
+    assert usernames == ['alice_smith', 'bob_jones']
+    assert stats.accepted == 2
+
+
+def test_csv_usernames_from_the_first_column_without_header():
+    usernames, _ = read_usernames("alice_smith,Alice\nbob_jones,Bob\n", csv_format=True)
+    assert usernames == ['alice_smith', 'bob_jones']
+
+
+def test_lone_at_signs_are_skipped():
+    usernames, stats = read_usernames("@\n @ \n@alice_smith @\n")
+    assert usernames == ['alice_smith']
+    assert stats.invalid == 0
+    usernames, stats = read_usernames("username\n@\n@bob_jones\n", csv_format=True)
+    assert usernames == ['bob_jones']
+    assert stats.invalid == 0
+
+
+def test_invalid_samples_are_capped():
+    _, stats = read_usernames(" ".join(f"bad{number}!" for number in range(20)))
+    assert stats.invalid == 20
+    assert len(stats.invalid_samples) == 10
+
+
+def test_local_file_chunks(tmp_path):
+    path = tmp_path / 'users.txt'
+    path.write_bytes(b'x' * 10)
+    assert asyncio.run(collect(iter_chunks(str(path), None, chunk_size=4))) == [b'xxxx', b'xxxx', b'xx']
+
+
+def test_url_chunks_are_streamed_with_the_given_client():
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        return httpx.Response(200, content=b'alice_smith\nbob_jones\n')
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return b''.join(await collect(iter_chunks('https://api.telegram.org/file/botX/users.txt', client)))
+
+    assert asyncio.run(main()) == b'alice_smith\nbob_jones\n'
+    assert requested == ['https://api.telegram.org/file/botX/users.txt']
+
+
+def test_failed_download_raises():
+    async def main():
+        transport = httpx.MockTransport(lambda request: httpx.Response(404))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await collect(iter_chunks('https://api.telegram.org/file/botX/users.txt', client))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main())
@@ -0,0 +1,58 @@
+"""Tests for logqueue.RepeatFilter."""
+import logging
+
+from logqueue import RepeatFilter
+
+
+def record(msg='Error getting user %s: %s', args=('alice', 'boom'), level=logging.ERROR, name='bot'):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_repeats_over_the_limit_are_dropped(clock):
+    repeat_filter = RepeatFilter(limit=3, window=60, clock=clock)
+    # Different arguments still count as the same message
+    passed = [repeat_filter.filter(record(args=(str(number), 'boom'))) for number in range(5)]
+    assert passed == [True, True, True, False, False]
+    assert repeat_filter.suppressed == 2
+
+
+def test_next_window_reports_the_dropped_count(clock):
+    repeat_filter = RepeatFilter(limit=1, window=60, clock=clock)
+    first = record()
+    assert repeat_filter.filter(first)
+    assert first.suppressed == 0
+    assert not repeat_filter.filter(record())
+    assert not repeat_filter.filter(record())
+    clock.advance(60)
+    later = record()
+    assert repeat_filter.filter(later)
+    assert later.suppressed == 2
+
+
+def test_messages_are_counted_separately(clock):
+    repeat_filter = RepeatFilter(limit=1, window=60, clock=clock)
+    assert repeat_filter.filter(record())
+    assert repeat_filter.filter(record(msg='Error adding user %s to channel: %s'))
+    assert repeat_filter.filter(record(level=logging.WARNING))
+    assert repeat_filter.filter(record(name='add_pipeline'))
+    assert not repeat_filter.filter(record())
+
+
+def test_records_below_min_level_always_pass(clock):
+    repeat_filter = RepeatFilter(limit=1, window=60, clock=clock)
+    assert all(repeat_filter.filter(record(level=logging.INFO)) for _ in range(10))
+    assert repeat_filter.suppressed == 0
+
+
+def test_zero_limit_turns_the_filter_off(clock):
+    repeat_filter = RepeatFilter(limit=0, window=60, clock=clock)
+    assert all(repeat_filter.filter(record()) for _ in range(10))
+
+
+def test_tracked_messages_are_bounded(clock):
+    repeat_filter = RepeatFilter(limit=1, window=60, max_keys=2, clock=clock)
+    for msg in ('first', 'second', 'third'):
+        assert repeat_filter.filter(record(msg=msg, args=()))
+    # 'first' was forgotten, so it passes again; 'third' is still tracked
+    assert repeat_filter.filter(record(msg='first', args=()))
+    assert not repeat_filter.filter(record(msg='third', args=()))
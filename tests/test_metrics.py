@@ -0,0 +1,20 @@
+"""Tests for the metrics endpoint."""
+import urllib.request
+
+from prometheus_client import CollectorRegistry, Counter
+
+from metrics import MetricsServer
+
+
+def test_server_serves_the_registry():
+    registry = CollectorRegistry()
+    Counter('test_events', "Events seen by the test.", registry=registry).inc(3)
+    server = MetricsServer(registry, '127.0.0.1', 0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert response.status == 200
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert 'test_events_total 3.0' in response.read().decode()
+    finally:
+        server.stop()
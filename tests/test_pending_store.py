@@ -0,0 +1,185 @@
+"""Tests for pending_store.PendingPostStore."""
+import pytest
+
+from pending_store import PendingPost, PendingPostStore
+
+
+def make_post(post_id: str, created_at: float) -> PendingPost:
+    return PendingPost(
+        post_id, -100, 1, 42, 'admin', 'text', text='hello', created_at=created_at,
+        source_chat_id=7, source_message_ids=[5]
+    )
+
+
+def test_posts_survive_a_reopen(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    store = PendingPostStore(path, ttl=3600, clock=clock)
+    store.add(make_post('a', clock()))
+    store.close()
+
+    store = PendingPostStore(path, ttl=3600, clock=clock)
+    post = store.get('a')
+    assert post.text == 'hello'
+    assert post.admin_id == 42
+    assert post.created_at == clock()
+    assert post.source_chat_id == 7
+    assert post.source_message_ids == [5]
+    store.close()
+
+
+def test_removed_posts_stay_removed_after_a_reopen(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    store = PendingPostStore(path, ttl=3600, clock=clock)
+    store.add(make_post('a', clock()))
+    store.add(make_post('b', clock()))
+    assert store.flush() == 2
+    assert store.pop('a').post_id == 'a'
+    assert store.pop('a') is None
+    store.close()
+
+    store = PendingPostStore(path, ttl=3600, clock=clock)
+    assert 'a' not in store
+    assert 'b' in store
+    store.close()
+
+
+def test_get_hides_expired_posts(tmp_path, clock):
+    store = PendingPostStore(str(tmp_path / 'pending.sqlite3'), ttl=3600, clock=clock)
+    store.add(make_post('a', clock()))
+    clock.advance(3599)
+    assert 'a' in store
+    clock.advance(1)
+    assert store.get('a') is None
+    assert len(store) == 0
+    store.close()
+
+
+def test_expire_drops_only_posts_that_are_due(tmp_path, clock):
+    store = PendingPostStore(str(tmp_path / 'pending.sqlite3'), ttl=3600, clock=clock)
+    store.add(make_post('old', clock()))
+    clock.advance(1800)
+    store.add(make_post('new', clock()))
+    clock.advance(1800)
+    assert store.expire() == 1
+    assert store.get('old') is None
+    assert store.get('new') is not None
+    assert store.expire() == 0
+    store.close()
+
+
+def test_replaced_post_expires_from_its_new_creation_time(tmp_path, clock):
+    store = PendingPostStore(str(tmp_path / 'pending.sqlite3'), ttl=3600, clock=clock)
+    store.add(make_post('a', clock()))
+    clock.advance(1800)
+    store.add(make_post('a', clock()))
+    clock.advance(1800)
+    assert store.expire() == 0
+    assert 'a' in store
+    store.close()
+
+
+def test_expired_rows_are_not_loaded(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    store = PendingPostStore(path, ttl=3600, clock=clock)
+    store.add(make_post('a', clock()))
+    store.close()
+
+    clock.advance(3600)
+    store = PendingPostStore(path, ttl=3600, clock=clock)
+    assert len(store) == 0
+    store.close()
+
+
+def test_shared_stores_see_each_others_posts(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    first = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    second = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    first.add(make_post('a', clock()))
+    assert second.get('a').text == 'hello'
+    first.close()
+    second.close()
+
+
+def test_shared_pop_is_claimed_by_one_store(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    first = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    second = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    first.add(make_post('a', clock()))
+    # Both processes have the post loaded when the approver taps twice
+    assert first.get('a') is not None
+    assert second.get('a') is not None
+    assert second.pop('a').post_id == 'a'
+    assert first.pop('a') is None
+    assert second.pop('a') is None
+    first.close()
+    second.close()
+
+
+def test_shared_expire_drops_rows_other_stores_added(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    first = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    second = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    first.add(make_post('a', clock()))
+    clock.advance(3600)
+    second.expire()
+    # Even with the post still valid by its own clock, the first store can't claim the deleted row
+    clock.advance(-1)
+    assert first.pop('a') is None
+    first.close()
+    second.close()
+
+
+def test_shared_get_sees_other_stores_changes(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    first = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    second = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    first.add(make_post('a', clock()))
+    assert second.get('a').text == 'hello'
+    edited = make_post('a', clock())
+    edited.text = 'edited'
+    first.add(edited)
+    assert second.get('a').text == 'edited'
+    # Approved through the first store: the second one no longer offers it
+    assert first.pop('a') is not None
+    assert second.get('a') is None
+    assert 'a' not in second
+    assert second.pop('a') is None
+    first.close()
+    second.close()
+
+
+def make_channel_post(post_id: str, created_at: float, chat_id: int = -100, approver_id: int = 7) -> PendingPost:
+    post = make_post(post_id, created_at)
+    post.chat_id = chat_id
+    post.source_chat_id = approver_id
+    return post
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_posts_by_channel(tmp_path, clock, shared):
+    store = PendingPostStore(str(tmp_path / 'pending.sqlite3'), ttl=3600, clock=clock, shared=shared)
+    store.add(make_channel_post('b', clock() + 1))
+    store.add(make_channel_post('a', clock()))
+    store.add(make_channel_post('c', clock(), chat_id=-200))
+    store.add(make_channel_post('d', clock(), approver_id=8))
+    assert store.channels(7) == {-100: 2, -200: 1}
+    assert store.channels(8) == {-100: 1}
+    assert [post.post_id for post in store.for_channel(7, -100)] == ['a', 'b']
+    assert store.pop('a').post_id == 'a'
+    assert store.channels(7) == {-100: 1, -200: 1}
+    # 'b' was added a second after 'c'
+    clock.advance(3600)
+    assert store.channels(7) == {-100: 1}
+    assert store.for_channel(7, -200) == []
+    store.close()
+
+
+def test_other_stores_see_a_channels_posts(tmp_path, clock):
+    path = str(tmp_path / 'pending.sqlite3')
+    first = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    second = PendingPostStore(path, ttl=3600, clock=clock, shared=True)
+    first.add(make_channel_post('a', clock()))
+    assert second.channels(7) == {-100: 1}
+    assert [post.post_id for post in second.for_channel(7, -100)] == ['a']
+    first.close()
+    second.close()
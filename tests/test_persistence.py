@@ -0,0 +1,94 @@
+"""Tests for persistence.SQLitePersistence."""
+import asyncio
+
+from persistence import SQLitePersistence
+
+
+def test_user_data_is_loaded_per_user(tmp_path):
+    async def main():
+        path = str(tmp_path / 'state.sqlite3')
+        persistence = SQLitePersistence(path)
+        await persistence.refresh_user_data(1, {})
+        await persistence.update_user_data(1, {'channel': '@news', 'step': 2})
+        assert persistence.write() == 1
+        await persistence.flush()
+
+        persistence = SQLitePersistence(path)
+        assert await persistence.get_user_data() == {}
+        user_data = {'step': 3}
+        await persistence.refresh_user_data(1, user_data)
+        # What was set before the row was read wins
+        assert user_data == {'channel': '@news', 'step': 3}
+        # The row is only read the first time
+        user_data.clear()
+        await persistence.refresh_user_data(1, user_data)
+        assert user_data == {}
+        await persistence.flush()
+
+    asyncio.run(main())
+
+
+def test_unread_user_with_empty_data_keeps_the_stored_row(tmp_path):
+    async def main():
+        path = str(tmp_path / 'state.sqlite3')
+        persistence = SQLitePersistence(path)
+        await persistence.update_user_data(1, {'step': 2})
+        await persistence.flush()
+
+        persistence = SQLitePersistence(path)
+        await persistence.update_user_data(1, {})
+        assert persistence.write() == 0
+        user_data = {}
+        await persistence.refresh_user_data(1, user_data)
+        assert user_data == {'step': 2}
+        await persistence.flush()
+
+    asyncio.run(main())
+
+
+def test_emptied_or_dropped_user_data_is_deleted(tmp_path):
+    async def main():
+        path = str(tmp_path / 'state.sqlite3')
+        persistence = SQLitePersistence(path)
+        await persistence.update_user_data(1, {'step': 2})
+        await persistence.update_user_data(2, {'step': 5})
+        persistence.write()
+        await persistence.update_user_data(1, {})
+        await persistence.drop_user_data(2)
+        assert persistence.write() == 2
+        await persistence.flush()
+
+        persistence = SQLitePersistence(path)
+        for user_id in (1, 2):
+            user_data = {}
+            await persistence.refresh_user_data(user_id, user_data)
+            assert user_data == {}
+        await persistence.flush()
+
+    asyncio.run(main())
+
+
+def test_conversations_survive_a_restart(tmp_path):
+    async def main():
+        path = str(tmp_path / 'state.sqlite3')
+        persistence = SQLitePersistence(path)
+        await persistence.update_conversation('add', (10, 1), 1)
+        await persistence.update_conversation('add', (10, 2), 2)
+        await persistence.update_conversation('addgroup', (10, 1), 0)
+        persistence.write()
+        # None ends a conversation
+        await persistence.update_conversation('add', (10, 2), None)
+        await persistence.flush()
+
+        persistence = SQLitePersistence(path)
+        assert await persistence.get_conversations('add') == {(10, 1): 1}
+        assert await persistence.get_conversations('addgroup') == {(10, 1): 0}
+        assert await persistence.get_conversations('other') == {}
+        await persistence.flush()
+
+    asyncio.run(main())
+
+
+def test_write_without_changes():
+    persistence = SQLitePersistence(':memory:')
+    assert persistence.write() == 0
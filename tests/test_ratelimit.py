@@ -0,0 +1,149 @@
+"""Tests for ratelimit.TokenBucket and ratelimit.PriorityRateLimiter."""
+import asyncio
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+
+from ratelimit import Priority, PriorityRateLimiter, TokenBucket, api_priority
+
+
+def test_tokens_are_handed_out_immediately_while_available(clock):
+    async def main():
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+        await bucket.acquire()
+        await bucket.acquire()
+        assert bucket.tokens == 0
+        assert not bucket.idle
+        clock.advance(1)
+        assert bucket.tokens == 0
+        assert not bucket.idle
+        clock.advance(1)
+        assert bucket.idle
+
+    asyncio.run(main())
+
+
+def test_refill_stops_at_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=3, clock=clock)
+    clock.advance(60)
+    assert bucket.idle
+    assert bucket.tokens == 3
+
+
+def test_waiters_are_served_by_priority():
+    async def main():
+        bucket = TokenBucket(rate=100, capacity=1)
+        await bucket.acquire()
+        served = []
+
+        async def waiter(priority):
+            await bucket.acquire(priority)
+            served.append(priority)
+
+        priorities = [Priority.BACKGROUND, Priority.NOTIFICATION, Priority.MODERATION,
+                      Priority.PUBLISHING, Priority.MODERATION]
+        tasks = [asyncio.create_task(waiter(priority)) for priority in priorities]
+        await asyncio.sleep(0)
+        assert bucket.waiting == len(priorities)
+        await asyncio.gather(*tasks)
+        assert served == sorted(priorities)
+
+    asyncio.run(main())
+
+
+def test_pause_delays_every_waiter():
+    async def main():
+        loop = asyncio.get_running_loop()
+        bucket = TokenBucket(rate=1000, capacity=5)
+        bucket.pause(0.05)
+        started = loop.time()
+        await bucket.acquire(Priority.MODERATION)
+        assert loop.time() - started >= 0.04
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_use_a_token():
+    async def main():
+        bucket = TokenBucket(rate=10, capacity=1)
+        await bucket.acquire()
+        cancelled = asyncio.create_task(bucket.acquire(Priority.MODERATION))
+        waiting = asyncio.create_task(bucket.acquire(Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        # Served with the first token, which the cancelled call would otherwise have taken
+        await asyncio.wait_for(waiting, 0.15)
+
+    asyncio.run(main())
+
+
+def test_limiter_picks_the_priority_of_each_call():
+    async def main():
+        limiter = PriorityRateLimiter()
+        limiter.global_bucket = TokenBucket(rate=100, capacity=1)
+        await limiter.global_bucket.acquire()
+        served = []
+
+        async def call(name):
+            served.append(name)
+
+        tasks = [asyncio.create_task(limiter.process_request(
+            call, ('background',), {}, 'getMe', {}, Priority.BACKGROUND
+        ))]
+        with api_priority(Priority.PUBLISHING):
+            tasks.append(asyncio.create_task(limiter.process_request(call, ('publishing',), {}, 'getMe', {}, None)))
+        tasks.append(asyncio.create_task(limiter.process_request(call, ('notification',), {}, 'getMe', {}, None)))
+        tasks.append(asyncio.create_task(
+            limiter.process_request(call, ('moderation',), {}, 'banChatMember', {}, None)
+        ))
+        await asyncio.gather(*tasks)
+        assert served == ['moderation', 'publishing', 'notification', 'background']
+
+    asyncio.run(main())
+
+
+def test_limiter_only_keeps_chat_buckets_for_message_calls():
+    async def main():
+        limiter = PriorityRateLimiter()
+
+        async def call():
+            return True
+
+        await limiter.process_request(call, (), {}, 'getChatMember', {'chat_id': -100, 'user_id': 1}, None)
+        assert limiter.stats()['chat_buckets'] == 0
+        await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': '-100', 'text': 'hi'}, None)
+        await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': -100, 'text': 'hi'}, None)
+        await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': 5, 'text': 'hi'}, None)
+        assert limiter.stats()['chat_buckets'] == 2
+
+    asyncio.run(main())
+
+
+@pytest.mark.filterwarnings('ignore::telegram.warnings.PTBDeprecationWarning')
+def test_limiter_retries_after_retry_after():
+    async def main():
+        limiter = PriorityRateLimiter(private_rate=100, max_retries=2)
+        attempts = []
+
+        async def call():
+            attempts.append(None)
+            if len(attempts) < 3:
+                raise RetryAfter(timedelta(seconds=0))
+            return 'sent'
+
+        assert await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': 5}, None) == 'sent'
+        assert len(attempts) == 3
+        assert limiter.retry_after_count == 2
+
+        attempts.clear()
+
+        async def flooded():
+            attempts.append(None)
+            raise RetryAfter(timedelta(seconds=0))
+
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(flooded, (), {}, 'sendMessage', {'chat_id': 6}, None)
+        assert len(attempts) == 3
+
+    asyncio.run(main())
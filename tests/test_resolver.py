@@ -0,0 +1,70 @@
+"""Tests for resolver.UsernameCache."""
+from resolver import UsernameCache
+
+
+def open_cache(tmp_path, clock) -> UsernameCache:
+    return UsernameCache(str(tmp_path / 'usernames.sqlite3'), positive_ttl=3600, negative_ttl=60, clock=clock)
+
+
+def test_lookups_ignore_case_and_at_sign(tmp_path, clock):
+    cache = open_cache(tmp_path, clock)
+    cache.set('@Alice_Smith', 1)
+    assert cache.get('alice_smith') == 1
+    # Results are keyed by the username as asked for
+    assert cache.get_many(['@ALICE_SMITH', 'bob_jones']) == {'@ALICE_SMITH': 1}
+    cache.close()
+
+
+def test_missing_usernames_are_cached_as_none(tmp_path, clock):
+    cache = open_cache(tmp_path, clock)
+    cache.set_missing('ghost_user')
+    assert cache.get_many(['ghost_user']) == {'ghost_user': None}
+    assert cache.get('ghost_user', 'unknown') is None
+    assert cache.get('other_user', 'unknown') == 'unknown'
+    cache.close()
+
+
+def test_positive_and_negative_ttls(tmp_path, clock):
+    cache = open_cache(tmp_path, clock)
+    cache.set('alice_smith', 1)
+    cache.set_missing('ghost_user')
+    cache.flush()
+    clock.advance(60)
+    assert cache.get_many(['alice_smith', 'ghost_user']) == {'alice_smith': 1}
+    clock.advance(3540)
+    assert cache.get_many(['alice_smith', 'ghost_user']) == {}
+    cache.close()
+
+
+def test_buffered_entries_expire_too(tmp_path, clock):
+    cache = open_cache(tmp_path, clock)
+    cache.set_missing('ghost_user')
+    clock.advance(60)
+    assert cache.get_many(['ghost_user']) == {}
+    cache.close()
+
+
+def test_resolutions_survive_a_reopen(tmp_path, clock):
+    cache = open_cache(tmp_path, clock)
+    cache.set('alice_smith', 1)
+    cache.set_missing('ghost_user')
+    assert cache.stats()['buffered'] == 2
+    cache.close()
+
+    cache = open_cache(tmp_path, clock)
+    assert cache.get_many(['alice_smith', 'ghost_user']) == {'alice_smith': 1, 'ghost_user': None}
+    cache.close()
+
+
+def test_lookups_of_many_usernames_are_chunked(tmp_path, clock):
+    cache = open_cache(tmp_path, clock)
+    usernames = [f'user_{number:05}' for number in range(1200)]
+    for number, username in enumerate(usernames):
+        cache.set(username, number)
+    cache.flush()
+    found = cache.get_many(usernames + ['unknown_user'])
+    assert found == {username: number for number, username in enumerate(usernames)}
+    stats = cache.stats()
+    assert stats['hits'] == 1200
+    assert stats['misses'] == 1
+    cache.close()
@@ -0,0 +1,154 @@
+"""Tests for routing updates to shards."""
+import asyncio
+import queue
+from types import SimpleNamespace
+
+from shard import ShardRouter, poll, shard_for
+
+
+def update_in(chat_id=None, user_id=None, update_id=0):
+    chat = SimpleNamespace(id=chat_id) if chat_id is not None else None
+    user = SimpleNamespace(id=user_id) if user_id is not None else None
+    return SimpleNamespace(effective_chat=chat, effective_user=user, update_id=update_id,
+                           to_dict=lambda: {'update_id': update_id})
+
+
+def chats_of_shard(index, shards, count):
+    """Return ``count`` chat ids routed to the shard ``index``."""
+    chat_ids = (chat_id for chat_id in range(-1, -10000, -1) if shard_for(update_in(chat_id), shards) == index)
+    return [next(chat_ids) for _ in range(count)]
+
+
+def drain(updates: queue.Queue) -> list:
+    batches = []
+    while not updates.empty():
+        batches.append(updates.get_nowait())
+    return batches
+
+
+def test_updates_of_a_chat_go_to_one_shard():
+    for chat_id in (-1001234567890, -42, 7, 123456789):
+        shards = {shard_for(update_in(chat_id, user_id), 4) for user_id in range(20)}
+        assert len(shards) == 1
+
+
+def test_updates_without_a_chat_go_to_their_users_shard():
+    assert shard_for(update_in(user_id=7), 4) == shard_for(update_in(chat_id=7), 4)
+
+
+def test_updates_without_a_chat_or_user_go_to_the_first_shard():
+    assert shard_for(update_in(), 4) == 0
+
+
+def test_chats_are_spread_over_every_shard():
+    counts = [0] * 4
+    for chat_id in range(-1000, 0):
+        counts[shard_for(update_in(chat_id), 4)] += 1
+    assert all(200 <= count <= 300 for count in counts)
+
+
+def test_a_single_shard_gets_everything():
+    assert {shard_for(update_in(chat_id), 1) for chat_id in range(-50, 50)} == {0}
+
+
+def test_router_sends_each_shard_its_updates_in_order():
+    first, second = chats_of_shard(0, 2, 1)[0], chats_of_shard(1, 2, 1)[0]
+    queues = [queue.Queue(), queue.Queue()]
+
+    async def main():
+        router = ShardRouter(None, queues)
+        router.start()
+        await router.route([update_in(first, update_id=1), update_in(second, update_id=2),
+                            update_in(first, update_id=3)])
+        await router.stop()
+        return router
+
+    router = asyncio.run(main())
+    assert drain(queues[0]) == [[{'update_id': 1}, {'update_id': 3}]]
+    assert drain(queues[1]) == [[{'update_id': 2}]]
+    assert router.routed == [2, 1]
+    assert router.dropped == [0, 0]
+
+
+def test_router_waits_for_a_full_shard_instead_of_dropping():
+    chat_id = chats_of_shard(0, 1, 1)[0]
+    queues = [queue.Queue(maxsize=1)]
+
+    async def main():
+        router = ShardRouter(None, queues, backlog=1)
+        router.start()
+        # One batch fills the worker queue, one is held by the sender, one fills the backlog
+        for update_id in range(3):
+            await router.route([update_in(chat_id, update_id=update_id)])
+        await asyncio.sleep(0.05)
+        routing = asyncio.create_task(router.route([update_in(chat_id, update_id=3)]))
+        await asyncio.sleep(0.05)
+        assert not routing.done()
+
+        # The worker catching up makes room
+        batches = []
+        while len(batches) < 4:
+            try:
+                batches.append(queues[0].get_nowait())
+            except queue.Empty:
+                await asyncio.sleep(0.01)
+        await routing
+        await router.stop()
+        return router, batches
+
+    router, batches = asyncio.run(main())
+    assert batches == [[{'update_id': update_id}] for update_id in range(4)]
+    assert router.dropped == [0]
+
+
+def test_router_drops_what_is_sent_to_a_dead_shard():
+    chat_id = chats_of_shard(0, 1, 1)[0]
+    queues = [queue.Queue(maxsize=1)]
+
+    async def main():
+        router = ShardRouter(None, queues, backlog=1)
+        router.mark_dead(0)
+        router.start()
+        for update_id in range(5):
+            await router.route([update_in(chat_id, update_id=update_id)])
+        await router.stop()
+        return router
+
+    router = asyncio.run(main())
+    assert router.dropped == [5]
+    assert queues[0].empty()
+
+
+class FakePollingBot:
+    """Answers getUpdates with the given batches, then sets ``stop``."""
+
+    def __init__(self, batches, stop):
+        self.batches = list(batches)
+        self.stop = stop
+        self.offsets = []
+
+    async def get_updates(self, offset, timeout, allowed_updates=None, limit=None):
+        self.offsets.append(offset)
+        if self.batches:
+            return self.batches.pop(0)
+        self.stop.set()
+        return []
+
+
+def test_poll_confirms_updates_once_they_are_routed():
+    chat_id = chats_of_shard(0, 1, 1)[0]
+    queues = [queue.Queue()]
+
+    async def main():
+        stop = asyncio.Event()
+        bot = FakePollingBot([[update_in(chat_id, update_id=10), update_in(chat_id, update_id=11)],
+                              [update_in(chat_id, update_id=12)]], stop)
+        router = ShardRouter(bot, queues)
+        router.start()
+        await poll(bot, router, None, stop)
+        await router.stop()
+        return bot
+
+    bot = asyncio.run(main())
+    assert bot.offsets == [0, 12, 13, 13]
+    assert drain(queues[0]) == [[{'update_id': 10}, {'update_id': 11}], [{'update_id': 12}]]
@@ -0,0 +1,91 @@
+"""Tests for saving and loading cache snapshots."""
+import gzip
+import json
+
+from telegram import ChatMemberAdministrator, ChatMemberMember, User
+
+from cache import ChannelRoster, TTLCache
+from snapshot import load_snapshot, save_snapshot
+
+
+def make_caches(clock) -> tuple:
+    return TTLCache(maxsize=10, ttl=3600, clock=clock), TTLCache(maxsize=10, ttl=300, clock=clock)
+
+
+def fill(rosters: TTLCache, members: TTLCache) -> None:
+    creator = User(1, 'Ann', False, username='ann_owner')
+    rosters.set(-100, ChannelRoster(-100, 'News', creator, {1: 'creator', 2: 'administrator'}))
+    rosters.set(-200, ChannelRoster(-200, 'Hidden', None, {}), ttl=60)
+    members.set((-300, 3), ChatMemberMember(User(3, 'Bob', False)))
+    members.set((-300, 2), ChatMemberAdministrator(
+        User(2, 'Cid', False), can_be_edited=False, is_anonymous=False, can_manage_chat=True,
+        can_delete_messages=True, can_manage_video_chats=False, can_restrict_members=True,
+        can_promote_members=False, can_change_info=False, can_invite_users=True, can_post_stories=False,
+        can_edit_stories=False, can_delete_stories=False
+    ))
+
+
+def test_round_trip(tmp_path, clock):
+    path = str(tmp_path / 'snapshot.json.gz')
+    rosters, members = make_caches(clock)
+    fill(rosters, members)
+    assert save_snapshot(path, rosters, members) == 4
+
+    loaded_rosters, loaded_members = make_caches(clock)
+    assert load_snapshot(path, loaded_rosters, loaded_members) == (2, 2)
+
+    roster = loaded_rosters.get(-100)
+    assert roster.title == 'News'
+    assert roster.creator.username == 'ann_owner'
+    assert roster.status_of(1) == 'creator'
+    assert roster.status_of(2) == 'administrator'
+    assert loaded_rosters.get(-200).creator is None
+    assert loaded_members.get((-300, 3)).status == 'member'
+    assert loaded_members.get((-300, 2)).can_restrict_members
+
+    # Entries keep the time they had left, less the moments between saving and loading
+    ttls = {key: ttl for key, _, ttl in loaded_rosters.entries()}
+    assert 3599 < ttls[-100] <= 3600
+    assert 59 < ttls[-200] <= 60
+
+
+def test_entries_that_expired_while_down_are_skipped(tmp_path, clock):
+    path = str(tmp_path / 'snapshot.json.gz')
+    rosters, members = make_caches(clock)
+    fill(rosters, members)
+    save_snapshot(path, rosters, members)
+
+    # Pretend the snapshot was saved 100 seconds ago
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        snapshot = json.load(file)
+    snapshot['saved_at'] -= 100
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        json.dump(snapshot, file)
+
+    loaded_rosters, loaded_members = make_caches(clock)
+    assert load_snapshot(path, loaded_rosters, loaded_members) == (1, 2)
+    assert -200 not in loaded_rosters
+    assert 3499 < loaded_rosters.entries()[0][2] <= 3500
+
+
+def test_expired_cache_entries_are_not_saved(tmp_path, clock):
+    path = str(tmp_path / 'snapshot.json.gz')
+    rosters, members = make_caches(clock)
+    fill(rosters, members)
+    clock.advance(300)
+    assert save_snapshot(path, rosters, members) == 1
+
+
+def test_missing_unreadable_or_outdated_snapshots_load_nothing(tmp_path, clock):
+    rosters, members = make_caches(clock)
+    assert load_snapshot(str(tmp_path / 'missing.json.gz'), rosters, members) == (0, 0)
+
+    broken = tmp_path / 'broken.json.gz'
+    broken.write_bytes(b'not gzip')
+    assert load_snapshot(str(broken), rosters, members) == (0, 0)
+
+    outdated = str(tmp_path / 'outdated.json.gz')
+    with gzip.open(outdated, 'wt', encoding='utf-8') as file:
+        json.dump({'version': 0, 'saved_at': 0, 'rosters': [], 'members': []}, file)
+    assert load_snapshot(outdated, rosters, members) == (0, 0)
+    assert len(rosters) == 0
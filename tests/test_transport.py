@@ -0,0 +1,109 @@
+"""Tests for the per-method timeouts of transport.py."""
+import asyncio
+
+import httpx
+import pytest
+from telegram.request import BaseRequest, HTTPXRequest
+
+import transport
+from transport import MethodTimeoutRequest, SharedRequest, build_download_client, build_request, method_class
+
+API = 'https://api.telegram.org/bot123:ABC'
+
+
+class RecordingRequest(BaseRequest):
+    """Answers every request with an empty result and records the timeouts it got."""
+
+    def __init__(self):
+        self.timeouts = []
+        self.initialized = 0
+        self.shut_down = 0
+
+    @property
+    def read_timeout(self):
+        return 5.0
+
+    async def initialize(self) -> None:
+        self.initialized += 1
+
+    async def shutdown(self) -> None:
+        self.shut_down += 1
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        self.timeouts.append({
+            'read': read_timeout, 'write': write_timeout, 'connect': connect_timeout, 'pool': pool_timeout
+        })
+        return 200, b'{"ok": true, "result": true}'
+
+
+@pytest.mark.parametrize('url, expected', [
+    (f'{API}/sendPhoto', 'upload'),
+    (f'{API}/sendMediaGroup', 'upload'),
+    (f'{API}/answerCallbackQuery', 'interactive'),
+    (f'{API}/editMessageText', 'interactive'),
+    (f'{API}/sendMessage', 'default'),
+    # Long polls go through their own pool and set their own read timeout
+    (f'{API}/getUpdates', 'default'),
+    ('https://api.telegram.org/file/bot123:ABC/documents/file_1.txt', 'download'),
+])
+def test_method_class(url, expected):
+    assert method_class(url) == expected
+
+
+def test_requests_get_the_timeouts_of_their_class():
+    inner = RecordingRequest()
+    request = MethodTimeoutRequest(inner, {'upload': {'read': 60, 'write': 90}, 'interactive': {'read': 3}})
+
+    async def main():
+        await request.post(f'{API}/sendPhoto')
+        await request.post(f'{API}/answerCallbackQuery')
+        await request.post(f'{API}/sendMessage')
+        # Timeouts passed by the caller win
+        await request.post(f'{API}/answerCallbackQuery', read_timeout=1)
+
+    asyncio.run(main())
+    upload, interactive, default, explicit = inner.timeouts
+    assert (upload['read'], upload['write']) == (60, 90)
+    assert interactive['read'] == 3
+    assert isinstance(interactive['write'], type(BaseRequest.DEFAULT_NONE))
+    assert isinstance(default['read'], type(BaseRequest.DEFAULT_NONE))
+    assert explicit['read'] == 1
+
+
+def test_build_request(monkeypatch):
+    assert isinstance(build_request(4), HTTPXRequest)
+    request = build_request(4, method_timeouts={'upload': {'read': 60}})
+    assert isinstance(request, MethodTimeoutRequest)
+    assert request.read_timeout == 5.0
+
+    # Without the h2 package HTTP/2 falls back to HTTP/1.1 instead of failing
+    monkeypatch.setattr(transport, 'http2_available', lambda: False)
+    assert isinstance(build_request(4, http2=True), HTTPXRequest)
+
+
+def test_shared_request_is_shut_down_by_its_last_user():
+    inner = RecordingRequest()
+    request = SharedRequest(inner)
+
+    async def main():
+        await request.initialize()
+        await request.initialize()
+        assert inner.initialized == 1
+        await request.post(f'{API}/getMe')
+        await request.shutdown()
+        assert inner.shut_down == 0
+        await request.shutdown()
+        assert inner.shut_down == 1
+
+    asyncio.run(main())
+    assert len(inner.timeouts) == 1
+
+
+def test_download_client_uses_the_given_timeouts():
+    client = build_download_client(pool_size=2, connect_timeout=3, read_timeout=45, pool_timeout=1)
+    try:
+        assert client.timeout == httpx.Timeout(45, connect=3, pool=1)
+    finally:
+        asyncio.run(client.aclose())
@@ -0,0 +1,118 @@
+"""Tests for the webhook settings derived from the bot token and the arguments the webhook server is started with."""
+import inspect
+import re
+
+import pytest
+from telegram.ext import Application, Updater
+
+import bot
+from webhook import derive_secret, webhook_args, webhook_settings, webhook_url
+
+TOKEN = '123456:ABC-DEF'
+
+
+def test_derived_secrets_are_stable_and_differ_by_purpose():
+    assert derive_secret(TOKEN, 'webhook-path') == derive_secret(TOKEN, 'webhook-path')
+    assert derive_secret(TOKEN, 'webhook-path') != derive_secret(TOKEN, 'webhook-secret')
+    assert derive_secret(TOKEN, 'webhook-path') != derive_secret('654321:XYZ', 'webhook-path')
+
+
+def test_derived_secret_is_a_valid_secret_token():
+    # Telegram accepts 1-256 characters of A-Z, a-z, 0-9, _ and - as secret_token
+    assert re.fullmatch(r'[0-9a-f]{32}', derive_secret(TOKEN, 'webhook-secret'))
+
+
+@pytest.mark.parametrize('url, path', [
+    ('https://example.com', 'hook'),
+    ('https://example.com/', 'hook'),
+    ('https://example.com/', '/hook'),
+])
+def test_webhook_url_joins_base_and_path(url, path):
+    assert webhook_url(url, path) == 'https://example.com/hook'
+
+
+def test_webhook_url_keeps_a_base_path():
+    assert webhook_url('https://example.com/bots/', 'hook') == 'https://example.com/bots/hook'
+
+
+def test_settings_derive_path_and_secret_token_from_the_token():
+    webhook = webhook_settings(TOKEN, 'https://example.com', '0.0.0.0', 8443)
+    assert webhook == {
+        'url': 'https://example.com',
+        'path': derive_secret(TOKEN, 'webhook-path'),
+        'secret_token': derive_secret(TOKEN, 'webhook-secret'),
+        'host': '0.0.0.0',
+        'port': 8443,
+    }
+    # Empty settings, as read from an unset environment variable, count as unset
+    assert webhook_settings(TOKEN, 'https://example.com', '0.0.0.0', 8443, path='', secret_token='') == webhook
+
+
+def test_settings_keep_an_explicit_path_and_secret_token():
+    webhook = webhook_settings(TOKEN, 'https://example.com', '127.0.0.1', 80, path='hook', secret_token='s3cret')
+    assert webhook['path'] == 'hook'
+    assert webhook['secret_token'] == 's3cret'
+
+
+def test_args_point_telegram_at_the_served_path():
+    webhook = webhook_settings(TOKEN, 'https://example.com/', '127.0.0.1', 8080, path='hook', secret_token='s3cret')
+    assert webhook_args(webhook) == {
+        'listen': '127.0.0.1',
+        'port': 8080,
+        'url_path': 'hook',
+        'secret_token': 's3cret',
+        'webhook_url': 'https://example.com/hook',
+    }
+
+
+@pytest.mark.parametrize('method', [Application.run_webhook, Updater.start_webhook])
+def test_args_are_accepted_by_python_telegram_bot(method):
+    args = webhook_args(webhook_settings(TOKEN, 'https://example.com', '0.0.0.0', 8443))
+    inspect.signature(method).bind(None, **args, allowed_updates=None)
+
+
+class FakeApplication:
+    def __init__(self):
+        self.webhook = None
+        self.polling = None
+
+    def run_webhook(self, **kwargs):
+        self.webhook = kwargs
+
+    def run_polling(self, **kwargs):
+        self.polling = kwargs
+
+
+@pytest.fixture
+def application(monkeypatch):
+    application = FakeApplication()
+    monkeypatch.setattr(bot, 'load_tokens', lambda: [TOKEN])
+    monkeypatch.setattr(bot, 'build_application', lambda token: application)
+    monkeypatch.setattr(bot.config, 'SHARDS', 1)
+    monkeypatch.setattr(bot.config, 'WEBHOOK_LISTEN', '0.0.0.0')
+    monkeypatch.setattr(bot.config, 'WEBHOOK_PORT', 8443)
+    monkeypatch.setattr(bot.config, 'WEBHOOK_PATH', '')
+    monkeypatch.setattr(bot.config, 'WEBHOOK_SECRET_TOKEN', '')
+    return application
+
+
+def test_main_runs_the_webhook_server_when_a_url_is_set(application, monkeypatch):
+    monkeypatch.setattr(bot.config, 'WEBHOOK_URL', 'https://example.com/bot')
+    bot.main()
+    path = derive_secret(TOKEN, 'webhook-path')
+    assert application.webhook == {
+        'listen': '0.0.0.0',
+        'port': 8443,
+        'url_path': path,
+        'secret_token': derive_secret(TOKEN, 'webhook-secret'),
+        'webhook_url': f'https://example.com/bot/{path}',
+        'allowed_updates': bot.Update.ALL_TYPES,
+    }
+    assert application.polling is None
+
+
+def test_main_polls_without_a_url(application, monkeypatch):
+    monkeypatch.setattr(bot.config, 'WEBHOOK_URL', '')
+    bot.main()
+    assert application.webhook is None
+    assert application.polling == {'allowed_updates': bot.Update.ALL_TYPES}
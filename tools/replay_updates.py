@@ -0,0 +1,82 @@
+"""POST recorded updates to the bot's webhook, standing in for Telegram.
+
+Usage:
+    python tools/replay_updates.py http://127.0.0.1:8443/<path> updates.jsonl --secret <token>
+
+The file holds one Update JSON object per line, as delivered by Telegram.
+Each update is posted with the X-Telegram-Bot-Api-Secret-Token header and
+the request latency percentiles are printed at the end.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import httpx
+
+
+def load_updates(path: str, repeat: int) -> list:
+    """Read the updates, renumbering update_id so repeated passes stay unique."""
+    with open(path, encoding='utf-8') as file:
+        updates = [json.loads(line) for line in file if line.strip()]
+
+    replay = []
+    for _ in range(repeat):
+        for update in updates:
+            update = dict(update, update_id=len(replay) + 1)
+            replay.append(update)
+    return replay
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def replay(url: str, updates: list, secret: str, concurrency: int) -> None:
+    statuses = Counter()
+    latencies = []
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async with httpx.AsyncClient(headers={'X-Telegram-Bot-Api-Secret-Token': secret}) as client:
+        async def worker() -> None:
+            while not queue.empty():
+                update = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=update)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"Posted {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.1f} updates/sec)")
+    print(f"Responses: {dict(statuses)}")
+    print(
+        f"Latency p50: {percentile(latencies, 0.5) * 1000:.1f}ms, "
+        f"p95: {percentile(latencies, 0.95) * 1000:.1f}ms, "
+        f"p99: {percentile(latencies, 0.99) * 1000:.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url', help="Full webhook URL, including the secret path")
+    parser.add_argument('updates', help="File with one Update JSON object per line")
+    parser.add_argument('--secret', required=True, help="Value of the secret token header")
+    parser.add_argument('--concurrency', type=int, default=1, help="Requests in flight at once")
+    parser.add_argument('--repeat', type=int, default=1, help="How many times to send the file")
+    args = parser.parse_args()
+
+    asyncio.run(replay(args.url, load_updates(args.updates, args.repeat), args.secret, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""HTTP transport of Bot API requests: connection pools, keep-alive, HTTP/2 and per-method timeouts."""
+import importlib.util
+import logging
+
+import httpx
+from telegram.request import BaseRequest, HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Bot API methods whose timeouts differ from the default ones, by class
+METHOD_CLASSES = {
+    'upload': (
+        'sendPhoto', 'sendVideo', 'sendDocument', 'sendAudio', 'sendVoice', 'sendAnimation',
+        'sendVideoNote', 'sendSticker', 'sendMediaGroup', 'editMessageMedia', 'setChatPhoto',
+        'uploadStickerFile',
+    ),
+    # Calls a user is waiting on, better failed fast and retried than stuck
+    'interactive': ('answerCallbackQuery', 'editMessageText', 'editMessageReplyMarkup'),
+}
+
+_METHOD_CLASS = {method: name for name, methods in METHOD_CLASSES.items() for method in methods}
+
+# telegram doesn't export DefaultValue, the type of "timeout not given" arguments
+_DEFAULT = type(BaseRequest.DEFAULT_NONE)
+
+
+def method_class(url: str) -> str:
+    """Return the timeout class of the request to ``url``: a METHOD_CLASSES key, 'download' or 'default'."""
+    if '/file/bot' in url:
+        return 'download'
+    return _METHOD_CLASS.get(url.rsplit('/', 1)[-1], 'default')
+
+
+def http2_available() -> bool:
+    """Whether httpx can speak HTTP/2, which needs the h2 package."""
+    return importlib.util.find_spec('h2') is not None
+
+
+class MethodTimeoutRequest(BaseRequest):
+    """Wraps another BaseRequest and gives every request the timeouts of its method's class.
+
+    ``timeouts`` maps a class (see method_class()) to {'connect', 'read',
+    'write', 'pool'} timeouts in seconds; missing ones fall back to the
+    wrapped request's defaults. Timeouts the caller passes explicitly win.
+    """
+
+    def __init__(self, request: BaseRequest, timeouts: dict):
+        self.request = request
+        self.timeouts = timeouts
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        await self.request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.request.shutdown()
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        timeouts = self.timeouts.get(method_class(url), {})
+        if isinstance(read_timeout, _DEFAULT) and 'read' in timeouts:
+            read_timeout = timeouts['read']
+        if isinstance(write_timeout, _DEFAULT) and 'write' in timeouts:
+            write_timeout = timeouts['write']
+        if isinstance(connect_timeout, _DEFAULT) and 'connect' in timeouts:
+            connect_timeout = timeouts['connect']
+        if isinstance(pool_timeout, _DEFAULT) and 'pool' in timeouts:
+            pool_timeout = timeouts['pool']
+        return await self.request.do_request(
+            url, method, request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout
+        )
+
+
+class SharedRequest(BaseRequest):
+    """Lets several bots use one request object, and so one connection pool.
+
+    Every bot initializes and shuts down its requests; the wrapped request
+    is initialized by the first bot and shut down by the last one.
+    """
+
+    def __init__(self, request: BaseRequest):
+        self.request = request
+        self._users = 0
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        if not self._users:
+            await self.request.initialize()
+        self._users += 1
+
+    async def shutdown(self) -> None:
+        self._users -= 1
+        if not self._users:
+            await self.request.shutdown()
+
+    async def do_request(self, *args, **kwargs):
+        return await self.request.do_request(*args, **kwargs)
+
+
+def build_request(pool_size: int, keepalive_connections: int = None, keepalive_expiry: float = 5.0,
+                  http2: bool = False, connect_timeout: float = 5.0, read_timeout: float = 5.0,
+                  write_timeout: float = 5.0, pool_timeout: float = 1.0, media_write_timeout: float = 20.0,
+                  method_timeouts: dict = None) -> BaseRequest:
+    """Build the request object of one connection pool.
+
+    Up to ``pool_size`` connections are open at once and up to
+    ``keepalive_connections`` (all of them by default) are kept open for
+    ``keepalive_expiry`` seconds after their last request. With ``http2``,
+    concurrent requests share connections instead of queueing for one; it
+    falls back to HTTP/1.1 when the h2 package isn't installed.
+    """
+    if http2 and not http2_available():
+        logger.warning("HTTP/2 needs the h2 package (pip install \"httpx[http2]\"), using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size if keepalive_connections is None else keepalive_connections,
+        keepalive_expiry=keepalive_expiry
+    )
+    request = HTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        pool_timeout=pool_timeout,
+        media_write_timeout=media_write_timeout,
+        http_version='2' if http2 else '1.1',
+        httpx_kwargs={'limits': limits}
+    )
+    if method_timeouts:
+        return MethodTimeoutRequest(request, method_timeouts)
+    return request
+
+
+def build_download_client(pool_size: int = 4, keepalive_expiry: float = 5.0, http2: bool = False,
+                          connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                          pool_timeout: float = 1.0) -> httpx.AsyncClient:
+    """Build the HTTP client that streams files from Telegram.
+
+    BaseRequest only returns whole responses, so files read while they
+    download get a small pool of their own, set up like build_request()'s.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout),
+        http2=http2 and http2_available()
+    )
@@ -0,0 +1,39 @@
+"""Webhook serving mode: Telegram pushes updates to the webhook server python-telegram-bot ships."""
+import hashlib
+import hmac
+
+
+def derive_secret(token: str, purpose: str) -> str:
+    """Derive a stable secret from the bot token, e.g. for the webhook path."""
+    return hmac.new(token.encode(), purpose.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def webhook_url(url: str, path: str) -> str:
+    """Return the URL Telegram posts updates to: the public base ``url`` followed by the secret ``path``."""
+    return url.rstrip('/') + '/' + path.lstrip('/')
+
+
+def webhook_settings(token: str, url: str, host: str, port: int, path: str = None, secret_token: str = None) -> dict:
+    """Return the url, path, secret_token, host and port to receive updates with.
+
+    Without an explicit ``path`` or ``secret_token`` one is derived from the
+    token, so it stays the same across restarts without being guessable.
+    """
+    return {
+        'url': url,
+        'path': path or derive_secret(token, "webhook-path"),
+        'secret_token': secret_token or derive_secret(token, "webhook-secret"),
+        'host': host,
+        'port': port,
+    }
+
+
+def webhook_args(webhook: dict) -> dict:
+    """Return the arguments of Application.run_webhook and Updater.start_webhook for ``webhook_settings()``."""
+    return {
+        'listen': webhook['host'],
+        'port': webhook['port'],
+        'url_path': webhook['path'],
+        'secret_token': webhook['secret_token'],
+        'webhook_url': webhook_url(webhook['url'], webhook['path']),
+    }